@@ -31,21 +31,102 @@
         1. Overwrite the initLadderInfo() to set the src and dest address info.
         2. Overwrite the runLadderLogic() to do the value check and memory update.
         3. Use or pass the ladder logic object in a handlerS7request() function.
+        For bool rungs, set the declarative self.rungList (refer to <ladderRungs.py>) in the
+        initLadderInfo(), then call runRungs() to calculate all the dest values with the
+        compiled bitwise evaluator.
 
     - S7CommClient: S7Comm client module to read src memory val or write target val 
         from/to the target PLC/RTU. 
         
     - S7CommServer: S7Comm  server module will be used by RTU/PLC module to handle the S7Comm
-        data read/set request.
+        data read/set request. The DB and Merker/process input/output areas are carved
+        from one (optional mmap file backed) memory pool. The DB write events are passed to the event handler by the
+        snap7 server event callback directly (or drained from the event queue every clock
+        interval in the poll mode). The asyncioS7commServer is a pure python S7comm server 
+        engine (no native snap7 lib) with the same interfaces, it serves all the clients
+        from one asyncio event loop and records every request as a structured record.
 """
+import os
 import time
+import mmap
+import socket
+import asyncio
+import bisect
+import struct
+import array
 import ctypes
+import threading
+from collections import deque
 import snap7
-from snap7.common import load_library
+from snap7.common import load_library, check_error
+try:
+    import numpy as np  # optional, used by decodeS7blocks() to return the structured array.
+except ImportError:
+    np = None
+
+import ladderRungs
 
 BOOL_TYPE = 0   # bool type 2 bytes data.
 INT_TYPE = 1    # integer type 2 bytes number. 
 REAL_TYPE = 2   # float type 4 bytes number. 
+# struct format and byte size of the data types (S7 data is big endian).
+TYPE_FORMAT = {BOOL_TYPE: ('B', 1), INT_TYPE: ('h', 2), REAL_TYPE: ('f', 4)}
+TYPE_CODEC = {dataType: struct.Struct('>' + fmt[0]) for dataType, fmt in TYPE_FORMAT.items()}
+# numpy big endian dtype and array module type code of the data types.
+TYPE_NP_DTYPE = {BOOL_TYPE: 'u1', INT_TYPE: '>i2', REAL_TYPE: '>f4'}
+TYPE_ARRAY_CODE = {BOOL_TYPE: 'B', INT_TYPE: 'h', REAL_TYPE: 'f'}
+BOOL_BIT_TABLE = bytes(i & 1 for i in range(256))   # byte -> bool bit 0 translate table.
+# bytes written by the s7CommClient for each data type (bool is written as 2 bytes).
+TYPE_WRITE_SIZE = {BOOL_TYPE: 2, INT_TYPE: 2, REAL_TYPE: 4}
+DEF_MEM_SIZE = 8    # default memory address (DB) size in bytes.
+# S7 multi variables read/write request packing parameters:
+MULTI_VAR_MAX = 20      # snap7 max number of items in one multi variables request.
+MULTI_VAR_GAP = 8       # merge the read ranges in one DB if the gap is not more than the bytes.
+S7_PDU_HEADER = 18      # S7 header + function parameter bytes in a request/response pdu.
+S7_ITEM_PARAM = 12      # request parameter bytes of one item.
+S7_ITEM_DATA = 4        # data header bytes of one item.
+DEF_PDU_SIZE = 240      # PDU size used if the negotiated size is not available.
+
+DEF_POOL_SIZE = 65536   # default size of the server memory pool all the areas carved from.
+
+# s7commServer memory area types and the snap7 server area codes, the Merker (MK), 
+# process input (PE) and process output (PA) areas are one per server (index 0).
+AREA_DB = 'DB'
+AREA_MK = 'MK'
+AREA_PE = 'PE'
+AREA_PA = 'PA'
+AREA_CODE = {AREA_DB: snap7.types.srvAreaDB, AREA_MK: snap7.types.srvAreaMK, 
+             AREA_PE: snap7.types.srvAreaPE, AREA_PA: snap7.types.srvAreaPA}
+
+# s7commServer event handling mode:
+EVT_MODE_CALLBACK = 'callback'  # snap7 server thread calls the handler when the event is created.
+EVT_MODE_POLL = 'poll'          # event loop drains all the queued events every clock interval.
+
+EVT_CODE_READ = 0x00020000      # snap7 evcDataRead event code.
+EVT_CODE_WRITE = 0x00040000     # snap7 evcDataWrite event code.
+EVT_AREA_DB = 0x84              # snap7 srvAreaDB (132) area code.
+
+# S7comm server engine:
+ENGINE_SNAP7 = 'snap7'      # native snap7 lib server.
+ENGINE_ASYNCIO = 'asyncio'  # pure python asyncio server <asyncioS7commServer>.
+
+# S7comm protocol constants used by the asyncio S7comm server:
+TPKT_HEADER = struct.Struct('>BBH')         # version(3), reserved, total length
+S7_HEADER = struct.Struct('>BBHHHH')        # protocol id(0x32), rosctr, redundancy id, pdu ref, param len, data len
+S7_ACK_HEADER = struct.Struct('>BBHHHHBB')  # S7_HEADER + error class, error code
+S7_ANY_ITEM = struct.Struct('>BBBBHHB')     # spec type, length, syntax id, transport size, count, db number, area + 3 bytes address
+S7_DATA_ITEM = struct.Struct('>BBH')        # return code, transport size, data length
+COTP_CR, COTP_CC, COTP_DT = 0xE0, 0xD0, 0xF0
+S7_PROTOCOL_ID = 0x32
+S7_JOB, S7_ACK_DATA, S7_USERDATA = 0x01, 0x03, 0x07
+S7_FUN_SETUP, S7_FUN_READ, S7_FUN_WRITE = 0xF0, 0x04, 0x05
+S7_RET_OK, S7_RET_OUT_RANGE, S7_RET_TYPE_ERR, S7_RET_NO_OBJ = 0xFF, 0x05, 0x06, 0x0A
+S7_TS_BIT, S7_TS_BYTE, S7_TS_OCTET = 0x03, 0x04, 0x09   # data item transport size
+# request item transport size -> element bytes (bit, byte, char, word, int, dword, dint, real, counter, timer)
+S7_ELEMENT_SIZE = {0x01: 1, 0x02: 1, 0x03: 1, 0x04: 2, 0x05: 2, 0x06: 4, 0x07: 4, 0x08: 4, 0x1C: 2, 0x1D: 2}
+S7_AREA_CODE = {0x81: AREA_PE, 0x82: AREA_PA, 0x83: AREA_MK, EVT_AREA_DB: AREA_DB}
+S7_DEF_PDU = 480            # max PDU size the asyncio server accepts.
+REQ_LOG_SIZE = 4096         # number of structured request records kept by the asyncio server.
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -67,6 +148,44 @@ def parseS7bytes(databytes, dataIdx, dataType):
     else:
         return 
 
+def decodeS7blocks(blockList, layout, nameList=None, useNumpy=True):
+    """ Decode a list of raw DB bytes blocks (such as the DB snapshots) with the same 
+        data layout in one pass without per value python calls.
+        Args:
+            blockList (list[bytes]): raw DB bytes blocks, the bytes after the layout size 
+                are ignored.
+            layout (memoryLayout/tuple): memoryLayout obj or (dataIdxList, dataTypeList).
+            nameList (list[str], optional): column names match to the layout's sorted data
+                index. Defaults to None use 'd<dataIdx>'.
+            useNumpy (bool, optional): return the numpy structured array if numpy is 
+                installed. Defaults to True.
+        Returns:
+            numpy structured array (one row per block, one field per data, bool data as 
+            numpy bool) or dict {name: array.array column} (bool data as 0/1) if numpy is
+            not used. None if a block is shorter than the layout.
+    """
+    if not isinstance(layout, memoryLayout): layout = memoryLayout(*layout, memSize=1 << 31)
+    blockSize = layout.codec.size
+    if nameList is None: nameList = ['d%d' %dataIdx for dataIdx in layout.sortedIdx]
+    if any(len(block) < blockSize for block in blockList): return None
+    rawData = b''.join(bytes(block[:blockSize]) for block in blockList)
+    typeList = [layout.typeMap[dataIdx] for dataIdx in layout.sortedIdx]
+    if useNumpy and np is not None:
+        rawArray = np.frombuffer(rawData, dtype=np.dtype({'names': nameList, 
+            'formats': [TYPE_NP_DTYPE[dataType] for dataType in typeList],
+            'offsets': list(layout.sortedIdx), 'itemsize': blockSize}))
+        result = np.empty(len(blockList), dtype=[(name, '?' if dataType == BOOL_TYPE else TYPE_NP_DTYPE[dataType]) 
+                                                 for name, dataType in zip(nameList, typeList)])
+        for name, dataType in zip(nameList, typeList):
+            result[name] = (rawArray[name] & 1) if dataType == BOOL_TYPE else rawArray[name]
+        return result
+    columnList = zip(*layout.codec.iter_unpack(rawData)) if blockList else [()] * len(nameList)
+    resultDict = {}
+    for name, dataType, column in zip(nameList, typeList, columnList):
+        if dataType == BOOL_TYPE: column = bytes(column).translate(BOOL_BIT_TABLE)
+        resultDict[name] = array.array(TYPE_ARRAY_CODE[dataType], column)
+    return resultDict
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class rtuLadderLogic(object):
@@ -83,7 +202,10 @@ class rtuLadderLogic(object):
         self.ladderName = ladderName
         self.srcAddrValInfo = {'addressIdx': None, 'dataIdx': None}
         self.destAddrValInfo = {'addressIdx': None, 'dataIdx': None}
+        self.rungList = None # declarative rungs list [(outputIdx, logicExpr), ...]
         self.initLadderInfo()
+        self.rungEvaluator = None
+        if self.rungList: self.compileRungs()
 
     def initLadderInfo(self):
         """ Init the src and dest address information, this function will 
@@ -91,6 +213,10 @@ class rtuLadderLogic(object):
         """
         pass
 
+    def compileRungs(self):
+        """ Compile the declarative self.rungList to the bitwise ladder evaluator."""
+        self.rungEvaluator = ladderRungs.rungCompiler(self.rungList)
+
 #-----------------------------------------------------------------------------
 # Define all the get() functions here:
     def getLadderName(self):
@@ -109,6 +235,21 @@ class rtuLadderLogic(object):
         """
         return []
 
+    def runRungs(self, inputList):
+        """ Calculate the dest bool values list from the src values list with the
+            compiled rungs, return None if the rungs are not set or input invalid.
+        """
+        if self.rungEvaluator is None: return None
+        return self.rungEvaluator.evaluate(inputList)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class s7ItemError(RuntimeError):
+    """ One item of the multi variables request is rejected by the PLC (such as the DB
+        not exist), the connection is still working.
+    """
+    pass
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class s7CommClient(object):
@@ -196,11 +337,257 @@ class s7CommClient(object):
             self.connected = False
             return None 
 
+    #-----------------------------------------------------------------------------
+    def _getPduSize(self):
+        """ Return the negotiated PDU size of the connection."""
+        try:
+            return self.client.get_pdu_length() or DEF_PDU_SIZE
+        except Exception:
+            return DEF_PDU_SIZE
+
+    def _buildBatches(self, rangeList):
+        """ Split the sorted memory ranges [(addressIdx, start, length, data), ...] to the
+            batches which can be sent in one multi variables request PDU. The range 
+            longer than one PDU is split to several ranges (with the data slices for 
+            writing, data is None for reading).
+        """
+        pduSize = self._getPduSize()
+        maxLen = pduSize - S7_PDU_HEADER - S7_ITEM_PARAM - S7_ITEM_DATA
+        batchList, batch, usedSize = [], [], S7_PDU_HEADER
+        for addressIdx, start, length, data in rangeList:
+            for offset in range(0, length, maxLen):
+                itemLen = min(length - offset, maxLen)
+                # read request has the item params and the response has the item data, 
+                # write request has both, count both to be safe for the 2 cases.
+                itemSize = S7_ITEM_PARAM + S7_ITEM_DATA + itemLen + (itemLen & 1)
+                if batch and (len(batch) == MULTI_VAR_MAX or usedSize + itemSize > pduSize):
+                    batchList.append(batch)
+                    batch, usedSize = [], S7_PDU_HEADER
+                itemData = None if data is None else data[offset:offset + itemLen]
+                batch.append((addressIdx, start + offset, itemLen, itemData))
+                usedSize += itemSize
+        if batch: batchList.append(batch)
+        return batchList
+
+    def _runBatch(self, batch, writeFlg=False):
+        """ Read or write a batch of ranges [(addressIdx, start, length, data), ...] 
+            with one multi variables request, return the read data list.
+        """
+        items = (snap7.types.S7DataItem * len(batch))()
+        bufferList = []
+        for item, (addressIdx, start, length, data) in zip(items, batch):
+            buffer = (ctypes.c_uint8 * length).from_buffer_copy(data) if writeFlg else (ctypes.c_uint8 * length)()
+            bufferList.append(buffer)
+            item.Area = snap7.types.Areas.DB.value
+            item.WordLen = snap7.types.WordLen.Byte.value
+            item.DBNumber = addressIdx
+            item.Start = start
+            item.Amount = length
+            item.pData = ctypes.cast(buffer, ctypes.POINTER(ctypes.c_uint8))
+        if writeFlg:
+            # python-snap7 write_multi_vars() writes a copy of the items, the item result 
+            # codes are lost, so call the lib function with the items directly.
+            check_error(self.client._library.Cli_WriteMultiVars(self.client._pointer, ctypes.byref(items), 
+                                                                ctypes.c_int32(len(items))), context="client")
+        else:
+            self.client.read_multi_vars(items)
+        for item in items:
+            if item.Result != 0:
+                raise s7ItemError("DB %s start %s item error code %s" %(str(item.DBNumber), str(item.Start), hex(item.Result)))
+        return [bytes(buffer) for buffer in bufferList]
+
+    #-----------------------------------------------------------------------------
+    def _setBatchError(self, funcName, err):
+        """ Handle the multi variables request error, the item error (such as the DB not 
+            exist) doesn't change the connection state, the other errors are the transport 
+            or connection failures.
+        """
+        if isinstance(err, s7ItemError):
+            print("Error: %s()> RTU item error: %s" %(funcName, str(err)))
+            self.connected = True
+        else:
+            print("Error: %s()> RTU connection error: %s" %(funcName, str(err)))
+            self.connected = False
+
+    def readMultiVals(self, itemList):
+        """ Read many data values with the S7 multi variables read requests, the 
+            close data in one DB are merged to one range and the ranges are packed 
+            in as few PDUs as the negotiated PDU size allows.
+            Args:
+                itemList (list): [(addressIdx, dataIdx, dataType), ...]
+            Returns:
+                list: the data values list matches to the itemList, None if read failed.
+        """
+        # merge the close data ranges of one DB.
+        rangeList = []
+        for addressIdx, dataIdx, dataType in sorted(itemList):
+            end = dataIdx + TYPE_FORMAT[dataType][1]
+            if rangeList and rangeList[-1][0] == addressIdx and dataIdx - rangeList[-1][2] <= MULTI_VAR_GAP:
+                rangeList[-1][2] = max(rangeList[-1][2], end)
+            else:
+                rangeList.append([addressIdx, dataIdx, end])
+        memDict = {}    # addressIdx -> {range start: range data}
+        try:
+            for batch in self._buildBatches([(addr, start, end - start, None) for addr, start, end in rangeList]):
+                for (addressIdx, start, _, _), data in zip(batch, self._runBatch(batch)):
+                    memDict.setdefault(addressIdx, {})[start] = data
+            self.connected = True
+        except Exception as err:
+            self._setBatchError('readMultiVals', err)
+            return None
+        # join the PDU split ranges back then decode all the values in one pass.
+        for addressIdx, start, end in rangeList:
+            rangeDict = memDict[addressIdx]
+            if len(rangeDict[start]) < end - start:
+                data, pos = bytearray(), start
+                while pos < end:
+                    data += rangeDict.pop(pos)
+                    pos = start + len(data)
+                rangeDict[start] = bytes(data)
+        rangeIdx, dataList = {}, []
+        for addressIdx, start, _ in rangeList:
+            rangeIdx.setdefault(addressIdx, []).append(start)
+        for addressIdx, dataIdx, dataType in itemList:
+            start = rangeIdx[addressIdx][bisect.bisect_right(rangeIdx[addressIdx], dataIdx) - 1]
+            val = TYPE_CODEC[dataType].unpack_from(memDict[addressIdx][start], dataIdx - start)[0]
+            dataList.append(bool(val & 1) if dataType == BOOL_TYPE else val)
+        return dataList
+
+    #-----------------------------------------------------------------------------
+    def setMultiVals(self, itemList):
+        """ Set many data values with the S7 multi variables write requests, the 
+            continuous data in one DB are merged to one range.
+            Args:
+                itemList (list): [(addressIdx, dataIdx, data, dataType), ...]
+            Returns:
+                bool: True if set successfully else None.
+        """
+        rangeList = []
+        for addressIdx, dataIdx, data, dataType in sorted(itemList, key=lambda item: item[:2]):
+            command = bytearray(TYPE_WRITE_SIZE[dataType])
+            if dataType == BOOL_TYPE:
+                command[0] = 1 if data else 0
+            else:
+                TYPE_CODEC[dataType].pack_into(command, 0, int(data) if dataType == INT_TYPE else float(data))
+            lastRange = rangeList[-1] if rangeList else None
+            if lastRange and lastRange[0] == addressIdx and lastRange[1] + len(lastRange[3]) == dataIdx:
+                lastRange[3] += command
+            else:
+                rangeList.append([addressIdx, dataIdx, 0, command])
+        try:
+            for batch in self._buildBatches([(addr, start, len(data), data) for addr, start, _, data in rangeList]):
+                self._runBatch(batch, writeFlg=True)
+            self.connected = True
+            return True
+        except Exception as err:
+            self._setBatchError('setMultiVals', err)
+            return None
+
     #-----------------------------------------------------------------------------
     def close(self):
         self.connected = False 
         self.client.disconnect()
 
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class memoryLayout(object):
+    """ Precompiled data layout of one s7commServer memory address (DB), decode or 
+        encode all the variables with one struct.Struct call on the memory buffer.
+    """
+    def __init__(self, dataIdxList, dataTypeList, memSize=DEF_MEM_SIZE):
+        """ Init example: layout = memoryLayout([0, 2, 4], [BOOL_TYPE, INT_TYPE, REAL_TYPE])
+            Args:
+                dataIdxList (list[int]): list of data start byte index.
+                dataTypeList (list[XXX_TYPE]): list of data type matches to the data index.
+                memSize (int, optional): memory size in bytes. Defaults to DEF_MEM_SIZE.
+            Raise ValueError if the data type is invalid or the data is out of the memory.
+        """
+        self.dataIdxList = tuple(int(dataIdx) for dataIdx in dataIdxList)
+        self.typeMap = dict(zip(self.dataIdxList, dataTypeList))   # O(1) data index -> type.
+        fmtStr, offset = '>', 0
+        for dataIdx in sorted(self.typeMap):
+            dataType = self.typeMap[dataIdx]
+            if dataType not in TYPE_FORMAT: raise ValueError("invalid data type: %s" %str(dataType))
+            if dataIdx < offset: raise ValueError("data index %s overlaps the previous data" %str(dataIdx))
+            fmtChar, size = TYPE_FORMAT[dataType]
+            fmtStr += 'x' * (dataIdx - offset) + fmtChar
+            offset = dataIdx + size
+        if offset > memSize: raise ValueError("data is out of the %s bytes memory" %str(memSize))
+        self.codec = struct.Struct(fmtStr)  # struct of the whole memory area.
+        self.sortedIdx = tuple(sorted(self.typeMap))
+        self.boolPosList = tuple(pos for pos, dataIdx in enumerate(self.sortedIdx) 
+                                 if self.typeMap[dataIdx] == BOOL_TYPE)
+        self.itemCodec = {dataIdx: struct.Struct('>' + TYPE_FORMAT[dataType][0]) 
+                          for dataIdx, dataType in self.typeMap.items()}
+
+    def decode(self, buffer):
+        """ Return the dict {dataIdx: value} of all the data in the memory buffer."""
+        valList = list(self.codec.unpack_from(buffer))
+        for pos in self.boolPosList:
+            valList[pos] = bool(valList[pos] & 1)   # bool is the bit 0 of the byte.
+        return dict(zip(self.sortedIdx, valList))
+
+    def decodeItem(self, buffer, dataIdx):
+        """ Return the value of one data, None if the data index is not in the layout."""
+        dataType = self.typeMap.get(dataIdx)
+        if dataType is None: return None
+        val = self.itemCodec[dataIdx].unpack_from(buffer, dataIdx)[0]
+        return bool(val & 1) if dataType == BOOL_TYPE else val
+
+    def encode(self, buffer, valDict):
+        """ Write the values in dict {dataIdx: value} to the memory buffer in one pass, 
+            the bool value only changes the bit 0 of the byte and the bytes not in the 
+            layout are not changed (so the whole area struct is not used to pack).
+        """
+        view = memoryview(buffer).cast('B')
+        for dataIdx, val in valDict.items():
+            dataType = self.typeMap[dataIdx]
+            if dataType == BOOL_TYPE:
+                view[dataIdx] = (view[dataIdx] & 0xFE) | (1 if val else 0)
+            else:
+                self.itemCodec[dataIdx].pack_into(view, dataIdx, int(val) if dataType == INT_TYPE else float(val))
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class memoryPool(object):
+    """ One contiguous memory buffer (optional mmap file backed) all the s7commServer 
+        memory areas are carved from, each area is a ctypes array view on the buffer so 
+        it can be registered to snap7 without copy.
+    """
+    def __init__(self, poolSize=DEF_POOL_SIZE, filePath=None):
+        """ Init example: pool = memoryPool(poolSize=65536, filePath='Memory/s7Memory.bin')
+            Args:
+                poolSize (int, optional): pool size in bytes. Defaults to DEF_POOL_SIZE.
+                filePath (str, optional): mmap backing file path, the memory data will 
+                    be kept in the file. Defaults to None (memory only).
+        """
+        self.poolSize = int(poolSize)
+        self.filePath = filePath
+        self._fileHandle = None
+        if filePath:
+            dirPath = os.path.dirname(os.path.abspath(filePath))
+            if not os.path.exists(dirPath): os.makedirs(dirPath)
+            self._fileHandle = open(filePath, 'a+b')
+            if os.path.getsize(filePath) < self.poolSize: self._fileHandle.truncate(self.poolSize)
+            self.buffer = mmap.mmap(self._fileHandle.fileno(), self.poolSize)
+        else:
+            self.buffer = bytearray(self.poolSize)
+        self.usedSize = 0
+
+    def allocate(self, size, align=2):
+        """ Carve a size bytes ctypes array from the pool, return None if the pool is full."""
+        offset = (self.usedSize + align - 1) // align * align
+        if offset + size > self.poolSize: return None
+        self.usedSize = offset + size
+        return (ctypes.c_ubyte*size).from_buffer(self.buffer, offset)
+
+    def getUsage(self):
+        return {'used': self.usedSize, 'total': self.poolSize, 'file': self.filePath}
+
+    def flush(self):
+        """ Flush the memory data to the backing file."""
+        if self._fileHandle: self.buffer.flush()
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class s7commServer(object):
@@ -210,69 +597,107 @@ class s7commServer(object):
         there will be an OSError: exception: access violation reading 0x00000001
     """
 
-    def __init__(self, hostIp='0.0.0.0', hostPort=102, snapLibPath=None) -> None:
+    def __init__(self, hostIp='0.0.0.0', hostPort=102, snapLibPath=None, 
+                 memPoolSize=DEF_POOL_SIZE, memFile=None) -> None:
         """ Init example: server = snap7Comm.s7commServer(snapLibPath='snap7.dll')
             Args:
                 hostIp (str, optional): service host. Defaults to '0.0.0.0'.
                 hostPort (int, optional): service port. Defaults to 102.
                 snapLibPath (_type_, optional): libflie 'snap7.dll' path for Win-OS if 
                     the system path is not set. Defaults to None use system path.
+                memPoolSize (int, optional): total bytes of all the memory areas. Defaults 
+                    to DEF_POOL_SIZE.
+                memFile (str, optional): mmap file to back the memory areas. Defaults to None.
         """ 
         self._hostIp = hostIp
         self._hostPort = hostPort
         self._server = None
+        self._memPool = memoryPool(poolSize=memPoolSize, filePath=memFile)
         self._dbDict = {}  # data base dictionary
         # Example of data base with one address save one bool, one int and one float number:
         # self._dbDict = {
-        #     '1': {    # address index as the key.
-        #         'dbData':(ctypes.c_ubyte*8)(), # 8 byte data
+        #     '1': {    # address index as the key (area type as the key for MK/PE/PA area).
+        #         'area': AREA_DB, # memory area type.
+        #         'dbData':(ctypes.c_ubyte*8)(), # 8 byte data view in the memory pool
         #         'dataIdx':[0, 2, 4], # parameter start index of bytes.
         #         'dataType':[BOOL_TYPE, INT_TYPE, REAL_TYPE], # parameter type
+        #         'layout': memoryLayout obj, # precompiled data layout
         #     }
         # }
+        self._memDict = {}  # memory index (int and str) -> (dbData, memoryLayout) lookup
         self.runningFlg = False
-        self._server = snap7.server.Server()
+        self._server = self._createServer()
         if snapLibPath:
             print("s7commServer > Load the Snap7 Win-OS lib-dll file : %s" %str(snapLibPath))
             load_library(snapLibPath)
         self.clockInterval = 0.05 # the interval of the event handling clock 
         self.terminate = False
+        self._stopEvt = threading.Event()
+        self._evtLock = threading.Lock()    # serialize the handler calls from the snap7 worker threads.
+        # DB write burst coalescing, the writes in one burst window are passed to the 
+        # event handler together as one list, so the ladder logic runs once per burst.
+        self.burstWindow = 0    # burst window in seconds, 0 means handle every write.
+        self._burstList = []
+        self._burstLock = threading.Lock()
+        self._burstEvt = threading.Event()
+        self.burstStats = {'events': 0, 'bursts': 0, 'savedRuns': 0, 'lastBurst': 0, 'maxBurst': 0}
         print("s7commServerInit > Host IP: %s, Port: %d" %(self._hostIp, self._hostPort))
 
+    def _createServer(self):
+        """ Create the server engine object."""
+        return snap7.server.Server()
+
     #-----------------------------------------------------------------------------
-    def initNewMemoryAddr(self, memoryIdx, dataIdxList, dataTypeList):
-        """ Init a new memory 8 bytes address with the data info. All the init must 
-            be called before the server start. 
+    def initNewMemoryAddr(self, memoryIdx, dataIdxList, dataTypeList, memSize=DEF_MEM_SIZE, area=AREA_DB):
+        """ Init a new memory address (default 8 bytes DB) with the data info. All the 
+            init must be called before the server start. 
             Args:
-                memoryIdx (int): the memory index 
+                memoryIdx (int): the memory index, the DB number for the DB area, not used 
+                    for the MK/PE/PA area (use the area type AREA_XX as the memory index
+                    to get/set the value).
                 dataIdxList (list[int]): list of data index
                 dataTypeList (list[XXX_TYPE]): list of data type matches to the data index
+                memSize (int, optional): memory size in bytes. Defaults to DEF_MEM_SIZE.
+                area (str, optional): memory area type AREA_DB/MK/PE/PA. Defaults to AREA_DB.
             Returns:
                 Bool: True if added success, else False.
         """
-        if isinstance(memoryIdx, int) and memoryIdx >= 0:
-            if str(memoryIdx) in self._dbDict.keys():
-                print("Warning: initNewMemoryAddr()> memory address %s already exist" %str(memoryIdx))
-                return False 
-            else:
-                self._dbDict[str(memoryIdx)] = {
-                    'dbData': (ctypes.c_ubyte*8)(),
-                    'dataIdx': dataIdxList,
-                    'dataType': dataTypeList
-                }
-                return True
-        else:
+        if area not in AREA_CODE.keys():
+            print("Error: initNewMemoryAddr()> invalid memory area: %s" %str(area))
+            return False
+        if area == AREA_DB and not (isinstance(memoryIdx, int) and memoryIdx >= 0):
             print("Error: initNewMemoryAddr()> input memory index need to be a >=0 int type")
             return False
+        memKey = str(memoryIdx) if area == AREA_DB else area
+        if memKey in self._dbDict.keys():
+            print("Warning: initNewMemoryAddr()> memory address %s already exist" %memKey)
+            return False 
+        try:
+            layout = memoryLayout(dataIdxList, dataTypeList, memSize=memSize)
+        except ValueError as err:
+            print("Error: initNewMemoryAddr()> invalid data layout: %s" %str(err))
+            return False
+        dbData = self._memPool.allocate(int(memSize))
+        if dbData is None:
+            print("Error: initNewMemoryAddr()> memory pool is full: %s" %str(self._memPool.getUsage()))
+            return False
+        self._dbDict[memKey] = {
+            'area': area,
+            'dbData': dbData,
+            'dataIdx': dataIdxList,
+            'dataType': dataTypeList,
+            'layout': layout
+        }
+        self._memDict[memKey] = (dbData, layout)
+        if area == AREA_DB: self._memDict[memoryIdx] = self._memDict[memKey]
+        return True
 
     #-----------------------------------------------------------------------------
     def initRegisterArea(self):
-        """ Register the new added address index and the data base to the snap7 area DB."""
-        for addressIdxStr in self._dbDict.keys():
-            addressIdx = int(addressIdxStr)
-            self._server.register_area(snap7.types.srvAreaDB, 
-                                       addressIdx, 
-                                       self._dbDict[addressIdxStr]['dbData'])
+        """ Register the new added memory addresses to the snap7 areas."""
+        for memKey, memInfo in self._dbDict.items():
+            addressIdx = int(memKey) if memInfo['area'] == AREA_DB else 0
+            self._server.register_area(AREA_CODE[memInfo['area']], addressIdx, memInfo['dbData'])
 
     #-----------------------------------------------------------------------------
     def isRunning(self):
@@ -281,32 +706,95 @@ class s7commServer(object):
     def getDBDict(self):
         return self._dbDict
 
+    def getMemPoolUsage(self):
+        return self._memPool.getUsage()
+
     def getEvent(self):
         return self._server.pick_event()
 
+    def getBurstStats(self):
+        """ Return the DB write burst coalescing statistics dict: events (DB write 
+            events received), bursts (handler calls), savedRuns (handler calls saved 
+            by merging), lastBurst and maxBurst (events merged in the burst).
+        """
+        return self.burstStats.copy()
+
     def getMemoryVal(self, memoryIdx, dataIdx):
         """ Get the value saved in the memory address under byte index.
             Args:
-                memoryIdx (int/str): memory address index.
+                memoryIdx (int/str): memory address index (AREA_XX for MK/PE/PA area).
                 dataIdx (int): data index in the memory.
             return: Value saved in the memory, None if the memory is not set.
         """
-        if str(memoryIdx) in self._dbDict.keys():
-            byteData = self._dbDict[str(memoryIdx)]['dbData']
-            typeIdx = self._dbDict[str(memoryIdx)]['dataIdx'].index(dataIdx)
-            dataType = self._dbDict[str(memoryIdx)]['dataType'][int(typeIdx)]
-            return parseS7bytes(byteData, dataIdx, dataType)
+        memInfo = self._memDict.get(memoryIdx)
+        if memInfo: return memInfo[1].decodeItem(memInfo[0], dataIdx)
         return None 
 
+    def getAll(self, memoryIdx):
+        """ Get all the values saved in the memory address in one pass.
+            Args:
+                memoryIdx (int/str): memory address index (AREA_XX for MK/PE/PA area).
+            return: dict {dataIdx: value}, None if the memory is not set.
+        """
+        memInfo = self._memDict.get(memoryIdx)
+        if memInfo: return memInfo[1].decode(memInfo[0])
+        return None
+
+    #-----------------------------------------------------------------------------
+    def _handleEvent(self, event, eventHandlerFun, printEvt):
+        """ Print the event and pass the executed DB write request (address, dataIdx, 
+            writeLen) to the event handler function.
+        """
+        if printEvt: print(" - Event: %s" % str(event))
+        if eventHandlerFun and event.EvtCode == EVT_CODE_WRITE and event.EvtRetCode == 0:  # write command executed
+            if event.EvtParam1 == EVT_AREA_DB:  # DB write
+                address, dataIdx, writeLen = event.EvtParam2, event.EvtParam3, event.EvtParam4
+                if self.burstWindow > 0:
+                    with self._burstLock:
+                        self._burstList.append((address, dataIdx, writeLen))
+                        self._burstEvt.set()
+                else:
+                    eventHandlerFun((address, dataIdx, writeLen))
+
+    def _dispatchBurst(self, eventHandlerFun):
+        """ Pass all the DB writes collected in the burst to the event handler once,
+            the same write area is only passed once.
+        """
+        with self._burstLock:
+            writeList, self._burstList = self._burstList, []
+            self._burstEvt.clear()
+        if not writeList: return
+        self.burstStats['events'] += len(writeList)
+        self.burstStats['bursts'] += 1
+        self.burstStats['savedRuns'] += len(writeList) - 1
+        self.burstStats['lastBurst'] = len(writeList)
+        self.burstStats['maxBurst'] = max(self.burstStats['maxBurst'], len(writeList))
+        eventHandlerFun(list(dict.fromkeys(writeList)))
+
     #-----------------------------------------------------------------------------
-    def startService(self, eventHandlerFun=None, printEvt=True):
+    def startService(self, eventHandlerFun=None, printEvt=True, eventMode=EVT_MODE_CALLBACK):
         """ Start the S7comm service
             Args:
                 eventHandlerFun ( function reference, optional): reference of the 
                     function used to handle the event. Defaults to None.
                 printEvt (bool, optional): flag to identify whether print the event. Defaults to True.
+                eventMode (str, optional): EVT_MODE_CALLBACK to handle the event in the snap7
+                    server thread as soon as the write is executed, EVT_MODE_POLL to handle 
+                    all the queued events every clock interval. Defaults to EVT_MODE_CALLBACK.
+            Remark: If the burst window is set (setBurstWindow()), the event handler will 
+                be called once per burst with the list of the DB writes in the burst
+                [(address, dataIdx, writeLen), ...] instead of one tuple per write.
         """
-        print("Start the S7comm event handling loop.")
+        print("Start the S7comm event handling loop (mode: %s)." %str(eventMode))
+        if eventMode == EVT_MODE_CALLBACK:
+            def eventCallback(event):
+                # exceptions can not be raised back to the snap7 native thread.
+                try:
+                    with self._evtLock:
+                        self._handleEvent(event, eventHandlerFun, printEvt)
+                except Exception as err:
+                    print("Error: startService() event handler error: %s" %str(err))
+            self._server.set_events_callback(eventCallback)
         try:
             self.initRegisterArea()
             self._server.start(self._hostPort)
@@ -315,21 +803,32 @@ class s7commServer(object):
              print("Error: startService() Error to start s7snap server: %s" %str(err))
              self.runningFlg = False 
              return None
-        # Added the loop to print the event and handle the DB change request.
+        if eventMode == EVT_MODE_CALLBACK:
+            # the events are handled by the callback, block until the server is stopped 
+            # or dispatch the collected DB writes when the burst window is closed.
+            while not self.terminate:
+                if self._burstEvt.wait(1):
+                    self._stopEvt.wait(self.burstWindow)
+                    self._dispatchBurst(eventHandlerFun)
+            return None
+        # Added the loop to print the event and handle the DB change request, drain all 
+        # the queued events in every wakeup so a write burst will not wait N clock intervals.
         while not self.terminate:
             event = self._server.pick_event()
-            if event:
-                if printEvt: print(" - Event: %s" % str(event))
-                if eventHandlerFun and event.EvtCode == 262144 and event.EvtRetCode == 0:  # write command executed
-                    if event.EvtParam1 == 132:  # DB write
-                        address, dataIdx, writeLen = event.EvtParam2, event.EvtParam3, event.EvtParam4
-                        eventHandlerFun((address, dataIdx, writeLen))
-            time.sleep(self.clockInterval)
+            while event:
+                self._handleEvent(event, eventHandlerFun, printEvt)
+                event = self._server.pick_event()
+            if self._burstEvt.is_set(): self._dispatchBurst(eventHandlerFun)
+            self._stopEvt.wait(self.clockInterval)
 
     #-----------------------------------------------------------------------------
     def setClockInterval(self, interval):
         self.clockInterval = interval
 
+    def setBurstWindow(self, window):
+        """ Set the DB write burst coalescing window in seconds, 0 to disable."""
+        self.burstWindow = max(0, float(window))
+
     #-----------------------------------------------------------------------------
     def setMemoryVal(self, memoryIdx, dataIdx, dataVal):
         """ Set the memory index byte index value.
@@ -338,30 +837,356 @@ class s7commServer(object):
                 dataIdx (int): byte index.
                 dataVal (_type_): data value
         """
-        if str(memoryIdx) in self._dbDict.keys():
-            if dataIdx in self._dbDict[str(memoryIdx)]['dataIdx']:
-                typeIdx = self._dbDict[str(memoryIdx)]['dataIdx'].index(dataIdx)
-                dataType = self._dbDict[str(memoryIdx)]['dataType'][int(typeIdx)]
-                if dataType == BOOL_TYPE:
-                    snap7.util.set_bool(self._dbDict[str(memoryIdx)]['dbData'], int(dataIdx), 0, bool(dataVal))
-                elif dataType == INT_TYPE:
-                    snap7.util.set_int(self._dbDict[str(memoryIdx)]['dbData'], int(dataIdx), int(dataVal))
-                elif dataType == REAL_TYPE:
-                    snap7.util.set_real(self._dbDict[str(memoryIdx)]['dbData'], int(dataIdx), float(dataVal))
-                else:
-                    print("Error: setMemoryVal()> invalid data type: %s" %str(dataType))
-                    return False 
-                return True
-            else:
-                print("Error: setMemoryVal()> invalid data index: %s" %str(dataIdx))
+        return self.setMany(memoryIdx, {dataIdx: dataVal})
+
+    def setMany(self, memoryIdx, valDict):
+        """ Set the values of the memory address in one pass.
+            Args:
+                memoryIdx (int/str): memory index (AREA_XX for MK/PE/PA area).
+                valDict (dict): {dataIdx: dataVal}
+            Returns:
+                Bool: True if set success, False if the data index is invalid, None if 
+                    the memory index is invalid.
+        """
+        memInfo = self._memDict.get(memoryIdx)
+        if memInfo is None:
+            print("Error: setMany()> invalid memory index: %s" %str(memoryIdx))
+            return None
+        for dataIdx in valDict.keys():
+            if dataIdx not in memInfo[1].typeMap:
+                print("Error: setMany()> invalid data index: %s" %str(dataIdx))
                 return False
-        print("Error: setMemoryVal()> invalid memory index: %s" %str(memoryIdx))
-        return None 
+        memInfo[1].encode(memInfo[0], valDict)
+        return True
 
     #-----------------------------------------------------------------------------
     def stopServer(self):
         self.runningFlg = False
         self.terminate = True
+        self._stopEvt.set()
         self._server.stop()
         self._server.destroy()
-    
+        self._memPool.flush()
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class s7Event(object):
+    """ S7comm server event with the same fields as the snap7 SrvEvent, created by the 
+        asyncio S7comm server so the event is handled same as the snap7 server event.
+    """
+    __slots__ = ('EvtTime', 'EvtSender', 'EvtCode', 'EvtRetCode', 'EvtParam1', 
+                 'EvtParam2', 'EvtParam3', 'EvtParam4')
+
+    def __init__(self, evtCode, retCode=0, param1=0, param2=0, param3=0, param4=0, sender=0):
+        self.EvtTime = int(time.time())
+        self.EvtSender = sender
+        self.EvtCode = evtCode
+        self.EvtRetCode = retCode
+        self.EvtParam1 = param1
+        self.EvtParam2 = param2
+        self.EvtParam3 = param3
+        self.EvtParam4 = param4
+
+    def __str__(self):
+        return "<event time: %s sender: %s code: %s retcode: %s param1: %s param2:%s param3: %s param4: %s>" %(
+            self.EvtTime, self.EvtSender, self.EvtCode, self.EvtRetCode, self.EvtParam1, 
+            self.EvtParam2, self.EvtParam3, self.EvtParam4)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class asyncioS7commServer(s7commServer):
+    """ Pure python S7comm server which serves all the clients from one asyncio event 
+        loop without the native snap7 lib. It parses the TPKT/COTP/S7 PDUs and handles 
+        the setup communication, read var, write var and SZL read requests with the 
+        same memory pool, memory layout and event handler (ladder logic) interfaces 
+        as the parent s7commServer. Every request is also recorded as a structured 
+        request record dict:
+            {'time', 'clientIp', 'clientPort', 'pduRef', 'function', 'items', 'latency'}
+        items: [(areaCode, dbNumber, start, size, returnCode), ...] for read/write var.
+    """
+    def __init__(self, hostIp='0.0.0.0', hostPort=102, memPoolSize=DEF_POOL_SIZE, memFile=None,
+                 pduSize=S7_DEF_PDU, backlog=1024) -> None:
+        """ Init example: server = snap7Comm.asyncioS7commServer(hostPort=102)
+            Args:
+                hostIp (str, optional): service host. Defaults to '0.0.0.0'.
+                hostPort (int, optional): service port. Defaults to 102.
+                memPoolSize (int, optional): total bytes of all the memory areas. Defaults 
+                    to DEF_POOL_SIZE.
+                memFile (str, optional): mmap file to back the memory areas. Defaults to None.
+                pduSize (int, optional): max negotiated PDU size. Defaults to S7_DEF_PDU.
+                backlog (int, optional): listen socket backlog. Defaults to 1024.
+        """
+        super().__init__(hostIp=hostIp, hostPort=hostPort, memPoolSize=memPoolSize, memFile=memFile)
+        self.pduSize = pduSize
+        self.backlog = backlog
+        self._loop = None
+        self._loopStopEvt = None
+        self._clientWriters = set()
+        self._eventHandler = None
+        self._printEvt = False
+        self._requestHandler = None
+        self.requestLog = deque(maxlen=REQ_LOG_SIZE)
+        self.serverStats = {'sessions': 0, 'activeSessions': 0, 'requests': 0, 'errors': 0}
+        self.szlDict = {}   # SZL id -> (record length, [(record index, record bytes), ...])
+        self.setCpuIdentity()
+
+    def _createServer(self):
+        return None     # no native snap7 server.
+
+    def initRegisterArea(self):
+        pass    # the memory areas are served from the memory pool directly.
+
+    #-----------------------------------------------------------------------------
+    def setCpuIdentity(self, moduleType='CPU 315-2 PN/DP', orderCode='6ES7 315-2EH14-0AB0', 
+                       serialNumber='S C-C2UR28922012', asName='SIMATIC 300(1)', 
+                       moduleName='CPU 315-2 PN/DP', plantId='', 
+                       copyright='Original Siemens Equipment', version=(3, 2, 6)):
+        """ Set the CPU identity data returned by the SZL read requests: SZL 0x0011 
+            (module identification) and 0x001C (component identification).
+        """
+        idRecords = [(index, struct.pack('>H20sHHH', index, orderCode.encode(), bgType, ausbg, ausbe))
+                     for index, bgType, ausbg, ausbe in ((1, 0, 0, 0x2020), (6, 0, 0, 0x2020), 
+                     (7, 0, 0x5600 | version[0], (version[1] << 8) | version[2]))]
+        self.setSzl(0x0011, 28, idRecords)
+        textList = ((1, asName), (2, moduleName), (3, plantId), (4, copyright), (5, serialNumber),
+                    (7, moduleType), (8, ''), (0x0A, ''), (0x0B, ''))
+        self.setSzl(0x001C, 34, [(index, struct.pack('>H32s', index, text.encode())) for index, text in textList])
+
+    def setSzl(self, szlId, recordLen, recordList):
+        """ Set the records [(record index, record bytes), ...] of one SZL id."""
+        self.szlDict[szlId] = (recordLen, recordList)
+
+    def setRequestHandler(self, handlerFun):
+        """ Set the function to handle the structured request record dict of every request."""
+        self._requestHandler = handlerFun
+
+    def getRequestLog(self):
+        return list(self.requestLog)
+
+    def getServerStats(self):
+        return self.serverStats.copy()
+
+    #-----------------------------------------------------------------------------
+    def _getAreaMemory(self, areaCode, dbNumber):
+        """ Return the memory ctypes array of the S7 area, None if not registered."""
+        area = S7_AREA_CODE.get(areaCode)
+        if area is None: return None
+        memInfo = self._memDict.get(dbNumber if area == AREA_DB else area)
+        return None if memInfo is None else memInfo[0]
+
+    def _emitEvent(self, event):
+        """ Pass the event to the event handler (with the burst coalescing) in the loop."""
+        burstOpen = self._burstEvt.is_set()
+        try:
+            self._handleEvent(event, self._eventHandler, self._printEvt)
+        except Exception as err:
+            print("Error: _emitEvent() event handler error: %s" %str(err))
+        if self.burstWindow > 0 and not burstOpen and self._burstEvt.is_set():
+            self._loop.call_later(self.burstWindow, self._dispatchBurst, self._eventHandler)
+
+    def _readItem(self, transSize, count, dbNumber, areaCode, address):
+        """ Read one S7ANY item, return (return code, data transport size, data length, data)."""
+        memory = self._getAreaMemory(areaCode, dbNumber)
+        if memory is None: return S7_RET_NO_OBJ, 0, 0, b''
+        if transSize not in S7_ELEMENT_SIZE: return S7_RET_TYPE_ERR, 0, 0, b''
+        start = address >> 3
+        if transSize == 0x01:   # bit access
+            if start >= len(memory): return S7_RET_OUT_RANGE, 0, 0, b''
+            return S7_RET_OK, S7_TS_BIT, 1, bytes(((memory[start] >> (address & 7)) & 1,))
+        size = count * S7_ELEMENT_SIZE[transSize]
+        if start + size > len(memory): return S7_RET_OUT_RANGE, 0, 0, b''
+        data = bytes(memoryview(memory).cast('B')[start:start + size])
+        if transSize in (0x1C, 0x1D): return S7_RET_OK, S7_TS_OCTET, size, data
+        return S7_RET_OK, S7_TS_BYTE, size * 8, data
+
+    def _writeItem(self, transSize, dbNumber, areaCode, address, data):
+        """ Write one S7ANY item, return (return code, start byte, size)."""
+        memory = self._getAreaMemory(areaCode, dbNumber)
+        if memory is None: return S7_RET_NO_OBJ, 0, 0
+        if transSize not in S7_ELEMENT_SIZE: return S7_RET_TYPE_ERR, 0, 0
+        start = address >> 3
+        if transSize == 0x01:   # bit access
+            if start >= len(memory) or not data: return S7_RET_OUT_RANGE, 0, 0
+            bitMask = 1 << (address & 7)
+            memory[start] = (memory[start] | bitMask) if data[0] & 1 else (memory[start] & ~bitMask & 0xFF)
+            return S7_RET_OK, start, 1
+        if start + len(data) > len(memory): return S7_RET_OUT_RANGE, 0, 0
+        memoryview(memory).cast('B')[start:start + len(data)] = data
+        return S7_RET_OK, start, len(data)
+
+    #-----------------------------------------------------------------------------
+    def _handleJob(self, param, data, record, sender):
+        """ Handle one S7 job request, return (error class, error code, response param, 
+            response data).
+        """
+        funCode = param[0] if param else None
+        if funCode == S7_FUN_SETUP and len(param) >= 8:
+            record['function'] = 'setup'
+            amqCaller, amqCallee, pduSize = struct.unpack_from('>HHH', param, 2)
+            return 0, 0, struct.pack('>BBHHH', S7_FUN_SETUP, 0, amqCaller, amqCallee, min(pduSize, self.pduSize)), b''
+        if funCode in (S7_FUN_READ, S7_FUN_WRITE) and len(param) >= 2:
+            itemNum = min(param[1], (len(param) - 2) // 12)
+            itemList = []
+            for i in range(itemNum):
+                specType, _, syntaxId, transSize, count, dbNumber, areaCode = S7_ANY_ITEM.unpack_from(param, 2 + 12*i)
+                address = int.from_bytes(param[2 + 12*i + 9:2 + 12*i + 12], 'big')
+                itemList.append((specType == 0x12 and syntaxId == 0x10, transSize, count, dbNumber, areaCode, address))
+            respData = bytearray()
+            if funCode == S7_FUN_READ:
+                record['function'] = 'read'
+                for i, (validFlg, transSize, count, dbNumber, areaCode, address) in enumerate(itemList):
+                    retCode, dataTs, dataLen, itemData = self._readItem(transSize, count, dbNumber, areaCode, address) \
+                        if validFlg else (S7_RET_TYPE_ERR, 0, 0, b'')
+                    record['items'].append((areaCode, dbNumber, address >> 3, len(itemData), retCode))
+                    respData += S7_DATA_ITEM.pack(retCode, dataTs, dataLen) + itemData
+                    if len(itemData) & 1 and i < itemNum - 1: respData += b'\x00'
+                    if retCode == S7_RET_OK:
+                        self._emitEvent(s7Event(EVT_CODE_READ, 0, areaCode, dbNumber, address >> 3, len(itemData), sender))
+            else:
+                record['function'] = 'write'
+                pos = 0
+                for i, (validFlg, transSize, count, dbNumber, areaCode, address) in enumerate(itemList):
+                    if pos + 4 > len(data): 
+                        respData.append(S7_RET_OUT_RANGE)
+                        continue
+                    _, dataTs, dataLen = S7_DATA_ITEM.unpack_from(data, pos)
+                    size = (dataLen + 7) // 8 if dataTs in (S7_TS_BIT, S7_TS_BYTE, 0x05) else dataLen
+                    itemData = bytes(data[pos + 4:pos + 4 + size])
+                    pos += 4 + size + (size & 1)
+                    retCode, start, size = self._writeItem(transSize, dbNumber, areaCode, address, itemData) \
+                        if validFlg else (S7_RET_TYPE_ERR, 0, 0)
+                    record['items'].append((areaCode, dbNumber, start, size, retCode))
+                    respData.append(retCode)
+                    if retCode == S7_RET_OK:
+                        self._emitEvent(s7Event(EVT_CODE_WRITE, 0, areaCode, dbNumber, start, size, sender))
+            return 0, 0, bytes((funCode, itemNum)), bytes(respData)
+        record['function'] = 'unknown'
+        return 0x81, 0x04, param[:1], b''   # function not supported.
+
+    def _handleUserData(self, param, data, record):
+        """ Handle one S7 userdata request (SZL read), return (response param, response data)."""
+        if len(param) < 8: return None, None
+        typeGroup, subFunCode, seqNum = param[5], param[6], param[7]
+        respParam = bytes((0x00, 0x01, 0x12, 0x08, 0x12, 0x80 | (typeGroup & 0x0F), subFunCode, seqNum, 0, 0))
+        if typeGroup & 0x0F == 4 and subFunCode == 0x01 and len(data) >= 8:
+            record['function'] = 'szl'
+            szlId, index = struct.unpack_from('>HH', data, 4)
+            record['items'].append((0, szlId, index, 0, S7_RET_OK))
+            if szlId in self.szlDict:
+                recordLen, recordList = self.szlDict[szlId]
+                records = b''.join(recordBytes for recordIdx, recordBytes in recordList 
+                                   if index == 0 or recordIdx == index)
+                payload = struct.pack('>HHHH', szlId, index, recordLen, len(records) // recordLen) + records
+                return respParam + b'\x00\x00', S7_DATA_ITEM.pack(S7_RET_OK, S7_TS_OCTET, len(payload)) + payload
+        else:
+            record['function'] = 'userdata'
+        return respParam + b'\xd4\x01', S7_DATA_ITEM.pack(S7_RET_NO_OBJ, 0, 0)   # object not exist.
+
+    def processPdu(self, s7Data, clientIp='127.0.0.1', clientPort=0):
+        """ Process one S7 PDU without network connection, return the response S7 PDU 
+            bytes (None if no response should be sent).
+        """
+        startT = time.perf_counter()
+        if len(s7Data) < S7_HEADER.size or s7Data[0] != S7_PROTOCOL_ID: return None
+        _, rosctr, _, pduRef, paramLen, dataLen = S7_HEADER.unpack_from(s7Data)
+        param = s7Data[S7_HEADER.size:S7_HEADER.size + paramLen]
+        data = s7Data[S7_HEADER.size + paramLen:S7_HEADER.size + paramLen + dataLen]
+        record = {'time': time.time(), 'clientIp': clientIp, 'clientPort': clientPort,
+                  'pduRef': pduRef, 'function': None, 'items': [], 'latency': 0}
+        sender = struct.unpack('<I', socket.inet_aton(clientIp))[0] if clientIp.count('.') == 3 else 0
+        if rosctr == S7_JOB:
+            errClass, errCode, respParam, respData = self._handleJob(param, data, record, sender)
+            response = S7_ACK_HEADER.pack(S7_PROTOCOL_ID, S7_ACK_DATA, 0, pduRef, len(respParam), 
+                                          len(respData), errClass, errCode) + respParam + respData
+        elif rosctr == S7_USERDATA:
+            respParam, respData = self._handleUserData(param, data, record)
+            if respParam is None: return None
+            response = S7_HEADER.pack(S7_PROTOCOL_ID, S7_USERDATA, 0, pduRef, len(respParam), 
+                                      len(respData)) + respParam + respData
+        else:
+            return None
+        self.serverStats['requests'] += 1
+        record['latency'] = time.perf_counter() - startT
+        self.requestLog.append(record)
+        if self._requestHandler:
+            try:
+                self._requestHandler(record)
+            except Exception as err:
+                print("Error: processPdu() request handler error: %s" %str(err))
+        return response
+
+    #-----------------------------------------------------------------------------
+    async def _handleClient(self, reader, writer):
+        """ Handle all the TPKT/COTP packets of one client connection."""
+        self._clientWriters.add(writer)
+        self.serverStats['sessions'] += 1
+        self.serverStats['activeSessions'] += 1
+        peerName = writer.get_extra_info('peername')
+        clientIp, clientPort = peerName[0], peerName[1]
+        s7Buffer = bytearray()
+        try:
+            while True:
+                version, _, length = TPKT_HEADER.unpack(await reader.readexactly(TPKT_HEADER.size))
+                if version != 3 or length < TPKT_HEADER.size + 3: break
+                cotp = await reader.readexactly(length - TPKT_HEADER.size)
+                cotpType = cotp[1] & 0xF0
+                if cotpType == COTP_CR and len(cotp) >= 7:
+                    # connection confirm: swap the references and echo the parameters (TSAP, TPDU size).
+                    respCotp = bytes((cotp[0], COTP_CC)) + cotp[4:6] + b'\x00\x01\x00' + cotp[7:cotp[0] + 1]
+                elif cotpType == COTP_DT:
+                    s7Buffer += cotp[cotp[0] + 1:]
+                    if not cotp[2] & 0x80: continue     # wait for the last data unit.
+                    s7Resp = self.processPdu(bytes(s7Buffer), clientIp=clientIp, clientPort=clientPort)
+                    s7Buffer.clear()
+                    if s7Resp is None:
+                        self.serverStats['errors'] += 1
+                        continue
+                    respCotp = b'\x02\xf0\x80' + s7Resp
+                else:
+                    break   # disconnect request or not supported COTP PDU.
+                writer.write(TPKT_HEADER.pack(3, 0, TPKT_HEADER.size + len(respCotp)) + respCotp)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, OSError):
+            pass # client closed the connection or server stopped.
+        finally:
+            self.serverStats['activeSessions'] -= 1
+            self._clientWriters.discard(writer)
+            writer.close()
+
+    async def _asyncServe(self):
+        """ Start the event loop socket server and serve until stopServer() is called."""
+        self._loop = asyncio.get_running_loop()
+        self._loopStopEvt = asyncio.Event()
+        service = await asyncio.start_server(self._handleClient, host=self._hostIp,
+                                             port=self._hostPort, backlog=self.backlog,
+                                             reuse_address=True)
+        self.runningFlg = True
+        try:
+            async with service:
+                await self._loopStopEvt.wait()
+                for writer in list(self._clientWriters): writer.close()
+        finally:
+            self.runningFlg = False
+
+    #-----------------------------------------------------------------------------
+    def startService(self, eventHandlerFun=None, printEvt=True, eventMode=EVT_MODE_CALLBACK):
+        """ Start the asyncio S7comm service, this function will block until stopServer() 
+            is called. The events are always handled in the event loop when the request 
+            is processed, the eventMode is not used.
+        """
+        print("Start the asyncio S7comm server.")
+        self._eventHandler = eventHandlerFun
+        self._printEvt = printEvt
+        try:
+            asyncio.run(self._asyncServe())
+        except OSError as err:
+            print("Error: startService() Error to start asyncio S7comm server: %s" %str(err))
+            self.runningFlg = False
+        return None
+
+    def stopServer(self):
+        """ Stop the server, can be called from any thread."""
+        self.terminate = True
+        if self.runningFlg and self._loop:
+            self._loop.call_soon_threadsafe(self._loopStopEvt.set)
+        self._memPool.flush()
@@ -14,11 +14,20 @@
 # License:     MIT License    
 #-----------------------------------------------------------------------------
 
+import sys
+import time
+import signal
+import socket
+import multiprocessing
+import multiprocessing.connection
 from datetime import timedelta 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
+from werkzeug.serving import make_server
 
 import monitorGlobal as gv
 import monitorDataMgr as dataMgr
+import monitorIngest
+import monitorShared
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -30,7 +39,29 @@ def createApp():
     app.config['REMEMBER_COOKIE_DURATION'] = timedelta(seconds=gv.COOKIE_TIME)
     return app
 
-gv.iDataMgr = dataMgr.DataManger()
+def initHub(workerIdx=0, shared=False):
+    """ Init the data manager and the report ingestion of the hub (worker) process.
+        Args:
+            workerIdx (int, optional): hub worker process index. Defaults to 0.
+            shared (bool, optional): True to share the reports with the other workers
+                through the shared log. Defaults to False.
+    """
+    gv.gWorkerIdx = workerIdx
+    gv.iDataMgr = dataMgr.DataManger()
+    ingestTarget = gv.iDataMgr
+    if shared:
+        # the ingest worker appends the requests to the shared log, the shared log sync
+        # thread applies the requests of all the workers to the data manager.
+        gv.iSharedLog = monitorShared.sharedLog(gv.gSharedDB, gv.iDataMgr, workerIdx=workerIdx)
+        gv.iSharedLog.start()
+        ingestTarget = gv.iSharedLog
+    # The report requests are applied to the data manager by the ingest worker thread.
+    gv.iIngestWorker = monitorIngest.ingestWorker(ingestTarget, queueSize=gv.gIngestQueueSize,
+                                                  batchSize=gv.gIngestBatchSize)
+    gv.iIngestWorker.start()
+
+# The multi-process hub inits every worker after fork (the threads are not forked).
+if gv.gWorkerNum <= 1: initHub()
 app = createApp()
 
 #-----------------------------------------------------------------------------
@@ -47,9 +78,10 @@ def index():
 @app.route('/controllerview')
 def controllerview():
     """ route to PLC controllers subsystem view page."""
-    infoList = gv.iDataMgr.getAllControllerState()
+    version, infoList = gv.iDataMgr.getVersioned(gv.iDataMgr.getAllControllerState)
     posts = {'page': 1,
-             'controllerinfo': infoList
+             'controllerinfo': infoList,
+             'version': version
              }
     return render_template('controllerview.html', posts=posts)
 
@@ -57,9 +89,10 @@ def controllerview():
 @app.route('/plcemuview')
 def plcemuview():
     """ route to PLC emulators subsystem view page."""
-    infoList = gv.iDataMgr.getAllPlcState()
+    version, infoList = gv.iDataMgr.getVersioned(gv.iDataMgr.getAllPlcState)
     posts = {'page': 2,
-             'plcinfo': infoList
+             'plcinfo': infoList,
+             'version': version
              }
     return render_template('plcemuview.html', posts=posts)
 
@@ -67,9 +100,9 @@ def plcemuview():
 @app.route('/plc/<string:postID>')
 def plcpeerstate(postID):
     """ route to the individual PLC emulator state page."""
-    plcInfo = gv.iDataMgr.getPlcState(postID)
-    posts = { 'plcinfo': plcInfo}
-    reportDict = gv.iDataMgr.getPlcReport(postID)
+    version, (plcInfo, reportDict) = gv.iDataMgr.getVersioned(
+        lambda: (gv.iDataMgr.getPlcState(postID), gv.iDataMgr.getPlcReport(postID)))
+    posts = { 'plcinfo': plcInfo, 'agentID': postID, 'version': version}
     if reportDict is not None: posts.update(reportDict)
     return render_template('plcpeerstate.html', posts=posts)
 
@@ -77,12 +110,74 @@ def plcpeerstate(postID):
 @app.route('/controller/<string:postID>')
 def ctrlpeerstate(postID):
     """ route to the individual PLC controller state page."""
-    controllerInfo = gv.iDataMgr.getControllerState(postID)
-    posts = {'controllerinfo': controllerInfo}
-    reportDict = gv.iDataMgr.getControllerReport(postID)
+    version, (controllerInfo, reportDict) = gv.iDataMgr.getVersioned(
+        lambda: (gv.iDataMgr.getControllerState(postID), gv.iDataMgr.getControllerReport(postID)))
+    posts = {'controllerinfo': controllerInfo, 'agentID': postID, 'version': version}
     if reportDict is not None: posts.update(reportDict)
     return render_template('ctrlpeerstate.html', posts=posts)
 
+#-----------------------------------------------------------------------------
+# Versioned JSON API, the dashboard pages use the /api/v1/stream to update in place.
+def _getDeltaArgs():
+    """ Return the (sinceVer, view, agentID) of the API request."""
+    sinceVer = request.headers.get('Last-Event-ID') or request.args.get('since', 0)
+    try:
+        sinceVer = int(sinceVer)
+    except ValueError:
+        sinceVer = 0
+    return sinceVer, request.args.get('view'), request.args.get('id')
+
+@app.route('/api/v1/state')
+def apiState():
+    """ Return the agents (and the agent's reports if id is set) changed after the version.
+        API call example:
+            GET /api/v1/state?since=<version>&view=<plc|controller>&id=<agentID>
+    """
+    sinceVer, view, agentID = _getDeltaArgs()
+    _, deltaJson, _ = gv.iDataMgr.getDelta(sinceVer, view=view, agentID=agentID)
+    return Response(deltaJson, mimetype='application/json')
+
+@app.route('/api/v1/stream')
+def apiStream():
+    """ Server-Sent-Events stream of the changes, every event is the /api/v1/state delta 
+        since the last event (the event id is the version, so the browser EventSource 
+        continues from the Last-Event-ID after reconnect).
+    """
+    sinceVer, view, agentID = _getDeltaArgs()
+    def eventStream(sinceVer):
+        while True:
+            version = gv.iDataMgr.waitVersion(sinceVer, timeout=gv.gSseHeartbeat)
+            if version == sinceVer:
+                yield ': keepalive\n\n'
+                continue
+            version, deltaJson, changedNum = gv.iDataMgr.getDelta(sinceVer, view=view, agentID=agentID)
+            sinceVer = version
+            if not changedNum: continue # the changes are not in the viewer's view.
+            yield 'id: %d\ndata: %s\n\n' % (version, deltaJson)
+            # merge the changes in the interval into one event.
+            time.sleep(gv.gSseMinInterval)
+    return Response(eventStream(sinceVer), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+#-----------------------------------------------------------------------------
+@app.route('/history/<string:agentID>')
+@app.route('/api/v1/history/<string:agentID>')
+def history(agentID):
+    """ Query the history reports of a PLC emulator or controller.
+        API call example: all alerts of PLC X between T1 and T2:
+            GET /history/PLC-X?type=alert&start=2024-12-20 10:00:00&end=2024-12-20 12:00:00
+            GET /history/PLC-X?type=alert&rollup=1 (hourly report count)
+    """
+    limit = request.args.get('limit', type=int)
+    if 'limit' in request.args and (limit is None or limit <= 0):
+        return jsonify({"ok": False, "error": "invalid limit"}), 400
+    rollup = str(request.args.get('rollup')).lower() in ('1', 'true')
+    result = gv.iDataMgr.getHistory(agentID, reportType=request.args.get('type'),
+                                    startT=request.args.get('start'), endT=request.args.get('end'),
+                                    limit=limit, rollup=rollup)
+    if result is None: return jsonify({"ok": False, "error": "history store not enabled"})
+    return jsonify({"ok": True, "id": agentID, "result": result})
+
 #-----------------------------------------------------------------------------
 @app.route('/dataPost', methods=('POST',))
 def dataPost():
@@ -90,16 +185,99 @@ def dataPost():
         API call example:
             requests.post(http://%s:%s/dataPost/<devID>, json={})
     """
-    content = request.json
-    gv.gDebugPrint("Raw Data: %s" % str(content), prt=True, logType=gv.LOG_INFO)
-    result = gv.iDataMgr.handleRequest(content) if gv.iDataMgr else {"ok": True}
-    return jsonify(result)
+    content = request.get_json(silent=True)
+    if gv.DEBUG_FLG: gv.gDebugPrint("Raw Data: %s" % str(content), prt=True, logType=gv.LOG_INFO)
+    return _ingestRequest(content, batch=False)
+
+@app.route('/dataPostBatch', methods=('POST',))
+def dataPostBatch():
+    """ Handle PLC emulator and controller batch data report request.
+        API call example:
+            requests.post(http://%s:%s/dataPostBatch, json={'ID':<str>, 'Data':[...]})
+    """
+    content = request.get_json(silent=True)
+    if gv.DEBUG_FLG: gv.gDebugPrint("Batch Data: %s" % str(content), prt=True, logType=gv.LOG_INFO)
+    return _ingestRequest(content, batch=True)
+
+def _ingestRequest(content, batch=False):
+    """ Queue the report request to the ingest worker and reply immediately, reply HTTP 
+        400 if the request is not valid and HTTP 429 with the Retry-After seconds if the 
+        ingest queue is full.
+    """
+    result, retryAfter = gv.iIngestWorker.submit(content, batch=batch)
+    if result == monitorIngest.ST_INVALID:
+        return jsonify({"ok": False, "error": "invalid report request"}), 400
+    if result == monitorIngest.ST_BUSY:
+        resp = jsonify({"ok": False, "error": "monitor hub busy", "retryAfter": retryAfter})
+        resp.headers['Retry-After'] = str(retryAfter)
+        return resp, 429
+    replyDict = {"ok": True, "queued": True}
+    if batch: replyDict['count'] = len(content['Data'])
+    return jsonify(replyDict)
+
+@app.route('/api/v1/ingestStats')
+def ingestStats():
+    """ Return the report ingestion throughput and queue state."""
+    statsDict = gv.iIngestWorker.getStats()
+    if gv.iSharedLog: statsDict['shared'] = gv.iSharedLog.getStats()
+    return jsonify(statsDict)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+# Multi-process hub: the workers accept the connections from one listening socket.
+def runWorker(workerIdx, sockFd):
+    """ Hub worker process main function."""
+    initHub(workerIdx=workerIdx, shared=True)
+    server = make_server(gv.gflaskHost, gv.gflaskPort, app, threaded=True, fd=sockFd)
+    gv.gDebugPrint("Hub worker %d started." % workerIdx, logType=gv.LOG_INFO)
+    server.serve_forever()
+
+def runWorkers(workerNum):
+    """ Start the hub worker processes, restart the worker 1..N when it exits (it reloads
+        the snapshots) and stop the hub if the worker 0 (which owns the state) exits.
+    """
+    monitorShared.initSharedDB(gv.gSharedDB)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((gv.gflaskHost, gv.gflaskPort))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    ctx = multiprocessing.get_context('fork')
+    newWorker = lambda idx: ctx.Process(target=runWorker, args=(idx, sock.fileno()), daemon=True)
+    workerList = [newWorker(idx) for idx in range(workerNum)]
+    for worker in workerList: worker.start()
+    gv.gDebugPrint("Monitor hub started %d workers on port %d." % (workerNum, gv.gflaskPort),
+                   logType=gv.LOG_INFO)
+    # stop the workers when the hub is stopped (docker stop sends SIGTERM).
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while workerList[0].is_alive():
+            multiprocessing.connection.wait([worker.sentinel for worker in workerList])
+            for idx, worker in enumerate(workerList[1:], start=1):
+                if worker.is_alive(): continue
+                print("Error: hub worker %d exited (code %s), restart it." % (idx, str(worker.exitcode)))
+                time.sleep(1)   # don't spin if the worker keeps failing.
+                workerList[idx] = newWorker(idx)
+                workerList[idx].start()
+        print("Error: hub worker 0 exited (code %s), stop the hub." % str(workerList[0].exitcode))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workerList: worker.terminate()
+        for worker in workerList: worker.join()
+        sock.close()
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 if __name__ == '__main__':
-    #app.run(host="0.0.0.0", port=5000,  debug=False, threaded=True)
-    app.run(host=gv.gflaskHost,
-        port=gv.gflaskPort,
-        debug=gv.gflaskDebug,
-        threaded=gv.gflaskMultiTH)
+    if gv.gWorkerNum > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        runWorkers(gv.gWorkerNum)
+    else:
+        if gv.gWorkerNum > 1:
+            print("Error: multi-process hub needs fork, run the single process hub.")
+            initHub()
+        #app.run(host="0.0.0.0", port=5000,  debug=False, threaded=True)
+        app.run(host=gv.gflaskHost,
+            port=gv.gflaskPort,
+            debug=gv.gflaskDebug,
+            threaded=gv.gflaskMultiTH)
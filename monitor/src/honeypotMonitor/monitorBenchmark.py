@@ -0,0 +1,225 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        monitorBenchmark.py [python3]
+#
+# Purpose:     This module is a load testing and benchmark tool for the multi-process
+#              monitor hub. It starts the hub (monitorApp.runWorkers()) with N worker
+#              processes on loopback with temporary databases in a sub process, then
+#              many client processes send the report requests to the /dataPost API and
+#              the tool waits until the worker 0 applied all the reports to measure:
+#              - reqPerSec: accepted report requests per second (HTTP side).
+#              - applyPerSec: end to end reports per second (accepted and applied).
+#              - hub CPU time per request (all the worker processes), which should
+#                stay the same when the worker number increases.
+#              - applier time per request: the worker 0 apply time, it is the upper
+#                bound of the hub ingestion rate (1/applier time) when there are
+#                enough CPU cores for the HTTP handling of the workers.
+#              The result can be saved as json file to track the regression between
+#              releases.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2024/12/26
+# version:     v_0.1.3
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Usage example:
+    python monitorBenchmark.py --workers 1 2 4 --clients 8 --requests 500
+    python monitorBenchmark.py --workers 4 --json result.json
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+
+import requests
+
+BENCH_HOST = '127.0.0.1'
+BENCH_PORT = 5090
+REQ_TIMEOUT = 5     # request time out in seconds, timeout request counted as failed.
+APPLY_TIMEOUT = 120 # max time to wait the worker 0 applying all the reports.
+
+#-----------------------------------------------------------------------------
+def runHub(workerNum, port, tmpDir):
+    """ Start the multi-process monitor hub (sub process target function).
+        Args:
+            workerNum (int): number of the hub worker processes.
+            port (int): hub port.
+            tmpDir (str): folder of the shared log and history databases.
+    """
+    # the hub print() and the request log are not part of the result.
+    sys.stdout = sys.stderr = open(os.devnull, 'w')
+    import monitorGlobal as gv
+    gv.gWorkerNum = workerNum
+    gv.gflaskHost = BENCH_HOST
+    gv.gflaskPort = port
+    gv.gSharedDB = os.path.join(tmpDir, 'shared.db')
+    gv.gHistoryDB = os.path.join(tmpDir, 'history.db')
+    import monitorApp
+    monitorApp.runWorkers(workerNum)
+
+def waitHubReady(url, timeout=10):
+    """ Wait until the hub is accepting the requests."""
+    endT = time.time() + timeout
+    while time.time() < endT:
+        try:
+            requests.get(url + '/api/v1/ingestStats', timeout=0.5)
+            return True
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    return False
+
+def getWorkerStats(url, workerNum, tryNum=50):
+    """ Return the {workerIdx: shared log stats} of the hub workers (the connections are
+        distributed to the workers by the OS, so try several times).
+    """
+    statsDict = {}
+    for _ in range(tryNum):
+        try:
+            resp = requests.get(url + '/api/v1/ingestStats', headers={'Connection': 'close'},
+                                timeout=REQ_TIMEOUT)
+            sharedDict = resp.json().get('shared')
+        except (requests.exceptions.RequestException, ValueError):
+            continue
+        if sharedDict: statsDict[sharedDict['worker']] = sharedDict
+        if len(statsDict) == workerNum: break
+    return statsDict
+
+#-----------------------------------------------------------------------------
+def buildLogin(agentID):
+    return {'ID': agentID, 'Action': 'login',
+            'Data': {'Type': 'plc', 'ID': agentID, 'IP': BENCH_HOST, 'Protocol': 'Modbus',
+                     'LadderID': 'benchLadder'}}
+
+def buildReport(agentID, idx):
+    reportType = 'alert' if idx % 10 == 0 else 'normal'
+    return {'ID': agentID, 'Action': reportType,
+            'Data': {'type': reportType, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                     'message': 'benchmark report %d' % idx}}
+
+def runClient(url, clientIdx, reqNum, resultQueue):
+    """ Client process: login one agent and send reqNum report requests in sequence,
+        put the (sent count, failed count) in the result queue.
+    """
+    agentID = 'benchPlc%d' % clientIdx
+    session = requests.Session()
+    sentCount = failCount = 0
+    for idx in range(reqNum + 1):
+        reqDict = buildReport(agentID, idx) if idx else buildLogin(agentID)
+        while True:
+            try:
+                resp = session.post(url + '/dataPost', json=reqDict, timeout=REQ_TIMEOUT)
+            except requests.exceptions.RequestException:
+                failCount += 1
+                break
+            if resp.status_code == 429:
+                # the hub ingest queue is full, retry as the agent's monitor client does.
+                time.sleep(float(resp.headers.get('Retry-After', 1)))
+                continue
+            if resp.status_code == 200:
+                sentCount += 1
+            else:
+                failCount += 1
+            break
+    resultQueue.put((sentCount, failCount))
+
+#-----------------------------------------------------------------------------
+def benchWorkers(workerNum, port, args):
+    """ Run the report load test against the hub with workerNum worker processes."""
+    url = 'http://%s:%d' % (BENCH_HOST, port)
+    ctx = multiprocessing.get_context('fork')
+    hubProc = ctx.Process(target=runHub, args=(workerNum, port, tempfile.mkdtemp()))
+    hubProc.start()
+    result = {'workers': workerNum}
+    try:
+        if not waitHubReady(url):
+            print("Error: benchWorkers() hub with %d workers not started." % workerNum)
+            return None
+        resultQueue = ctx.Queue()
+        clientList = [ctx.Process(target=runClient, args=(url, idx, args.requests, resultQueue))
+                      for idx in range(args.clients)]
+        startT = time.perf_counter()
+        for client in clientList: client.start()
+        sentCount = failCount = 0
+        for _ in clientList:
+            sent, failed = resultQueue.get()
+            sentCount, failCount = sentCount + sent, failCount + failed
+        sendSec = time.perf_counter() - startT
+        for client in clientList: client.join()
+        # wait until the worker 0 applied all the accepted requests.
+        applied, endT = 0, time.time() + APPLY_TIMEOUT
+        while time.time() < endT:
+            applied = getWorkerStats(url, workerNum).get(0, {}).get('applied', 0)
+            if applied >= sentCount: break
+            time.sleep(0.05)
+        applySec = time.perf_counter() - startT
+        statsDict = getWorkerStats(url, workerNum)
+    finally:
+        # the client processes are reaped, the children CPU time change is the hub's.
+        cpuStart = resource.getrusage(resource.RUSAGE_CHILDREN)
+        os.kill(hubProc.pid, signal.SIGTERM)
+        hubProc.join()
+        cpuEnd = resource.getrusage(resource.RUSAGE_CHILDREN)
+    reqCount = max(1, sentCount)
+    hubCpuSec = (cpuEnd.ru_utime - cpuStart.ru_utime) + (cpuEnd.ru_stime - cpuStart.ru_stime)
+    applierSec = statsDict.get(0, {}).get('applySec', 0)
+    result.update({
+        'sent': sentCount,
+        'failed': failCount,
+        'applied': applied,
+        'reqPerSec': round(sentCount / sendSec, 1),
+        'applyPerSec': round(applied / applySec, 1),
+        'hubCpuUsPerReq': round(hubCpuSec / reqCount * 1e6, 1),
+        'applierUsPerReq': round(applierSec / reqCount * 1e6, 1),
+        'workersSeen': sorted(statsDict.keys()),
+    })
+    return result
+
+def showResult(resultList):
+    print("\n%-8s %8s %7s %8s %10s %12s %12s %14s" % ('workers', 'sent', 'failed', 'applied', 'req/s',
+                                                     'applied/s', 'hubCpu(us)', 'applier(us)'))
+    for rst in resultList:
+        print("%-8s %8s %7s %8s %10s %12s %12s %14s" % (rst['workers'], rst['sent'], rst['failed'],
+                                                        rst['applied'], rst['reqPerSec'], rst['applyPerSec'],
+                                                        rst['hubCpuUsPerReq'], rst['applierUsPerReq']))
+    print("\nCPU cores: %s, applier bound: %s reports/s" % (
+        os.cpu_count(), ", ".join("%s" % round(1e6 / rst['applierUsPerReq']) for rst in resultList
+                                  if rst['applierUsPerReq'])))
+
+#-----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Multi-process monitor hub benchmark.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='hub worker numbers.')
+    parser.add_argument('--port', type=int, default=BENCH_PORT)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client processes.')
+    parser.add_argument('--requests', type=int, default=500, help='reports sent by each client.')
+    parser.add_argument('--json', default=None, help='save the result to the json file.')
+    args = parser.parse_args()
+    resultList = []
+    for idx, workerNum in enumerate(args.workers):
+        rst = benchWorkers(workerNum, args.port + idx, args)
+        if rst: resultList.append(rst)
+    showResult(resultList)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({'meta': getMetaInfo(args), 'results': resultList}, fh, indent=4)
+        print("\nResult saved to %s" % args.json)
+
+def getMetaInfo(args):
+    """ Return the benchmark environment and parameters info."""
+    return {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpuCount': os.cpu_count(),
+            'args': vars(args)}
+
+if __name__ == '__main__':
+    main()
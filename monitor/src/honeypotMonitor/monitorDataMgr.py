@@ -16,14 +16,23 @@
 #-----------------------------------------------------------------------------
 
 import time
+import json
+import heapq
+import threading
+from collections import deque
+
 import monitorGlobal as gv
+from monitorHistory import historyStore, parseTime
 
-RCD_NUM = 10 # Record number keep by the agent. 
+RCD_NUM = 10 # Record number keep by the agent in memory (all reports are in the history store).
+CHANGE_LOG_NUM = 10000  # Number of the agent change records kept for the incremental update.
+DELTA_CACHE_NUM = 64    # Number of the serialized delta kept for the dashboard viewers.
 
 RPT_NORMAL = 'normal'
 RPT_WARN = 'warning'
 RPT_ALERT = 'alert'
 RPT_LOGIN = 'login'
+RPT_STATE = 'state'     # agent online/offline state change event.
 
 PLC_TYPE = 'plc'
 CTRL_TYPE = 'controller'
@@ -36,37 +45,46 @@ class agentDev(object):
         self.id = id
         self.ipaddress = ipaddress
         self.protocol = protocol
-        self.reportList = [] # list to store the report dict() data. 
-        self.exceptList = [] # list to store the exception dict() data.
+        # ring buffers to store the (version, report dict()) and (version, exception dict()).
+        self.reportList = deque(maxlen=rcdLimit)
+        self.exceptList = deque(maxlen=rcdLimit)
+        self.version = 0    # data manager version of the agent's last change.
         self.rcdLimit = rcdLimit
         self.loginTime = time.time()
         self.lastUpdateTime = self.loginTime
         self.online = True
+        self.tracked = False    # the agent is in the online tracker heap.
         self.totalExpCount = 0
         self.totalRptCount = 0
+        self.dropCount = 0  # reports dropped on the agent side (reported in the batch).
 
     #-----------------------------------------------------------------------------
-    def addOneReport(self, reportDict):
-        """ Add one report data dict into the report list."""
+    def addOneReport(self, reportDict, version=0):
+        """ Add one report data dict into the report list, the aggregated report dict 
+            has the 'count' of the repeated reports.
+        """
         self.lastUpdateTime = time.time()
-        self.totalRptCount += 1
-        if len(self.reportList) > self.rcdLimit: self.reportList.pop(0)
-        self.reportList.append(reportDict)
+        self.totalRptCount += reportDict.get('count', 1)
+        self.reportList.append((version, reportDict))
         if reportDict['type'] == RPT_ALERT or reportDict['type'] == RPT_WARN:
-            self.addExcept(reportDict)
+            self.addExcept(reportDict, version=version)
+
+    def addStateEvent(self, eventDict, version=0):
+        """ Add the online/offline state change event into the report list (not counted 
+            as a report).
+        """
+        self.reportList.append((version, eventDict))
 
-    def addExcept(self, exceptDict):
+    def addExcept(self, exceptDict, version=0):
         """ Add one exception data dict into the exception list."""
-        if len(self.exceptList) > self.rcdLimit: self.exceptList.pop(0)
-        self.totalExpCount += 1
-        self.exceptList.append(exceptDict)
+        self.totalExpCount += exceptDict.get('count', 1)
+        self.exceptList.append((version, exceptDict))
 
     #-----------------------------------------------------------------------------
     def getID(self):
         return self.id
     
     def getAgentState(self):
-        self.updateOnlineState()
         dataDict = {'id': self.id,
                     'ip': self.ipaddress,
                     'protocol': self.protocol,
@@ -74,15 +92,23 @@ class agentDev(object):
                     'reportT': (self.lastUpdateTime - self.loginTime)//60,
                     'online': self.online,
                     'exceptCount': self.totalExpCount,
-                    'totalRptCount': self.totalRptCount
+                    'totalRptCount': self.totalRptCount,
+                    'dropCount': self.dropCount
                     }
         return dataDict
 
     def getRecordList(self):
-        return self.reportList
+        return [report for _, report in self.reportList]
     
     def getExecptList(self):
-        return self.exceptList
+        return [report for _, report in self.exceptList]
+
+    def getReportsSince(self, version):
+        """ Return the reports and exceptions added after the version."""
+        return {
+            'report': [report for ver, report in self.reportList if ver > version],
+            'alert': [report for ver, report in self.exceptList if ver > version]
+        }
 
     #-----------------------------------------------------------------------------
     def setIP(self, newIp):
@@ -91,13 +117,35 @@ class agentDev(object):
     def setProtocol(self, newProtocol):
         self.protocol = newProtocol
 
-    def updateOnlineState(self):
-        self.online = time.time() - self.lastUpdateTime < gv.gTimeOut
+    def setDropCount(self, dropCount):
+        self.dropCount = dropCount
+
+    def setOnline(self, online):
+        self.online = online
+
+    #-----------------------------------------------------------------------------
+    # Snapshot of the agent published by the multi-process hub's applier worker.
+    SNAPSHOT_KEYS = ('ipaddress', 'protocol', 'version', 'loginTime', 'lastUpdateTime', 'online',
+                     'totalExpCount', 'totalRptCount', 'dropCount')
+
+    def getSnapshot(self):
+        snapDict = {key: getattr(self, key) for key in self.SNAPSHOT_KEYS}
+        snapDict.update({'id': self.id, 'reportList': list(self.reportList),
+                         'exceptList': list(self.exceptList)})
+        return snapDict
+
+    def setSnapshot(self, snapDict):
+        for key in self.SNAPSHOT_KEYS: setattr(self, key, snapDict[key])
+        self.reportList.clear()
+        self.reportList.extend((ver, report) for ver, report in snapDict['reportList'])
+        self.exceptList.clear()
+        self.exceptList.extend((ver, report) for ver, report in snapDict['exceptList'])
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class agentPLC(agentDev):
     """ Agent class used for storing and processing PLC emulator data. """
+    SNAPSHOT_KEYS = agentDev.SNAPSHOT_KEYS + ('ladderInfo',)
 
     def __init__(self, id, ipaddress, protocol, ladderInfo=None):
         super().__init__(id, ipaddress, protocol)
@@ -115,6 +163,7 @@ class agentPLC(agentDev):
 #-----------------------------------------------------------------------------
 class agentController(agentDev):
     """ Agent class used for storing and processing PLC controller data. """
+    SNAPSHOT_KEYS = agentDev.SNAPSHOT_KEYS + ('tgtPlcID', 'tgtPlcIP')
 
     def __init__(self, id, ipaddress, protocol, plcID, plcIP):
         super().__init__(id, ipaddress, protocol)
@@ -131,6 +180,58 @@ class agentController(agentDev):
         self.tgtPlcID = plcID
         self.tgtPlcIP = plcIP
 
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class onlineTracker(threading.Thread):
+    """ Track the agents' online state with a min heap of (expire time, agentID), one 
+        entry per online agent. When an entry expires the data manager checks the agent's 
+        last update time: the entry is rescheduled if the agent reported after it was 
+        pushed, otherwise the agent goes offline. So the cost is O(expirations) instead of 
+        checking all the agents on every page view.
+    """
+    def __init__(self, dataMgr, timeout):
+        """ Init example: tracker = onlineTracker(dataMgr, 30)
+            Args:
+                dataMgr (DataManger): data manager, its checkOnline(agentID, now) returns the 
+                    new expire time if the agent is still online else None.
+                timeout (int): online state time out in seconds.
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.dataMgr = dataMgr
+        self.timeout = timeout
+        self._heap = []
+        self._heapLock = threading.Lock()
+        self._wakeEvt = threading.Event()
+        self._stopEvt = threading.Event()
+
+    def track(self, agentID, lastUpdateTime):
+        """ Start tracking the agent which is online."""
+        expireT = lastUpdateTime + self.timeout
+        with self._heapLock:
+            heapq.heappush(self._heap, (expireT, agentID))
+            if self._heap[0][1] == agentID: self._wakeEvt.set()  # new earliest expire time.
+
+    def run(self):
+        while not self._stopEvt.is_set():
+            now = time.time()
+            expiredList = []
+            with self._heapLock:
+                while self._heap and self._heap[0][0] <= now:
+                    expiredList.append(heapq.heappop(self._heap)[1])
+            for agentID in expiredList:
+                expireT = self.dataMgr.checkOnline(agentID, now)
+                if expireT is not None:
+                    with self._heapLock:
+                        heapq.heappush(self._heap, (expireT, agentID))
+            with self._heapLock:
+                waitT = self._heap[0][0] - time.time() if self._heap else None
+            self._wakeEvt.wait(waitT if waitT is None else max(0, waitT))
+            self._wakeEvt.clear()
+
+    def stop(self):
+        self._stopEvt.set()
+        self._wakeEvt.set()
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class DataManger(object):
@@ -143,7 +244,75 @@ class DataManger(object):
         # Init dictionary to store PLC controller data, key will be the controllerID,
         # value will be the agentController object
         self.controllerDict = {}
+        # Init the reports history store if the history database is configured.
+        self.historyStore = None
+        if gv.gHistoryDB:
+            # all the hub workers apply the same reports, only the worker 0 writes them.
+            self.historyStore = historyStore(gv.gHistoryDB, keepDays=gv.gHistoryKeepDays,
+                                             writer=gv.gWorkerIdx == 0)
+            if self.historyStore.writer: self.historyStore.start()
+        # Data version for the dashboard incremental update, every agent change increases 
+        # the version and is recorded in the change log.
+        self.version = 0
+        self._verCond = threading.Condition()
+        self._changeLog = deque(maxlen=CHANGE_LOG_NUM)
+        self._deltaCache = {}
+        # Init the agents online state tracker, in the multi-process hub only the worker 0
+        # applies the reports, the other workers load its snapshots.
+        self.onlineTracker = None
+        if gv.gWorkerIdx == 0:
+            self.onlineTracker = onlineTracker(self, gv.gTimeOut)
+            self.onlineTracker.start()
         gv.gDebugPrint("Monitor Hub Data Manager Initialized.", logType=gv.LOG_INFO)
+
+    #-----------------------------------------------------------------------------
+    def _bumpVersion(self, agentID):
+        """ Increase the data version after the agent changed and wake up the viewers 
+            waiting for the update, must be called with the version lock held.
+        """
+        self.version += 1
+        self._changeLog.append((self.version, agentID))
+        agent = self.plcDict.get(agentID) or self.controllerDict.get(agentID)
+        if agent: agent.version = self.version
+        self._verCond.notify_all()
+        return self.version
+
+    def _addStateEvent(self, agent, online):
+        """ Record the agent's online state change in the report list and history, must be
+            called with the version lock held.
+        """
+        agent.setOnline(online)
+        stateStr = 'back online' if online else 'offline (no report in %s sec)' % str(gv.gTimeOut)
+        eventDict = {'type': RPT_STATE,
+                     'time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+                     'message': '%s : %s is %s' % (RPT_STATE, agent.getID(), stateStr)}
+        agent.addStateEvent(eventDict, version=self.version + 1)
+        self._bumpVersion(agent.getID())
+        if self.historyStore: self.historyStore.addReport(agent.getID(), eventDict)
+        gv.gDebugPrint("Agent %s is %s." % (agent.getID(), stateStr), logType=gv.LOG_INFO)
+
+    def _refreshOnline(self, agent):
+        """ Update the online state after the agent logged in or reported, must be called 
+            with the version lock held.
+        """
+        if not agent.online: self._addStateEvent(agent, True)
+        if self.onlineTracker and not agent.tracked:
+            agent.tracked = True
+            self.onlineTracker.track(agent.getID(), agent.lastUpdateTime)
+
+    def checkOnline(self, agentID, now):
+        """ Called by the online tracker when the agent's expire time passed, return the 
+            new expire time if the agent reported after the time was scheduled, else set 
+            the agent offline and return None.
+        """
+        with self._verCond:
+            agent = self.plcDict.get(agentID) or self.controllerDict.get(agentID)
+            if agent is None: return None
+            expireT = agent.lastUpdateTime + gv.gTimeOut
+            if expireT > now: return expireT
+            agent.tracked = False
+            if agent.online: self._addStateEvent(agent, False)
+            return None
     
     #-----------------------------------------------------------------------------
     def addPlc(self, plcID, plcIP, protocol, ladderInfo=None):
@@ -193,21 +362,161 @@ class DataManger(object):
         data = reqDict['Data']
 
         if action == RPT_LOGIN:
-            if str(data['Type']).lower() == PLC_TYPE:
-                self.addPlc(data['ID'], data['IP'], data['Protocol'], ladderInfo=data['LadderID'])
-                gv.gDebugPrint("PLC Emulator: %s login." % data['ID'], logType=gv.LOG_INFO)
-            elif str(data['Type']).lower() == 'controller':
-                self.addController(data['ID'], data['IP'], data['Protocol'], data['TargetID'], data['TargetIP'])
-                gv.gDebugPrint("PLC Controller: %s login." % data['ID'], logType=gv.LOG_INFO)
+            with self._verCond:
+                if str(data['Type']).lower() == PLC_TYPE:
+                    self.addPlc(data['ID'], data['IP'], data['Protocol'], ladderInfo=data['LadderID'])
+                    gv.gDebugPrint("PLC Emulator: %s login." % data['ID'], logType=gv.LOG_INFO)
+                elif str(data['Type']).lower() == 'controller':
+                    self.addController(data['ID'], data['IP'], data['Protocol'], data['TargetID'], data['TargetIP'])
+                    gv.gDebugPrint("PLC Controller: %s login." % data['ID'], logType=gv.LOG_INFO)
+                agent = self.plcDict.get(data['ID']) or self.controllerDict.get(data['ID'])
+                if agent:
+                    agent.lastUpdateTime = time.time()
+                    self._refreshOnline(agent)
+                self._bumpVersion(data['ID'])
         elif action == RPT_NORMAL or action == RPT_WARN or action == RPT_ALERT:
-            if reqDict['ID'] in self.plcDict.keys(): 
-                self.plcDict[reqDict['ID']].addOneReport(data)
-            elif reqDict['ID'] in self.controllerDict.keys(): 
-                self.controllerDict[reqDict['ID']].addOneReport(data)
-            else:
-                gv.gDebugPrint("ID: %s not login before.", logType=gv.LOG_WARN)
+            agent = self.plcDict.get(reqDict['ID']) or self.controllerDict.get(reqDict['ID'])
+            if agent is None:
+                gv.gDebugPrint("ID: %s not login before." % str(reqDict['ID']), logType=gv.LOG_WARN)
+                return {"ok": True}
+            with self._verCond:
+                agent.addOneReport(data, version=self.version + 1)
+                self._bumpVersion(reqDict['ID'])
+                self._refreshOnline(agent)
+            if self.historyStore: self.historyStore.addReport(reqDict['ID'], data)
         return {"ok": True}
 
+    def handleBatchRequest(self, requestDict):
+        """ Handle the batch report request which contents a list of reports from one 
+            PLC emulator or controller.
+            Request example: {'ID': <str>, 'Action': 'batch', 'Timestamp': <str>, 
+                'Dropped': <int>, 'Data': [{'Action': <str>, 'Data': <dict>}, ...]}
+        """
+        agentID = requestDict['ID']
+        reportList = requestDict['Data']
+        for report in reportList:
+            self.handleRequest({'ID': agentID, 'Action': report['Action'], 'Data': report['Data']})
+        agent = self.plcDict.get(agentID) or self.controllerDict.get(agentID)
+        if agent and 'Dropped' in requestDict.keys() and agent.dropCount != int(requestDict['Dropped']):
+            with self._verCond:
+                agent.setDropCount(int(requestDict['Dropped']))
+                self._bumpVersion(agentID)
+        return {"ok": True, "count": len(reportList)}
+
+    def applyRequests(self, requestList):
+        """ Apply a list of (batchFlg, requestDict) report requests queued by the ingest 
+            worker (the only writer) in one version lock, so the readers get the consistent
+            state between 2 batches.
+        """
+        with self._verCond:
+            for batchFlg, requestDict in requestList:
+                try:
+                    if batchFlg:
+                        self.handleBatchRequest(requestDict)
+                    else:
+                        self.handleRequest(requestDict)
+                except Exception as err:
+                    gv.gDebugPrint("Error: applyRequests() > %s" % str(err), logType=gv.LOG_ERR)
+
+    #-----------------------------------------------------------------------------
+    # Function to provide the incremental update to the dashboard.
+    def getVersioned(self, dataFunc, *args):
+        """ Call the data function under the version lock, return (version, result) so the 
+            page rendered with the result can continue the update from the version.
+        """
+        with self._verCond:
+            return self.version, dataFunc(*args)
+
+    def waitVersion(self, version, timeout=None):
+        """ Wait until the data version is different from the version or time out, 
+            return the current version.
+        """
+        with self._verCond:
+            self._verCond.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    def getDelta(self, sinceVer, view=None, agentID=None):
+        """ Return (version, json string, number of changed agents) of the agents and 
+            reports changed after the sinceVer. The full state is returned (with 'full': True) if the sinceVer is not 
+            in the change log. The json string is cached so the viewers at the same version
+            share it.
+            Args:
+                sinceVer (int): the version the viewer has.
+                view (str, optional): 'plc', 'controller' or None for all the agents.
+                agentID (str, optional): only return the change of the agent. Defaults to None.
+        """
+        with self._verCond:
+            version = self.version
+            key = (sinceVer, version, view, agentID)
+            if key in self._deltaCache: return (version,) + self._deltaCache[key]
+            full = sinceVer <= 0 or sinceVer > version or not self._changeLog or \
+                sinceVer < self._changeLog[0][0] - 1
+            if full:
+                changedSet = set(self.plcDict.keys()) | set(self.controllerDict.keys())
+            else:
+                changedSet = set()
+                for ver, changedID in reversed(self._changeLog):
+                    if ver <= sinceVer: break
+                    changedSet.add(changedID)
+            if agentID is not None: changedSet &= {agentID}
+            deltaDict = {'version': version, 'full': full, 'plcs': [], 'controllers': [], 'reports': {}}
+            for changedID in sorted(changedSet):
+                if changedID in self.plcDict and view != CTRL_TYPE:
+                    deltaDict['plcs'].append(self.plcDict[changedID].getPLCState())
+                if changedID in self.controllerDict and view != PLC_TYPE:
+                    deltaDict['controllers'].append(self.controllerDict[changedID].getControllerState())
+                agent = self.plcDict.get(changedID) or self.controllerDict.get(changedID)
+                if agentID is not None and agent:
+                    deltaDict['reports'][changedID] = agent.getReportsSince(0 if full else sinceVer)
+            if len(self._deltaCache) >= DELTA_CACHE_NUM: self._deltaCache.clear()
+            self._deltaCache[key] = (json.dumps(deltaDict), len(deltaDict['plcs']) + len(deltaDict['controllers']))
+            return (version,) + self._deltaCache[key]
+
+    #-----------------------------------------------------------------------------
+    # Function to share the state with the other workers of the multi-process hub.
+    def getSnapshot(self, sinceVer):
+        """ Return (version, change list [(version, agentID), ...], agent snapshot list) 
+            of the changes after the sinceVer, called by the applier worker to publish.
+        """
+        with self._verCond:
+            changeList = [change for change in self._changeLog if change[0] > sinceVer]
+            snapList = []
+            for kind, agentDict in ((PLC_TYPE, self.plcDict), (CTRL_TYPE, self.controllerDict)):
+                for agent in agentDict.values():
+                    if agent.version > sinceVer: snapList.append((kind, agent.getSnapshot()))
+            return self.version, changeList, snapList
+
+    def applySnapshot(self, version, changeList, snapList):
+        """ Load the changes published by the applier worker, so the dashboard of this 
+            worker shows the same agents and data version as the applier.
+        """
+        with self._verCond:
+            for kind, snapDict in snapList:
+                if kind == PLC_TYPE:
+                    agent = self.plcDict.get(snapDict['id']) or self.plcDict.setdefault(
+                        snapDict['id'], agentPLC(snapDict['id'], None, None))
+                else:
+                    agent = self.controllerDict.get(snapDict['id']) or self.controllerDict.setdefault(
+                        snapDict['id'], agentController(snapDict['id'], None, None, None, None))
+                agent.setSnapshot(snapDict)
+            # the change log must be continuous for the incremental update.
+            if changeList and changeList[0][0] != self.version + 1: self._changeLog.clear()
+            self._changeLog.extend((ver, agentID) for ver, agentID in changeList)
+            self.version = version
+            self._verCond.notify_all()
+
+    #-----------------------------------------------------------------------------
+    def getHistory(self, agentID, reportType=None, startT=None, endT=None, limit=None, rollup=False):
+        """ Return the agent's history reports (or hourly rollups) in the time range, the 
+            time can be the epoch seconds or the '%Y-%m-%d %H:%M:%S' string. Return None 
+            if the history store is not enabled.
+        """
+        if self.historyStore is None: return None
+        startT, endT = parseTime(startT), parseTime(endT)
+        if rollup: return self.historyStore.queryRollups(agentID, reportType=reportType, startT=startT, endT=endT)
+        return self.historyStore.queryReports(agentID, reportType=reportType, startT=startT, endT=endT,
+                                              limit=limit if limit else gv.gHistoryQueryLimit)
+
     #-----------------------------------------------------------------------------
     # Function to provide PLC emulator data
     def getAllPlcState(self):
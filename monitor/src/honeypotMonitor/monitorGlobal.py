@@ -78,6 +78,8 @@ COOKIE_TIME = 30
 #-----------------------------------------------------------------------------
 # Init the global value
 gTimeOut = 30 # online state time out
+gSseHeartbeat = 15  # dashboard event stream keep alive interval in seconds.
+gSseMinInterval = 1 # min interval between 2 dashboard stream events in seconds.
 
 # Flask App parameters : 
 gflaskHost = '0.0.0.0'
@@ -85,7 +87,23 @@ gflaskPort = int(CONFIG_DICT['FLASK_SER_PORT']) if 'FLASK_SER_PORT' in CONFIG_DI
 gflaskDebug = CONFIG_DICT['FLASK_DEBUG_MD']
 gflaskMultiTH =  CONFIG_DICT['FLASK_MULTI_TH']
 
+# Multi-process hub parameters, the workers share the reports through the shared log:
+gWorkerNum = int(CONFIG_DICT['HUB_WORKER_NUM']) if 'HUB_WORKER_NUM' in CONFIG_DICT.keys() else 1
+gSharedDB = os.path.join(dirpath, CONFIG_DICT['SHARED_DB']) if 'SHARED_DB' in CONFIG_DICT.keys() else os.path.join(dirpath, 'Data', 'shared.db')
+gWorkerIdx = 0  # index of the current hub worker process.
+
+# Report ingestion queue parameters:
+gIngestQueueSize = int(CONFIG_DICT['INGEST_QUEUE_SIZE']) if 'INGEST_QUEUE_SIZE' in CONFIG_DICT.keys() else 2000
+gIngestBatchSize = int(CONFIG_DICT['INGEST_BATCH_SIZE']) if 'INGEST_BATCH_SIZE' in CONFIG_DICT.keys() else 200
+
+# Reports history store parameters:
+gHistoryDB = os.path.join(dirpath, CONFIG_DICT['HISTORY_DB']) if 'HISTORY_DB' in CONFIG_DICT.keys() else None
+gHistoryKeepDays = int(CONFIG_DICT['HISTORY_KEEP_DAYS']) if 'HISTORY_KEEP_DAYS' in CONFIG_DICT.keys() else 30
+gHistoryQueryLimit = int(CONFIG_DICT['HISTORY_QUERY_LIMIT']) if 'HISTORY_QUERY_LIMIT' in CONFIG_DICT.keys() else 1000
+
 #-----------------------------------------------------------------------------
 # Init the global instances
 iPlcLadderLogic = None
 iDataMgr = None
+iIngestWorker = None
+iSharedLog = None
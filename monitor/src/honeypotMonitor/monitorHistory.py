@@ -0,0 +1,221 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        monitorHistory.py [python3]
+#
+# Purpose:     This module is the reports history store of the monitor hub. The
+#              reports received from the honeypot components are kept in a SQLite
+#              database (WAL mode) with the time index and the hourly rollups, so
+#              the hub can query the reports of one agent in a time range quickly
+#              after weeks of data.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2024/12/20
+# version:     v_0.1.3
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+
+    The agent's latest reports are kept in the memory ring buffer by the data manager,
+    all the reports are also added to the historyStore pending queue (deque append, no
+    lock) and a background writer thread flushes them to the database every flush
+    interval in one transaction:
+
+    - reports table: one row per report (time stamp, agent ID, type, count, message,
+        json data) with the index (agentID, type, ts), it is append only and the rows
+        older than the keep days are pruned every hour.
+    - rollups table: report count per (agentID, type, hour bucket), it is kept after
+        the reports are pruned to show the long term trend.
+
+    The query functions use their own thread local connection (WAL mode allows the
+    readers to run in parallel with the writer).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import deque
+
+HIS_FLUSH_INT = 1       # flush the pending reports to the database every 1 sec.
+HIS_KEEP_DAYS = 30      # days to keep the detail reports.
+HIS_PRUNE_INT = 3600    # prune the old reports every hour.
+ROLLUP_STEP = 3600      # rollup bucket size in seconds.
+QUERY_LIMIT = 1000      # default max number of reports returned by one query.
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+MAX_TS = 4102444800     # 2100-01-01, the report time after it is not valid.
+MAX_COUNT = 2**31       # max valid repeated report count.
+
+SCHEMA_SQL = (
+    "CREATE TABLE IF NOT EXISTS reports (ts REAL NOT NULL, agentID TEXT NOT NULL, "
+    "type TEXT NOT NULL, count INTEGER NOT NULL, message TEXT, data TEXT)",
+    "CREATE INDEX IF NOT EXISTS idxReports ON reports (agentID, type, ts)",
+    "CREATE INDEX IF NOT EXISTS idxReportsTs ON reports (ts)",
+    "CREATE TABLE IF NOT EXISTS rollups (agentID TEXT NOT NULL, type TEXT NOT NULL, "
+    "bucket INTEGER NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (agentID, type, bucket)) WITHOUT ROWID",
+)
+
+#-----------------------------------------------------------------------------
+def parseTime(timeVal, default=None):
+    """ Convert the time stamp number or the '%Y-%m-%d %H:%M:%S' time string to the
+        epoch seconds, return default if the value is not valid.
+    """
+    if timeVal is None or timeVal == '': return default
+    try:
+        return float(timeVal)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return time.mktime(time.strptime(str(timeVal), TIME_FMT))
+    except ValueError:
+        return default
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class historyStore(threading.Thread):
+    """ SQLite backed reports history store with a background writer thread."""
+    def __init__(self, dbPath, flushInterval=HIS_FLUSH_INT, keepDays=HIS_KEEP_DAYS, writer=True):
+        """ Init example: store = historyStore('history.db', keepDays=30)
+            Args:
+                dbPath (str): SQLite database file path.
+                flushInterval (int, optional): pending reports flush interval in seconds.
+                    Defaults to HIS_FLUSH_INT.
+                keepDays (int, optional): days to keep the detail reports, the rollups
+                    are kept. Defaults to HIS_KEEP_DAYS.
+                writer (bool, optional): False for the hub workers which only query the
+                    history (the reports are written by the worker 0). Defaults to True.
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.dbPath = dbPath
+        self.flushInterval = flushInterval
+        self.keepDays = keepDays
+        self.writer = writer
+        self.storedCount = 0
+        self.errorCount = 0
+        self._pendingQueue = deque()
+        self._localData = threading.local()
+        self._stopEvt = threading.Event()
+        self._lastPruneT = 0
+        dirPath = os.path.dirname(os.path.abspath(dbPath))
+        if not os.path.exists(dirPath): os.makedirs(dirPath)
+        self._writeConn = self._connect()
+        for sql in SCHEMA_SQL: self._writeConn.execute(sql)
+        self._writeConn.commit()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.dbPath, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _readConn(self):
+        """ Return the query connection of the current thread."""
+        conn = getattr(self._localData, 'conn', None)
+        if conn is None: conn = self._localData.conn = self._connect()
+        return conn
+
+    #-----------------------------------------------------------------------------
+    def addReport(self, agentID, reportDict):
+        """ Add one report to the pending queue, it will be written to the database
+            by the writer thread.
+        """
+        if not self.writer: return
+        self._pendingQueue.append((time.time(), agentID, reportDict))
+
+    def flush(self):
+        """ Write all the pending reports to the database in one transaction, return
+            the number of reports written.
+        """
+        rowList, rollupDict = [], {}
+        try:
+            while True:
+                recvT, agentID, reportDict = self._pendingQueue.popleft()
+                # use the report time so the spilled and replayed reports keep their time.
+                ts = parseTime(reportDict.get('time'), default=recvT)
+                if not 0 < ts < MAX_TS: ts = recvT     # also filter the nan.
+                rptType = str(reportDict.get('type'))
+                try:
+                    count = int(reportDict.get('count', 1))
+                    if not 0 < count <= MAX_COUNT: raise ValueError('count out of range')
+                    dataStr = json.dumps(reportDict)
+                except (TypeError, ValueError, OverflowError) as err:
+                    # skip the bad report only, the others in the batch are still stored.
+                    self.errorCount += 1
+                    print("Error: historyStore.flush() > skip the report of %s: %s" % (str(agentID), str(err)))
+                    continue
+                message = reportDict.get('message')
+                rowList.append((ts, str(agentID), rptType, count, None if message is None else str(message), dataStr))
+                key = (agentID, rptType, int(ts // ROLLUP_STEP * ROLLUP_STEP))
+                rollupDict[key] = rollupDict.get(key, 0) + count
+        except IndexError:
+            pass
+        if not rowList: return 0
+        with self._writeConn:
+            self._writeConn.executemany("INSERT INTO reports VALUES (?, ?, ?, ?, ?, ?)", rowList)
+            self._writeConn.executemany("INSERT INTO rollups VALUES (?, ?, ?, ?) ON CONFLICT (agentID, type, bucket) "
+                                        "DO UPDATE SET count = count + excluded.count",
+                                        [key + (count,) for key, count in rollupDict.items()])
+        self.storedCount += len(rowList)
+        return len(rowList)
+
+    def prune(self):
+        """ Delete the detail reports older than the keep days, return the rows deleted."""
+        if not self.keepDays: return 0
+        with self._writeConn:
+            cursor = self._writeConn.execute("DELETE FROM reports WHERE ts < ?",
+                                             (time.time() - self.keepDays * 86400,))
+        return cursor.rowcount
+
+    #-----------------------------------------------------------------------------
+    def queryReports(self, agentID, reportType=None, startT=None, endT=None, limit=QUERY_LIMIT):
+        """ Return the reports list of the agent in the time range [startT, endT] sorted
+            by time, example: all alerts of PLC X between T1 and T2:
+                queryReports('PLC-X', reportType='alert', startT=T1, endT=T2)
+            Args:
+                agentID (str): agent ID.
+                reportType (str, optional): report type filter. Defaults to None (all).
+                startT/endT (float, optional): epoch seconds time range. Defaults to None.
+                limit (int, optional): max number of reports. Defaults to QUERY_LIMIT.
+        """
+        sql = "SELECT data FROM reports WHERE agentID = ?"
+        args = [agentID]
+        if reportType:
+            sql += " AND type = ?"
+            args.append(reportType)
+        sql += " AND ts >= ? AND ts <= ? ORDER BY ts LIMIT ?"
+        args += [startT if startT is not None else 0, endT if endT is not None else time.time() + 86400, limit]
+        return [json.loads(row[0]) for row in self._readConn().execute(sql, args)]
+
+    def queryRollups(self, agentID, reportType=None, startT=None, endT=None):
+        """ Return the hourly report count list [(bucketTime, type, count), ...] of the agent."""
+        sql = "SELECT bucket, type, count FROM rollups WHERE agentID = ?"
+        args = [agentID]
+        if reportType:
+            sql += " AND type = ?"
+            args.append(reportType)
+        sql += " AND bucket >= ? AND bucket <= ? ORDER BY bucket"
+        args += [int(startT // ROLLUP_STEP * ROLLUP_STEP) if startT is not None else 0,
+                 endT if endT is not None else time.time() + 86400]
+        return [(time.strftime(TIME_FMT, time.localtime(bucket)), rptType, count)
+                for bucket, rptType, count in self._readConn().execute(sql, args)]
+
+    def getStats(self):
+        return {'stored': self.storedCount, 'pending': len(self._pendingQueue), 'errors': self.errorCount}
+
+    #-----------------------------------------------------------------------------
+    def run(self):
+        while not self._stopEvt.wait(self.flushInterval):
+            try:
+                self.flush()
+                if time.time() - self._lastPruneT > HIS_PRUNE_INT:
+                    self.prune()
+                    self._lastPruneT = time.time()
+            except Exception as err:
+                print("historyStore.run() Error: %s" % str(err))
+        self.flush()
+        self._writeConn.close()
+
+    def stop(self):
+        self._stopEvt.set()
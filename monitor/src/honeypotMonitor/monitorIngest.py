@@ -0,0 +1,146 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        monitorIngest.py [python3]
+#
+# Purpose:     This module is the report ingestion pipeline of the monitor hub. The
+#              HTTP request threads only validate the report requests and put them
+#              in a bounded queue, one writer thread applies the queued requests to
+#              the data manager in batches. When the queue is full the request is
+#              rejected with the retry hint (HTTP 429) so the hub survives the report
+#              bursts from many honeypot nodes.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2024/12/22
+# version:     v_0.1.3
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+
+import math
+import time
+import threading
+from queue import Queue, Empty, Full
+from collections import deque
+
+INGEST_QUEUE_SIZE = 2000    # max number of requests waiting to be applied.
+INGEST_BATCH_SIZE = 200     # max number of requests applied in one batch.
+RATE_WINDOW = 5             # throughput measurement window in seconds.
+MAX_RETRY_AFTER = 30        # max retry hint in seconds.
+
+# submit() result
+ST_QUEUED = 'queued'
+ST_INVALID = 'invalid'
+ST_BUSY = 'busy'
+
+REPORT_ACTIONS = ('normal', 'warning', 'alert')
+LOGIN_KEYS = ('Type', 'ID', 'IP', 'Protocol')
+
+#-----------------------------------------------------------------------------
+def validateReport(action, data):
+    """ Check the action and data of one report request."""
+    action = str(action).lower()
+    if action == 'login':
+        return isinstance(data, dict) and all(key in data for key in LOGIN_KEYS)
+    if action in REPORT_ACTIONS:
+        return isinstance(data, dict) and 'type' in data
+    return False
+
+def validateRequest(reqDict, batch=False):
+    """ Check the /dataPost (or /dataPostBatch if batch is True) request json."""
+    if not isinstance(reqDict, dict) or 'ID' not in reqDict or 'Data' not in reqDict: return False
+    if batch:
+        return isinstance(reqDict['Data'], list) and all(isinstance(report, dict) and 'Action' in report
+                                                         and validateReport(report['Action'], report.get('Data'))
+                                                         for report in reqDict['Data'])
+    return 'Action' in reqDict and validateReport(reqDict['Action'], reqDict['Data'])
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class ingestWorker(threading.Thread):
+    """ Single writer thread to apply the queued report requests to the data manager."""
+    def __init__(self, dataMgr, queueSize=INGEST_QUEUE_SIZE, batchSize=INGEST_BATCH_SIZE):
+        """ Init example: worker = ingestWorker(gv.iDataMgr, queueSize=2000, batchSize=200)
+            Args:
+                dataMgr (DataManger): the hub data manager, its applyRequests() is called
+                    with the list of (batchFlg, requestDict).
+                queueSize (int, optional): max number of queued requests. Defaults to
+                    INGEST_QUEUE_SIZE.
+                batchSize (int, optional): max requests applied in one batch. Defaults to
+                    INGEST_BATCH_SIZE.
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.dataMgr = dataMgr
+        self.batchSize = batchSize
+        self._queue = Queue(maxsize=queueSize)
+        self._stopEvt = threading.Event()
+        self._rateList = deque()    # (time, applied report number) in the rate window.
+        self._statsLock = threading.Lock()  # counters updated by the request threads.
+        self.statsDict = {'received': 0, 'applied': 0, 'reports': 0, 'rejected': 0,
+                          'invalid': 0, 'batches': 0}
+
+    #-----------------------------------------------------------------------------
+    def submit(self, reqDict, batch=False):
+        """ Validate and queue one request, called in the HTTP request threads.
+            Returns:
+                (str, int): ST_QUEUED / ST_INVALID / ST_BUSY and the retry after seconds.
+        """
+        result = ST_QUEUED
+        if not validateRequest(reqDict, batch=batch):
+            result = ST_INVALID
+        else:
+            try:
+                self._queue.put_nowait((batch, reqDict))
+            except Full:
+                result = ST_BUSY
+        with self._statsLock:
+            self.statsDict['received'] += 1
+            if result == ST_INVALID: self.statsDict['invalid'] += 1
+            if result == ST_BUSY: self.statsDict['rejected'] += 1
+        return result, self.getRetryAfter() if result == ST_BUSY else 0
+
+    def getRate(self):
+        """ Return the applied reports per second in the rate window."""
+        startT = time.time() - RATE_WINDOW
+        return sum(num for recT, num in list(self._rateList) if recT >= startT) / RATE_WINDOW
+
+    def getRetryAfter(self):
+        """ Estimate the seconds to drain the queue as the retry hint."""
+        rate = self.getRate()
+        if rate <= 0: return MAX_RETRY_AFTER
+        return max(1, min(MAX_RETRY_AFTER, int(math.ceil(self._queue.qsize() / rate))))
+
+    def getStats(self):
+        with self._statsLock:
+            statsDict = dict(self.statsDict)
+        statsDict.update({'queued': self._queue.qsize(), 'queueSize': self._queue.maxsize,
+                          'reportRate': round(self.getRate(), 1)})
+        return statsDict
+
+    #-----------------------------------------------------------------------------
+    def run(self):
+        while not self._stopEvt.is_set():
+            try:
+                itemList = [self._queue.get(timeout=1)]
+            except Empty:
+                continue
+            try:
+                while len(itemList) < self.batchSize:
+                    itemList.append(self._queue.get_nowait())
+            except Empty:
+                pass
+            try:
+                self.dataMgr.applyRequests(itemList)
+            except Exception as err:
+                print("ingestWorker.run() Error: %s" % str(err))
+            reportNum = sum(len(reqDict['Data']) if batch else 1 for batch, reqDict in itemList)
+            now = time.time()
+            self._rateList.append((now, reportNum))
+            while now - self._rateList[0][0] > RATE_WINDOW: self._rateList.popleft()
+            with self._statsLock:
+                self.statsDict['applied'] += len(itemList)
+                self.statsDict['reports'] += reportNum
+                self.statsDict['batches'] += 1
+
+    def stop(self):
+        self._stopEvt.set()
@@ -0,0 +1,237 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        monitorShared.py [python3]
+#
+# Purpose:     This module is the shared state of the multi-process monitor hub. The
+#              report requests received by all the hub worker processes are appended
+#              to one shared request log (a local SQLite database in WAL mode), the
+#              worker 0 applies the log to its data manager and publishes the changed
+#              agents' snapshots, the other workers load the snapshots, so all the
+#              workers show the same agents list and reports while the HTTP request
+#              handling runs on multiple CPU cores.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2024/12/24
+# version:     v_0.1.3
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+
+    The ingest worker of each hub process calls sharedLog.applyRequests() (instead of
+    the data manager's) with a batch of validated requests, the batch is inserted into
+    the requests table in one transaction. Only the worker 0 (the applier) reads the
+    log and applies it to its data manager, then publishes the agents changed since the
+    last publish to the agents/changes tables. The other workers poll the changes and
+    load the agents' snapshots to their data manager, so the dashboard reads stay in the
+    process memory:
+
+        worker N: HTTP threads -> ingest queue -> ingestWorker --> requests table
+                                                                        |
+        worker 0: sync thread <- rows after the last seq <--------------+
+                       +-> dataMgr.applyRequests() -> online tracker, history store
+                       +-> publish() -> agents / changes tables
+                                              |
+        worker N: sync thread <- loadSnapshot() <- changes after the local version
+                       +-> dataMgr.applySnapshot() -> dashboard / SSE
+
+    Every report is decoded and applied once (by the worker 0), the other workers only
+    load the snapshots of the changed agents, their data version and change log are
+    the worker 0's, so a dashboard page rendered by one worker can continue the update
+    (since=<version>) from any other worker. The worker 0 owns the state: the hub is
+    stopped if it exits, the other workers are restarted and reload the snapshots.
+
+    Limits: all the appends go through the single SQLite writer (one transaction per
+    ingest batch) and the worker 0 applies all the reports, the ingestion throughput
+    grows with the workers until the worker 0 applier is saturated, use the benchmark
+    tool <monitorBenchmark.py> to measure the host.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+SYNC_INT = 0.2          # max delay of the log apply / snapshot load in seconds.
+SYNC_BATCH = 1000       # max number of requests read in one query.
+PRUNE_INT = 60          # prune the applied requests and old changes every minute.
+CHANGE_KEEP_NUM = 10000 # number of the published changes kept for the incremental update.
+
+SCHEMA_SQL = (
+    "CREATE TABLE IF NOT EXISTS requests (seq INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, "
+    "worker INTEGER NOT NULL, batch INTEGER NOT NULL, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS agents (agentID TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+    "version INTEGER NOT NULL, data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idxAgentsVer ON agents (version)",
+    "CREATE TABLE IF NOT EXISTS changes (version INTEGER PRIMARY KEY, agentID TEXT NOT NULL)",
+)
+
+#-----------------------------------------------------------------------------
+def _connect(dbPath):
+    conn = sqlite3.connect(dbPath, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def initSharedDB(dbPath):
+    """ Create the shared database and clear the data of the last run, called by the
+        main process before starting the workers.
+    """
+    dirPath = os.path.dirname(os.path.abspath(dbPath))
+    if not os.path.exists(dirPath): os.makedirs(dirPath)
+    conn = _connect(dbPath)
+    with conn:
+        for sql in SCHEMA_SQL: conn.execute(sql)
+        for table in ('requests', 'agents', 'changes'): conn.execute("DELETE FROM %s" % table)
+    conn.close()
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class sharedLog(threading.Thread):
+    """ Shared request log and agents snapshot of one hub worker process."""
+    def __init__(self, dbPath, dataMgr, workerIdx=0, syncInterval=SYNC_INT):
+        """ Init example: log = sharedLog('Data/shared.db', gv.iDataMgr, workerIdx=1)
+            Args:
+                dbPath (str): SQLite database file path (created by initSharedDB()).
+                dataMgr (DataManger): the local data manager, the worker 0 calls its
+                    applyRequests() and getSnapshot(), the other workers call its
+                    applySnapshot().
+                workerIdx (int, optional): hub worker index. Defaults to 0 (applier).
+                syncInterval (float, optional): log / snapshot polling interval in
+                    seconds. Defaults to SYNC_INT.
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.dataMgr = dataMgr
+        self.workerIdx = workerIdx
+        self.applier = workerIdx == 0
+        self.syncInterval = syncInterval
+        self.lastSeq = 0
+        self.publishVer = 0
+        self.appendCount = 0
+        self.syncCount = 0
+        self.applySec = 0
+        self.errorCount = 0
+        self._writeConn = _connect(dbPath)
+        self._writeLock = threading.Lock()  # the ingest worker and sync thread share the write connection.
+        self._readConn = _connect(dbPath)
+        self._syncEvt = threading.Event()
+        self._stopEvt = threading.Event()
+        self._lastPruneT = time.time()
+
+    #-----------------------------------------------------------------------------
+    def applyRequests(self, requestList):
+        """ Append a list of (batchFlg, requestDict) to the shared log in one transaction,
+            called by the ingest worker of this process. The requests are applied by the
+            worker 0 in the log order.
+        """
+        now = time.time()
+        rowList = [(now, self.workerIdx, int(batchFlg), json.dumps(reqDict))
+                   for batchFlg, reqDict in requestList]
+        with self._writeLock, self._writeConn:
+            self._writeConn.executemany("INSERT INTO requests (ts, worker, batch, data) "
+                                        "VALUES (?, ?, ?, ?)", rowList)
+        self.appendCount += len(rowList)
+        if self.applier: self._syncEvt.set()
+
+    def sync(self):
+        """ Apply the requests appended by all the workers after the last sync to the
+            data manager (worker 0), return the number of requests read. The row which
+            can not be decoded or applied is skipped so the applier never stops.
+        """
+        count = 0
+        while True:
+            rowList = self._readConn.execute("SELECT seq, batch, data FROM requests WHERE seq > ? "
+                                             "ORDER BY seq LIMIT ?", (self.lastSeq, SYNC_BATCH)).fetchall()
+            if not rowList: break
+            startT = time.time()
+            requestList = []
+            for seq, batchFlg, data in rowList:
+                try:
+                    requestList.append((bool(batchFlg), json.loads(data)))
+                except ValueError as err:
+                    self.errorCount += 1
+                    print("Error: sharedLog.sync() > skip the request %d: %s" % (seq, str(err)))
+            try:
+                self.dataMgr.applyRequests(requestList)
+            except Exception as err:
+                self.errorCount += 1
+                print("Error: sharedLog.sync() > apply requests %d-%d: %s" % (rowList[0][0], rowList[-1][0], str(err)))
+            self.applySec += time.time() - startT
+            self.lastSeq = rowList[-1][0]
+            count += len(rowList)
+            if len(rowList) < SYNC_BATCH: break
+        self.syncCount += count
+        return count
+
+    def publish(self):
+        """ Publish the agents changed after the last publish (worker 0), return the
+            number of agents published.
+        """
+        version, changeList, snapList = self.dataMgr.getSnapshot(self.publishVer)
+        if version == self.publishVer: return 0
+        with self._writeLock, self._writeConn:
+            self._writeConn.executemany("INSERT OR REPLACE INTO agents VALUES (?, ?, ?, ?)",
+                                        [(snapDict['id'], kind, snapDict['version'], json.dumps(snapDict))
+                                         for kind, snapDict in snapList])
+            self._writeConn.executemany("INSERT OR REPLACE INTO changes VALUES (?, ?)", changeList)
+        self.publishVer = version
+        return len(snapList)
+
+    def loadSnapshot(self):
+        """ Load the agents published after the local data version (worker 1..N), return
+            the number of agents loaded.
+        """
+        localVer = self.dataMgr.version
+        # read the changes and agents in one read transaction to get a consistent view.
+        self._readConn.execute("BEGIN")
+        try:
+            changeList = self._readConn.execute("SELECT version, agentID FROM changes WHERE version > ? "
+                                                "ORDER BY version", (localVer,)).fetchall()
+            rowList = self._readConn.execute("SELECT kind, data FROM agents WHERE version > ?",
+                                             (localVer,)).fetchall() if changeList else []
+        finally:
+            self._readConn.commit()
+        if not changeList: return 0
+        self.dataMgr.applySnapshot(changeList[-1][0], changeList,
+                                   [(kind, json.loads(data)) for kind, data in rowList])
+        self.syncCount += len(changeList)
+        return len(rowList)
+
+    def prune(self):
+        """ Delete the applied requests and the old changes (worker 0)."""
+        with self._writeLock, self._writeConn:
+            self._writeConn.execute("DELETE FROM requests WHERE seq <= ?", (self.lastSeq,))
+            self._writeConn.execute("DELETE FROM changes WHERE version <= ?", (self.publishVer - CHANGE_KEEP_NUM,))
+
+    def getStats(self):
+        statsDict = {'worker': self.workerIdx, 'appended': self.appendCount, 'errors': self.errorCount}
+        if self.applier:
+            statsDict.update({'applied': self.syncCount, 'applySec': round(self.applySec, 3),
+                              'lastSeq': self.lastSeq, 'published': self.publishVer})
+        else:
+            statsDict.update({'loadedChanges': self.syncCount, 'version': self.dataMgr.version})
+        return statsDict
+
+    #-----------------------------------------------------------------------------
+    def run(self):
+        while not self._stopEvt.is_set():
+            self._syncEvt.wait(self.syncInterval)
+            self._syncEvt.clear()
+            try:
+                if not self.applier:
+                    self.loadSnapshot()
+                    continue
+                self.sync()
+                # also publish the online state changes of the tracker.
+                self.publish()
+                if time.time() - self._lastPruneT > PRUNE_INT:
+                    self.prune()
+                    self._lastPruneT = time.time()
+            except Exception as err:
+                print("sharedLog.run() Error: %s" % str(err))
+
+    def stop(self):
+        self._stopEvt.set()
+        self._syncEvt.set()
@@ -0,0 +1,140 @@
+//-----------------------------------------------------------------------------
+// Name:        hubLive.js
+//
+// Purpose:     Update the monitor hub dashboard pages in place with the changes
+//              pushed by the hub's Server-Sent-Events stream (/api/v1/stream).
+//
+// Author:      Yuancheng Liu
+//
+// Created:     2024/12/21
+// Version:     v_0.1.3
+// Copyright:   Copyright (c) 2024 LiuYuancheng
+// License:     MIT License
+//-----------------------------------------------------------------------------
+
+var RCD_NUM = 10;   // number of reports shown in the peer page tables.
+
+function escapeHtml(text) {
+    return $('<div>').text(text === undefined || text === null ? '' : String(text)).html();
+}
+
+function badge(cls, text) {
+    return '<span class="badge ' + cls + '">' + escapeHtml(text) + '</span>';
+}
+
+function protocolBadge(protocol) {
+    return badge(protocol == 'Modbus' ? 'bg-success' : 'bg-primary', protocol);
+}
+
+function countBadge(count) {
+    return badge(count == 0 ? 'bg-success' : 'bg-danger', count);
+}
+
+function onlineBadge(online) {
+    return online ? badge('bg-success', ' Online ') : badge('bg-danger', ' Offline ');
+}
+
+//-----------------------------------------------------------------------------
+// Agent table rows (same layout as the jinja templates).
+function agentLink(url, id) {
+    return '<a href="' + url + encodeURIComponent(id) + '" target="_blank">' + escapeHtml(id) + '</a>';
+}
+
+function plcRowHtml(info) {
+    return '<td>' + agentLink('/plc/', info.id) + '</td>' +
+        '<td>' + escapeHtml(info.ip) + '</td>' +
+        '<td>' + protocolBadge(info.protocol) + '</td>' +
+        '<td>' + badge('bg-info', info.ladderInfo) + '</td>' +
+        '<td>' + escapeHtml(info.lastUpdateT) + '</td>' +
+        '<td>' + escapeHtml(info.reportT) + ' mins</td>' +
+        '<td>' + countBadge(info.exceptCount) + '</td>' +
+        '<td>' + escapeHtml(info.totalRptCount) + '</td>';
+}
+
+function controllerRowHtml(info) {
+    return '<td>' + agentLink('/controller/', info.id) + '</td>' +
+        '<td>' + escapeHtml(info.ip) + '</td>' +
+        '<td>' + protocolBadge(info.protocol) + '</td>' +
+        '<td>' + escapeHtml(info.lastUpdateT) + '</td>' +
+        '<td>' + escapeHtml(info.reportT) + ' mins</td>' +
+        '<td>' + agentLink('/plc/', info.TargetID) + '</td>' +
+        '<td>' + escapeHtml(info.TargetIP) + '</td>' +
+        '<td>' + countBadge(info.exceptCount) + '</td>' +
+        '<td>' + escapeHtml(info.totalRptCount) + '</td>';
+}
+
+function updateAgentRows(infoList, rowHtmlFun) {
+    $.each(infoList, function (idx, info) {
+        var row = $('#agentTable tr').filter(function () { return $(this).data('agent') == info.id; });
+        if (row.length == 0) {
+            row = $('<tr>').data('agent', info.id);
+            $('#agentTable').append(row);
+        }
+        row.html(rowHtmlFun(info));
+    });
+}
+
+//-----------------------------------------------------------------------------
+// Peer state page.
+function updateInfoFields(info) {
+    $('[data-field]').each(function () {
+        var field = $(this).data('field');
+        if (!(field in info)) return;
+        if (field == 'online') {
+            $(this).html(onlineBadge(info.online));
+        } else if (field == 'protocol') {
+            $(this).html(protocolBadge(info.protocol));
+        } else {
+            $(this).text(info[field]);
+        }
+    });
+}
+
+function appendReports(tableId, reportList, rowHtmlFun, replace) {
+    var table = $(tableId);
+    if (replace) table.empty();
+    $.each(reportList, function (idx, report) { table.append(rowHtmlFun(report)); });
+    while (table.children('tr').length > RCD_NUM) table.children('tr').first().remove();
+}
+
+function reportRowHtml(report) {
+    var cls = report.type == 'alert' ? 'bg-danger' : (report.type == 'warning' ? 'bg-warning' : 'bg-info');
+    return '<tr><td>' + escapeHtml(report.time) + '</td><td>' + badge(cls, report.type) +
+        '</td><td>' + escapeHtml(report.message) + '</td></tr>';
+}
+
+function alertRowHtml(report) {
+    return '<tr class="' + (report.type == 'warning' ? 'table-warning' : 'table-danger') + '"><td>' +
+        escapeHtml(report.time) + '</td><td>' + escapeHtml(report.type) + '</td><td>' +
+        escapeHtml(report.message) + '</td></tr>';
+}
+
+//-----------------------------------------------------------------------------
+// Start the update, view: 'plc' / 'controller' for the agents table pages or 'agent' 
+// for the peer state page of the agentID. version: version of the rendered page.
+function startHubLive(view, version, agentID) {
+    if (!window.EventSource) return;
+    var url = '/api/v1/stream?since=' + version;
+    if (view == 'agent') {
+        url += '&id=' + encodeURIComponent(agentID);
+    } else {
+        url += '&view=' + view;
+    }
+    var source = new EventSource(url);
+    source.onmessage = function (evt) {
+        var delta = JSON.parse(evt.data);
+        if (view == 'plc') {
+            updateAgentRows(delta.plcs, plcRowHtml);
+        } else if (view == 'controller') {
+            updateAgentRows(delta.controllers, controllerRowHtml);
+        } else {
+            var infoList = delta.plcs.concat(delta.controllers);
+            if (infoList.length > 0) updateInfoFields(infoList[0]);
+            var reports = delta.reports[agentID];
+            if (reports) {
+                appendReports('#reportTable', reports.report, reportRowHtml, delta.full);
+                appendReports('#alertTable', reports.alert, alertRowHtml, delta.full);
+            }
+        }
+    };
+}
@@ -0,0 +1,274 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        modbusCapture.py
+#
+# Purpose:     This module will provide the Modbus request capture function for the
+#              PLC emulator's <modbusTcpCom.plcDataHandler>. Each Modbus request is
+#              recorded into a preallocated in memory ring buffer, a background thread
+#              flushes the ring buffer to a compact append only binary session file
+#              with an index file, so the requests of one client (attacker) can be
+#              pulled out from the session file quickly.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2024/12/16
+# Version:     v_0.1.3
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+
+    The capture has 3 parts:
+
+    - captureRing: A preallocated fixed size ring buffer. The request path only takes a
+        sequence number from a C level counter and stores the record tuple in the slot,
+        it never waits for the flush thread. If the flush thread is too slow, the oldest
+        records will be overwritten and counted as lost.
+
+    - sessionLogWriter/sessionLogReader: The binary session file is a list of chunks, each
+        flush groups the records by client IP and writes one chunk per client:
+            chunk header: <magic 4s> <client ip I> <record count I> <records bytes len I>
+            record: <timestamp d> <client ip I> <client port H> <function code H>
+                    <allowed B> <address I> <count I> <pdu len H> <pdu bytes>
+        The index file (session file path + '.idx') keeps one fixed size entry per chunk:
+            <client ip I> <chunk offset Q> <record count I> <first ts d> <last ts d>
+        So the reader can seek to the chunks of one client directly. If the index file is
+        missing, the reader rebuilds the index by scanning the chunk headers.
+
+    - modbusCapture: The capture thread object used by the plcDataHandler, call
+        addRecord() in the request path and start() the thread to flush the records.
+"""
+
+import os
+import time
+import socket
+import struct
+import threading
+import itertools
+
+CHUNK_MAGIC = b'MBCK'
+CHUNK_HEADER = struct.Struct('<4sIII')
+RECORD_HEADER = struct.Struct('<dIHHBIIH')
+INDEX_ENTRY = struct.Struct('<IQIdd')
+
+DEF_RING_SIZE = 65536   # number of records the ring buffer can keep.
+DEF_FLUSH_INT = 1       # flush interval in seconds.
+
+#-----------------------------------------------------------------------------
+def ipToInt(ipaddress):
+    """ Convert the IPv4 string to int, return 0 if the ip is not a valid IPv4 address."""
+    try:
+        return struct.unpack('!I', socket.inet_aton(ipaddress))[0]
+    except (OSError, TypeError):
+        return 0
+
+def intToIp(ipInt):
+    return socket.inet_ntoa(struct.pack('!I', ipInt))
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class captureRing(object):
+    """ Preallocated ring buffer, multi producers (server threads / event loop) and one
+        consumer (flush thread).
+    """
+    def __init__(self, size=DEF_RING_SIZE):
+        """ Init example: ring = captureRing(size=65536)
+            Args:
+                size (int, optional): ring slots number, will be rounded up to the power
+                    of 2. Defaults to DEF_RING_SIZE.
+        """
+        self.size = 1 << max(1, int(size) - 1).bit_length()
+        self._mask = self.size - 1
+        self._slots = [None] * self.size
+        self._seqGen = itertools.count()    # next() on the C counter is atomic under GIL.
+        self._readSeq = 0
+        self.lostCount = 0
+
+    def add(self, record):
+        """ Put a record in the ring, never blocks."""
+        seq = next(self._seqGen)
+        self._slots[seq & self._mask] = (seq, record)
+
+    def popAll(self):
+        """ Return all the records added since the last popAll() call (consumer side)."""
+        recordList = []
+        while True:
+            slot = self._slots[self._readSeq & self._mask]
+            if slot is None or slot[0] < self._readSeq: break  # not written yet.
+            if slot[0] > self._readSeq:
+                # the producer overwrote the slot, jump to the oldest record still in the ring.
+                oldestSeq = slot[0] - self.size + 1
+                self.lostCount += oldestSeq - self._readSeq
+                self._readSeq = oldestSeq
+                continue
+            recordList.append(slot[1])
+            self._readSeq += 1
+        return recordList
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class sessionLogWriter(object):
+    """ Append the records to the binary session file and the index file."""
+    def __init__(self, filePath):
+        self.filePath = filePath
+        self.indexPath = filePath + '.idx'
+        dirPath = os.path.dirname(os.path.abspath(filePath))
+        if not os.path.exists(dirPath): os.makedirs(dirPath)
+        self._logFile = open(self.filePath, 'ab')
+        self._idxFile = open(self.indexPath, 'ab')
+
+    def writeRecords(self, recordList):
+        """ Write the records (timestamp, ip, port, funcCode, allowed, address, count, pdu),
+            one chunk per client ip.
+        """
+        clientDict = {}
+        for record in recordList:
+            clientDict.setdefault(record[1], []).append(record)
+        for ipaddress, clientRecords in clientDict.items():
+            ipInt = ipToInt(ipaddress)
+            data = bytearray()
+            for ts, _, port, funcCode, allowed, address, count, pdu in clientRecords:
+                data += RECORD_HEADER.pack(ts, ipInt, port & 0xFFFF, funcCode & 0xFFFF,
+                                           1 if allowed else 0, address, count, len(pdu))
+                data += pdu
+            offset = self._logFile.tell()
+            self._logFile.write(CHUNK_HEADER.pack(CHUNK_MAGIC, ipInt, len(clientRecords), len(data)))
+            self._logFile.write(data)
+            self._idxFile.write(INDEX_ENTRY.pack(ipInt, offset, len(clientRecords),
+                                                 clientRecords[0][0], clientRecords[-1][0]))
+        self._logFile.flush()
+        self._idxFile.flush()
+
+    def close(self):
+        self._logFile.close()
+        self._idxFile.close()
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class sessionLogReader(object):
+    """ Read the records from the binary session file."""
+    def __init__(self, filePath):
+        """ Init example: reader = sessionLogReader('Captures/modbusSession.cap')"""
+        self.filePath = filePath
+        self.indexList = self._loadIndex()
+
+    def _loadIndex(self):
+        """ Load the chunk index list [(ipInt, offset, recordCount, firstTs, lastTs), ...]."""
+        indexList = []
+        indexPath = self.filePath + '.idx'
+        if os.path.exists(indexPath):
+            with open(indexPath, 'rb') as fh:
+                data = fh.read()
+            usedLen = len(data) - len(data) % INDEX_ENTRY.size
+            indexList = list(INDEX_ENTRY.iter_unpack(data[:usedLen]))
+        fileSize = os.path.getsize(self.filePath)
+        # rebuild the index of the chunks not in the index file (no index or partial write).
+        offset = 0
+        if indexList:
+            lastEntry = indexList[-1]
+            with open(self.filePath, 'rb') as fh:
+                fh.seek(lastEntry[1])
+                offset = lastEntry[1] + CHUNK_HEADER.size + CHUNK_HEADER.unpack(fh.read(CHUNK_HEADER.size))[3]
+        if offset < fileSize:
+            with open(self.filePath, 'rb') as fh:
+                while offset + CHUNK_HEADER.size <= fileSize:
+                    fh.seek(offset)
+                    magic, ipInt, recordCount, dataLen = CHUNK_HEADER.unpack(fh.read(CHUNK_HEADER.size))
+                    if magic != CHUNK_MAGIC or offset + CHUNK_HEADER.size + dataLen > fileSize: break
+                    records = self._readChunk(fh, offset)
+                    indexList.append((ipInt, offset, recordCount, records[0][0] if records else 0,
+                                      records[-1][0] if records else 0))
+                    offset += CHUNK_HEADER.size + dataLen
+        return indexList
+
+    def _readChunk(self, fh, offset):
+        """ Read all the records of the chunk at the file offset."""
+        fh.seek(offset)
+        magic, _, recordCount, dataLen = CHUNK_HEADER.unpack(fh.read(CHUNK_HEADER.size))
+        if magic != CHUNK_MAGIC: return []
+        data = fh.read(dataLen)
+        recordList, pos = [], 0
+        for _ in range(recordCount):
+            ts, ipInt, port, funcCode, allowed, address, count, pduLen = RECORD_HEADER.unpack_from(data, pos)
+            pos += RECORD_HEADER.size
+            recordList.append((ts, intToIp(ipInt), port, funcCode, allowed == 1, address, count,
+                               bytes(data[pos:pos + pduLen])))
+            pos += pduLen
+        return recordList
+
+    #-----------------------------------------------------------------------------
+    def getClientIps(self):
+        """ Return the list of client ip addresses in the session file."""
+        return sorted({intToIp(entry[0]) for entry in self.indexList}, key=ipToInt)
+
+    def getClientSummary(self):
+        """ Return dict {clientIp: (recordCount, firstTs, lastTs)}."""
+        summaryDict = {}
+        for ipInt, _, recordCount, firstTs, lastTs in self.indexList:
+            ipaddress = intToIp(ipInt)
+            if ipaddress in summaryDict:
+                count, startTs, endTs = summaryDict[ipaddress]
+                summaryDict[ipaddress] = (count + recordCount, min(startTs, firstTs), max(endTs, lastTs))
+            else:
+                summaryDict[ipaddress] = (recordCount, firstTs, lastTs)
+        return summaryDict
+
+    def getRecords(self, clientIp=None):
+        """ Return the records list of one client (or all the clients if clientIp is None)
+            sorted by time stamp, record format:
+            (timestamp, ip, port, funcCode, allowed, address, count, pdu)
+        """
+        ipInt = None if clientIp is None else ipToInt(clientIp)
+        recordList = []
+        with open(self.filePath, 'rb') as fh:
+            for entry in self.indexList:
+                if ipInt is None or entry[0] == ipInt:
+                    recordList.extend(self._readChunk(fh, entry[1]))
+        recordList.sort(key=lambda record: record[0])
+        return recordList
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class modbusCapture(threading.Thread):
+    """ Capture thread to record the Modbus requests and flush them to the session file."""
+    def __init__(self, filePath, ringSize=DEF_RING_SIZE, flushInterval=DEF_FLUSH_INT):
+        """ Init example: capture = modbusCapture('Captures/modbusSession.cap')
+            Args:
+                filePath (str): binary session file path.
+                ringSize (int, optional): ring buffer size. Defaults to DEF_RING_SIZE.
+                flushInterval (int, optional): flush interval in seconds. Defaults to DEF_FLUSH_INT.
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.ring = captureRing(size=ringSize)
+        self.writer = sessionLogWriter(filePath)
+        self.flushInterval = flushInterval
+        self.recordCount = 0
+        self._stopEvt = threading.Event()
+
+    def addRecord(self, ipaddress, port, funcCode, allowed, address, count, pdu):
+        """ Record one request, called in the request path."""
+        self.ring.add((time.time(), ipaddress, port, funcCode, allowed, address, count, pdu))
+
+    def flush(self):
+        """ Write all the records in the ring buffer to the session file."""
+        recordList = self.ring.popAll()
+        if recordList:
+            self.writer.writeRecords(recordList)
+            self.recordCount += len(recordList)
+        return len(recordList)
+
+    def getStatus(self):
+        return {'recorded': self.recordCount, 'lost': self.ring.lostCount}
+
+    #-----------------------------------------------------------------------------
+    def run(self):
+        while not self._stopEvt.wait(self.flushInterval):
+            try:
+                self.flush()
+            except Exception as err:
+                print("modbusCapture.run() Error: %s" %str(err))
+        self.flush()
+        self.writer.close()
+
+    def stop(self):
+        self._stopEvt.set()
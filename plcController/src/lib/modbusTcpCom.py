@@ -35,29 +35,69 @@
             will auto passed in the runLadderLogic() function.
         7. runLadderLogic() will return the calculated coils list result, plcDataHandler will set 
             the destination coils with the result.
+        Instead of overwriting runLadderLogic(), the ladder can also set the declarative rungs 
+        list (refer to <ladderRungs.py>) in initLadderInfo(), for the same ladder example:
+            self.rungList = [(0, (RUNG_AND, 0, 1, 2))] # input idx: regs list + src coils list
+        The rungs will be compiled once to integer bitwise operations and the default 
+        runLadderLogic() will use the compiled evaluator.
+
+    - ipAccessList: The IP address white list which accepts single IPv4 address and CIDR network 
+        (such as 192.168.10.0/24), the single addresses are saved in a hash set and the networks 
+        are saved in a binary prefix trie, the check result of each client address is cached
+        and the cache is cleared when the list is changed.
 
     - plcDataHandler: A pyModbusTcp.dataHandler module to keep one allow read white list and one 
         allow write white list to filter the client's coils or registers read and write request.
         As most of the PLC are using the input => register (memory) parameter config, they are 
         not allowed to change the input directly, we only provide the coil and holding register 
         write functions.
+        When auto update is enabled, the handler only runs the ladders whose holding registers 
+        or source coils window overlaps the written address range, the ladders are run in the 
+        dependency order (a ladder whose dest coils feed other ladder's source coils will be 
+        executed first) and the ladders fed by an executed ladder will be executed after it.
+        If a <modbusCapture.modbusCapture> obj is set by setCapture(), every read/write request
+        (client ip/port, function code, address, count, pdu and the allowed/denied verdict) will
+        be recorded in the capture ring buffer.
     
     - modbusTcpClient: Modbus-TCP client module to read/write holding register and coils data 
-        from/to the target PLC. 
+        from/to the target PLC. Besides the single coil/register write, it also provides the 
+        block write functions (FC15/FC16) and the write-read holding registers function (FC23)
+        so the client can set a whole input vector in one round trip.
+
+    - asyncModbusTcpClient: asyncio Modbus-TCP client which assigns the transaction ID of each
+        request and keeps a window of in flight requests on one TCP connection, the responses
+        are matched to the requests by the transaction ID. It provides the awaitable version 
+        of the modbusTcpClient read/write functions.
 
     - modbusTcpServer: Modbus-TCP server module will be used by PLC module to handle the modbus 
         data read/set request. If the input data handler is None, the server will create and keep 
-        one empty databank inside.
+        one empty databank inside. Two server engines can be selected:
+        1. ENGINE_THREAD: pyModbusTCP's ModbusServer which create one thread per client.
+        2. ENGINE_ASYNCIO: asyncioModbusServer which serve all the clients' sockets from one 
+            asyncio event loop, used when the PLC need to handle large number of concurrent 
+            connections (such as mass scanner sweep).
 """
 import re
 import time
+import heapq
+import socket
+import struct
+import asyncio
 from collections import OrderedDict
 
 from pyModbusTCP.client import ModbusClient
 from pyModbusTCP.server import ModbusServer, DataHandler, DataBank
-from pyModbusTCP.constants import EXP_ILLEGAL_FUNCTION
+from pyModbusTCP.constants import EXP_ILLEGAL_FUNCTION, WRITE_READ_MULTIPLE_REGISTERS
+
+import ladderRungs
 
 IPV4_PATTERN = r'^(\d{1,3}\.){3}\d{1,3}$'
+CIDR_PATTERN = r'^(\d{1,3}\.){3}\d{1,3}/\d{1,2}$'
+IP_CACHE_SIZE = 4096    # max number of client address check result cached.
+
+# Modbus-TCP server engine types
+ENGINE_THREAD = 'thread'    # pyModbusTCP thread per client socket server.
+ENGINE_ASYNCIO = 'asyncio'  # single event loop socket server.
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -73,7 +113,10 @@ class ladderLogic(object):
         self.holdingRegsInfo = {'address': None, 'offset': None}
         self.srcCoilsInfo = {'address': None, 'offset': None}
         self.destCoilsInfo = {'address': None, 'offset': None}
+        self.rungList = None # declarative rungs list [(outputIdx, logicExpr), ...]
         self.initLadderInfo()
+        self.rungEvaluator = None
+        if self.rungList: self.compileRungs()
 
     def initLadderInfo(self):
         """ Init the ladder register, src and dest coils information, this function will 
@@ -81,6 +124,13 @@ class ladderLogic(object):
         """
         pass
 
+    def compileRungs(self):
+        """ Compile the declarative self.rungList to the bitwise ladder evaluator. The 
+            rung input index is the index in the list (holding registers + source coils).
+        """
+        outputNum = self.destCoilsInfo['offset']
+        self.rungEvaluator = ladderRungs.rungCompiler(self.rungList, outputNum=outputNum)
+
 #-----------------------------------------------------------------------------
 # Define all the get() functions here:
 
@@ -101,9 +151,109 @@ class ladderLogic(object):
         """ Pass in the registers state list, source coils state list and 
             calculate output destination coils state, this function will be called by 
             plcDataHandler.updateState() function.
-            - Please over write this function.
+            - Please over write this function if the ladder doesn't set the rungList.
         """
-        return []
+        if self.rungEvaluator is None or regsList is None: return []
+        inputList = regsList if coilList is None else list(regsList) + list(coilList)
+        return self.rungEvaluator.evaluate(inputList)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class ipAccessList(object):
+    """ IP address white list with constant time check, the list entry can be a single
+        IPv4 address or a CIDR network.
+    """
+    def __init__(self, ipList=None):
+        """ Init example: ipAccessList(ipList=['127.0.0.1', '192.168.10.0/24'])
+            Args:
+                ipList (list(str), optional): list of ip address or CIDR network string.
+                    Defaults to None.
+        """
+        self.entryList = []     # the entries in the add in sequence (for display).
+        self.hostSet = set()    # single ip addresses.
+        self.netTrie = None     # CIDR networks prefix trie node: [child0, child1, isNetEnd]
+        self.checkCache = {}    # client address -> check result.
+        if ipList: self.setEntries(ipList)
+
+    #-----------------------------------------------------------------------------
+    def _parseEntry(self, entry):
+        """ Parse the ip/CIDR string to (ipInt, prefixLen), return None if invalid."""
+        if not isinstance(entry, str): entry = str(entry)
+        entry = entry.strip()
+        prefixLen = 32
+        if re.match(CIDR_PATTERN, entry):
+            entry, prefixLen = entry.split('/')
+            prefixLen = int(prefixLen)
+            if prefixLen > 32: return None
+        elif not re.match(IPV4_PATTERN, entry):
+            return None
+        try:
+            ipInt = struct.unpack('!I', socket.inet_aton(entry))[0]
+        except OSError:
+            return None
+        # clear the host bits of the network address.
+        ipInt &= (0xFFFFFFFF << (32 - prefixLen)) & 0xFFFFFFFF
+        return (ipInt, prefixLen)
+
+    def _matchNet(self, ipaddress):
+        """ Walk the prefix trie to check whether the ip is in one of the CIDR networks."""
+        node = self.netTrie
+        if node is None or not re.match(IPV4_PATTERN, ipaddress): return False
+        try:
+            ipInt = struct.unpack('!I', socket.inet_aton(ipaddress))[0]
+        except OSError:
+            return False
+        for i in range(31, -1, -1):
+            if node[2]: return True
+            node = node[(ipInt >> i) & 1]
+            if node is None: return False
+        return node[2]
+
+    #-----------------------------------------------------------------------------
+    def addEntry(self, entry):
+        """ Add a ip address or CIDR network string in the list, return True if added 
+            or already in the list, False if the input format is incorrect.
+        """
+        parsed = self._parseEntry(entry)
+        if parsed is None: return False
+        ipInt, prefixLen = parsed
+        entryStr = socket.inet_ntoa(struct.pack('!I', ipInt))
+        if prefixLen == 32:
+            self.hostSet.add(entryStr)
+        else:
+            entryStr += '/%d' % prefixLen
+            if self.netTrie is None: self.netTrie = [None, None, False]
+            node = self.netTrie
+            for i in range(31, 31 - prefixLen, -1):
+                bit = (ipInt >> i) & 1
+                if node[bit] is None: node[bit] = [None, None, False]
+                node = node[bit]
+            node[2] = True
+        if entryStr not in self.entryList: self.entryList.append(entryStr)
+        self.checkCache = {}
+        return True
+
+    def setEntries(self, ipList):
+        """ Replace all the entries with the input list, the invalid entries are ignored."""
+        self.entryList, self.hostSet, self.netTrie = [], set(), None
+        self.checkCache = {}
+        for entry in ipList:
+            if not self.addEntry(entry):
+                print("ipAccessList.setEntries() Warning: ignore invalid ip entry %s" %str(entry))
+
+    def getEntries(self):
+        return self.entryList
+
+    #-----------------------------------------------------------------------------
+    def check(self, ipaddress):
+        """ Check whether the ip address is in the list."""
+        cache = self.checkCache # keep the ref, a list change during the check replaces the cache.
+        result = cache.get(ipaddress)
+        if result is None:
+            result = ipaddress in self.hostSet or self._matchNet(ipaddress)
+            if len(cache) >= IP_CACHE_SIZE: cache.clear()
+            cache[ipaddress] = result
+        return result
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -118,28 +268,113 @@ class plcDataHandler(DataHandler):
         """ Obj init example: plcDataHandler(allowRipList=['127.0.0.1', '192.168.10.112'], allowWipList=['192.168.10.113'])
         Args:
             data_bank (<pyModbusTcp.DataBank>, optional): . Defaults to None.
-            allowRipList (list(str), optional): list of ip address string which are allowed to read 
-                the data from PLC. Defaults to None allow any ip to read. 
-            allowWipList (list(str), optional): list of ip address string which are allowed to write
-                the data to PLC. Defaults to None allow any ip to write.
+            allowRipList (list(str), optional): list of ip address or CIDR network string which 
+                are allowed to read the data from PLC. Defaults to None allow any ip to read. 
+            allowWipList (list(str), optional): list of ip address or CIDR network string which
+                are allowed to write the data to PLC. Defaults to None allow any ip to write.
         """
         self.data_bank = DataBank() if data_bank is None else data_bank
         super().__init__(self.data_bank)
         self.serverInfo = None
-        self.allowRipList = allowRipList
-        self.allowWipList = allowWipList
+        self.allowRipList = None if allowRipList is None else ipAccessList(ipList=allowRipList)
+        self.allowWipList = None if allowWipList is None else ipAccessList(ipList=allowWipList)
         self.autoUpdate = False # auto update if the holding register state changed. 
         self.ladderDict = OrderedDict()
+        # ladder schedule info rebuilt when a ladder is added.
+        self.regLadderMap = {}      # holding register address -> ladder keys use the register.
+        self.coilLadderMap = {}     # coil address -> ladder keys use the coil as source.
+        self.ladderFeedMap = {}     # ladder key -> ladder keys fed by its dest coils.
+        self.ladderRankDict = {}    # ladder key -> execution sequence rank.
+        self.scheduleReady = True   # False: need to rebuild the schedule info before use.
+        self.captureObj = None      # modbusCapture obj to record the requests.
 
     def _checkAllowRead(self, ipaddress):
         """ Check whether the input IP address is allowed to read the info."""
-        if (self.allowRipList is None) or (ipaddress in self.allowRipList): return True
+        if (self.allowRipList is None) or self.allowRipList.check(ipaddress): return True
         return False 
 
     def _checkAllowWrite(self, ipaddress):
         """ Check whether the input IP address is allowed to write the info."""
-        if (self.allowWipList is None) or (ipaddress in self.allowWipList): return True
+        if (self.allowWipList is None) or self.allowWipList.check(ipaddress): return True
         return False
+
+    def _captureRequest(self, srv_info, address, count, allowed):
+        """ Record the request in the capture ring buffer."""
+        pdu = srv_info.recv_frame.pdu
+        self.captureObj.addRecord(srv_info.client.address, srv_info.client.port, pdu.func_code,
+                                  allowed, address, count, bytes(pdu.raw))
+
+    def _getWindow(self, addrInfo):
+        """ Return the (start, end) address range of a ladder address info dict or None."""
+        if addrInfo['address'] is None or addrInfo['offset'] is None: return None
+        return (addrInfo['address'], addrInfo['address'] + addrInfo['offset'])
+
+    def _buildLadderSchedule(self):
+        """ Build the address -> ladders index maps and the ladders dependency graph, then 
+            sort the ladders in the dependency order (the add in sequence is kept for the 
+            ladders without dependency and for the ladders in a dependency loop).
+        """
+        self.regLadderMap, self.coilLadderMap, self.ladderFeedMap = {}, {}, {}
+        destWindows, seqDict = {}, {}
+        for key, item in self.ladderDict.items():
+            regWindow = self._getWindow(item.getHoldingRegsInfo())
+            # ladder without holding registers info will not be run by updateState().
+            if regWindow is None: continue
+            seqDict[key] = len(seqDict)
+            for addr in range(*regWindow):
+                self.regLadderMap.setdefault(addr, []).append(key)
+            srcWindow = self._getWindow(item.getSrcCoilsInfo())
+            if srcWindow:
+                for addr in range(*srcWindow):
+                    self.coilLadderMap.setdefault(addr, []).append(key)
+            destWindows[key] = self._getWindow(item.getDestCoilsInfo())
+        inDegree = dict.fromkeys(seqDict, 0)
+        for key, destWindow in destWindows.items():
+            feedSet = set()
+            if destWindow:
+                for addr in range(*destWindow):
+                    feedSet.update(self.coilLadderMap.get(addr, ()))
+                feedSet.discard(key)
+            self.ladderFeedMap[key] = sorted(feedSet, key=seqDict.get)
+            for tgtKey in feedSet: inDegree[tgtKey] += 1
+        # Kahn topological sort which always picks the earliest added ready ladder.
+        readyHeap = [(seq, key) for key, seq in seqDict.items() if inDegree[key] == 0]
+        heapq.heapify(readyHeap)
+        rankList = []
+        while len(rankList) < len(seqDict):
+            if not readyHeap:
+                loopKey = min((key for key in seqDict if inDegree[key] > 0), key=seqDict.get)
+                print("_buildLadderSchedule() Warning: ladder dependency loop at %s" %str(loopKey))
+                inDegree[loopKey] = 0
+                readyHeap.append((seqDict[loopKey], loopKey))
+            _, readyKey = heapq.heappop(readyHeap)
+            inDegree[readyKey] = -1
+            rankList.append(readyKey)
+            for tgtKey in self.ladderFeedMap[readyKey]:
+                if inDegree[tgtKey] > 0:
+                    inDegree[tgtKey] -= 1
+                    if inDegree[tgtKey] == 0: heapq.heappush(readyHeap, (seqDict[tgtKey], tgtKey))
+        self.ladderRankDict = {key: rank for rank, key in enumerate(rankList)}
+        self.scheduleReady = True
+
+    def _getAffectedLadders(self, regRange=None, coilRange=None):
+        """ Return the ladder keys (in execution sequence) need to be run after the 
+            holding registers / coils in the (startAddr, endAddr) range are changed.
+        """
+        if not self.scheduleReady: self._buildLadderSchedule()
+        affectSet = set()
+        for addrRange, ladderMap in ((regRange, self.regLadderMap), (coilRange, self.coilLadderMap)):
+            if addrRange is None or not ladderMap: continue
+            for addr in range(*addrRange):
+                if addr in ladderMap: affectSet.update(ladderMap[addr])
+        # add the ladders fed by the affected ladders' dest coils.
+        checkList = list(affectSet)
+        while checkList:
+            for tgtKey in self.ladderFeedMap.get(checkList.pop(), ()):
+                if tgtKey not in affectSet:
+                    affectSet.add(tgtKey)
+                    checkList.append(tgtKey)
+        return sorted(affectSet, key=self.ladderRankDict.get)
     
 #-----------------------------------------------------------------------------
     def initServerInfo(self, serverInfo):
@@ -151,28 +386,20 @@ class plcDataHandler(DataHandler):
         self.serverInfo = serverInfo
 
     def addAllowReadIp(self, ipaddress):
-        """ Add a IP address to the allow read list.
+        """ Add a IP address or CIDR network to the allow read list.
             Args:
-                ipaddress (str): ip address string
+                ipaddress (str): ip address string such as '192.168.10.1' or '192.168.10.0/24'
         """
-        if not isinstance(ipaddress, str): ipaddress = str(ipaddress)
-        if ipaddress and re.match(IPV4_PATTERN, ipaddress):
-            if not ipaddress in self.allowRipList:
-                self.allowRipList.append(ipaddress)
-            return True 
-        return False
+        if self.allowRipList is None: self.allowRipList = ipAccessList()
+        return self.allowRipList.addEntry(ipaddress)
 
     def addAllowWriteIp(self, ipaddress):
-        """ Add a IP address to the allow write list.
+        """ Add a IP address or CIDR network to the allow write list.
             Args:
-                ipaddress (str): ip address string
+                ipaddress (str): ip address string such as '192.168.10.1' or '192.168.10.0/24'
         """
-        if not isinstance(ipaddress, str): ipaddress = str(ipaddress)
-        if ipaddress and re.match(IPV4_PATTERN, ipaddress):
-            if not ipaddress in self.allowWipList:
-                self.allowWipList.append(ipaddress)
-            return True
-        return False
+        if self.allowWipList is None: self.allowWipList = ipAccessList()
+        return self.allowWipList.addEntry(ipaddress)
         
     def addLadderLogic(self, ladderKey, logicObj):
         """ Add a <ladderLogic> obj in the ladder logic, all the ladder logic will be executed 
@@ -183,6 +410,7 @@ class plcDataHandler(DataHandler):
                 logicObj (ladderLogic): _description_
         """
         self.ladderDict[ladderKey] = logicObj
+        self.scheduleReady = False
 
 #-----------------------------------------------------------------------------
 # Init all the iterator read() functions.(Internal callback by <modbusTcpServer>)
@@ -194,7 +422,9 @@ class plcDataHandler(DataHandler):
     def read_coils(self, address, addrOffset, srv_info):
         """ Read the output coils state"""
         try:
-            if self._checkAllowRead(srv_info.client.address):
+            allowed = self._checkAllowRead(srv_info.client.address)
+            if self.captureObj: self._captureRequest(srv_info, address, addrOffset, allowed)
+            if allowed:
                 return super().read_coils(address, addrOffset, srv_info)
         except Exception as err:
             print("read_coils() Error: %s" %str(err))
@@ -203,7 +433,9 @@ class plcDataHandler(DataHandler):
     def read_d_inputs(self, address, addrOffset, srv_info):
         """ Read the discrete input idx[I0.x]"""
         try:
-            if self._checkAllowRead(srv_info.client.address):
+            allowed = self._checkAllowRead(srv_info.client.address)
+            if self.captureObj: self._captureRequest(srv_info, address, addrOffset, allowed)
+            if allowed:
                 return super().read_d_inputs(address, addrOffset, srv_info)
         except Exception as err:
             print("read_d_inputs() Error: %s" %str(err))
@@ -212,7 +444,11 @@ class plcDataHandler(DataHandler):
     def read_h_regs(self, address, addrOffset, srv_info):
         """ Read the holding registers [idx]. """
         try:
-            if self._checkAllowRead(srv_info.client.address):
+            allowed = self._checkAllowRead(srv_info.client.address)
+            # the FC23 request is recorded by write_h_regs()
+            if self.captureObj and srv_info.recv_frame.pdu.func_code != WRITE_READ_MULTIPLE_REGISTERS:
+                self._captureRequest(srv_info, address, addrOffset, allowed)
+            if allowed:
                 return super().read_h_regs(address, addrOffset, srv_info)
         except Exception as err:
             print("read_h_regs() Error: %s" %str(err))
@@ -221,7 +457,9 @@ class plcDataHandler(DataHandler):
     def read_i_regs(self, address, addrOffset, srv_info):
         """ Read the input registers"""
         try:
-            if self._checkAllowRead(srv_info.client.address):
+            allowed = self._checkAllowRead(srv_info.client.address)
+            if self.captureObj: self._captureRequest(srv_info, address, addrOffset, allowed)
+            if allowed:
                 return super().read_i_regs(address, addrOffset, srv_info)
         except Exception as err:
             print("read_i_regs() Error: %s" %str(err))
@@ -238,8 +476,13 @@ class plcDataHandler(DataHandler):
     def write_coils(self, address, bits_l, srv_info):
         """ Write the PLC out coils."""
         try:
-            if self._checkAllowWrite(srv_info.client.address):
-                return super().write_coils(address, bits_l, srv_info)
+            allowed = self._checkAllowWrite(srv_info.client.address)
+            if self.captureObj: self._captureRequest(srv_info, address, len(bits_l), allowed)
+            if allowed:
+                result = super().write_coils(address, bits_l, srv_info)
+                if self.autoUpdate and (self.coilLadderMap or not self.scheduleReady):
+                    self.updateState(coilRange=(address, address + len(bits_l)))
+                return result
         except Exception as err:
             print("write_coils() Error: %s" %str(err))
         return DataHandler.Return(exp_code=EXP_ILLEGAL_FUNCTION)
@@ -247,9 +490,11 @@ class plcDataHandler(DataHandler):
     def write_h_regs(self, address, words_l, srv_info):
         """ write the holding registers."""
         try:
-            if self._checkAllowWrite(srv_info.client.address):
+            allowed = self._checkAllowWrite(srv_info.client.address)
+            if self.captureObj: self._captureRequest(srv_info, address, len(words_l), allowed)
+            if allowed:
                 result = super().write_h_regs(address, words_l, srv_info)
-                if self.autoUpdate: self.updateState()
+                if self.autoUpdate: self.updateState(regRange=(address, address + len(words_l)))
                 return result
         except Exception as err:
             print("write_h_regs() Error: %s" %str(err))
@@ -259,10 +504,10 @@ class plcDataHandler(DataHandler):
 # define all the public functions wich can be called from other module.
     
     def getAllowReadIpaddresses(self):
-        return self.allowRipList
+        return None if self.allowRipList is None else self.allowRipList.getEntries()
 
     def getAllowWriteIpaddresses(self):
-        return self.allowWipList
+        return None if self.allowWipList is None else self.allowWipList.getEntries()
 
     def getHoldingRegState(self, address, offset):
         if self.data_bank and self.serverInfo:
@@ -274,6 +519,12 @@ class plcDataHandler(DataHandler):
             return self.data_bank.get_coils(address, number=offset, srv_info=self.serverInfo)
         return None
 
+    def setCapture(self, captureObj):
+        """ Set the <modbusCapture.modbusCapture> obj to record the client requests, set 
+            None to stop recording.
+        """
+        self.captureObj = captureObj
+
     def setAutoUpdate(self, updateFlag):
         """ Set the auto update flag, if 'True', every time the holding registers
             state changed, the output coils will be updated automatically. 
@@ -282,14 +533,14 @@ class plcDataHandler(DataHandler):
 
     def setAllowReadIpaddresses(self, ipList):
         if isinstance(ipList, list) or isinstance(ipList, tuple) or ipList is None:
-            self.allowRipList = list(ipList)
+            self.allowRipList = None if ipList is None else ipAccessList(ipList=ipList)
             return True
         print("setAllowReadIpaddresses(): the input IP list is not valid.")
         return False
 
     def setAllowWriteIpaddresses(self, ipList):
         if isinstance(ipList, list) or isinstance(ipList, tuple) or ipList is None:
-            self.allowWipList = list(ipList)
+            self.allowWipList = None if ipList is None else ipAccessList(ipList=ipList)
             return True
         print("setAllowWriteIpaddresses(): the input IP list is not valid.")
         return False
@@ -303,15 +554,28 @@ class plcDataHandler(DataHandler):
     def updateHoldingRegs(self, address, bitList):
         if self.serverInfo:
             result = super().write_h_regs(address, bitList, self.serverInfo)
-            if self.autoUpdate: self.updateState()
+            if self.autoUpdate: self.updateState(regRange=(address, address + len(bitList)))
             return result
         print("updateHoldingRegs() Error: Parent modBus server not config, call initServerInfo() first.")
         return False
 
-    def updateState(self):
-        """ Update the PLC state base on the input ladder logic one by one."""
-        for key, item in self.ladderDict.items():
-            print("updateState(): update ladder logic: %s" %str(key))
+    def updateState(self, regRange=None, coilRange=None):
+        """ Update the PLC state base on the input ladder logic one by one.
+            Args:
+                regRange (tuple(int, int), optional): changed holding registers address 
+                    range (startAddr, endAddr). Defaults to None.
+                coilRange (tuple(int, int), optional): changed source coils address range.
+                    Defaults to None.
+            If both ranges are None, all the ladders will be executed, else only the ladders
+            affected by the changed addresses will be executed.
+        """
+        if not self.scheduleReady: self._buildLadderSchedule()
+        if regRange is None and coilRange is None:
+            keyList = sorted(self.ladderRankDict, key=self.ladderRankDict.get)
+        else:
+            keyList = self._getAffectedLadders(regRange=regRange, coilRange=coilRange)
+        for key in keyList:
+            item = self.ladderDict[key]
             # get the ladder logic related registers state.
             holdRegsInfo = item.getHoldingRegsInfo()
             if holdRegsInfo['address'] is None or holdRegsInfo['offset'] is None: continue
@@ -396,16 +660,315 @@ class modbusTcpClient(object):
             return data
         return None
 
+    def setMultiCoilsBits(self, addressIdx, bitList):
+        """ Set the coils [addressIdx: addressIdx + len(bitList)] in one request (FC15)."""
+        if self.client.is_open:
+            data = self.client.write_multiple_coils(addressIdx, [bool(val) for val in bitList])
+            return data
+        return None
+
+    def setMultiHoldingRegs(self, addressIdx, valList):
+        """ Set the holding registers [addressIdx: addressIdx + len(valList)] in one 
+            request (FC16).
+        """
+        if self.client.is_open:
+            data = self.client.write_multiple_registers(addressIdx, [int(val) for val in valList])
+            return data
+        return None
+
+    def setGetHoldingRegs(self, addressIdx, valList, readAddressIdx, offset):
+        """ Set the holding registers then read back the holding register list 
+            [readAddressIdx: readAddressIdx + offset] in one request (FC23), return 
+            None if error or server not allow client to read/write.
+        """
+        if self.client.is_open:
+            data = self.client.write_read_multiple_registers(addressIdx, [int(val) for val in valList],
+                                                             readAddressIdx, read_nb=offset)
+            if data: return list(data)
+        return None
+
     def close(self):
         self.client.close()
 
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class asyncModbusTcpClient(object):
+    """ Pipelined asyncio Modbus-TCP client, all the functions need to be awaited in the 
+        same event loop. Usage example:
+            client = modbusTcpCom.asyncModbusTcpClient('127.0.0.1', window=32)
+            if await client.connect():
+                results = await asyncio.gather(*[client.getCoilsBits(0, 8) for _ in range(100)])
+                await client.close()
+    """
+    def __init__(self, tgtIp, tgtPort=502, unitId=1, window=16, defaultTO=30) -> None:
+        """ Init example: client = modbusTcpCom.asyncModbusTcpClient('127.0.0.1')
+            Args:
+                tgtIp (str): target PLC ip Address. 
+                tgtPort (int, optional): modbus port. Defaults to 502.
+                unitId (int, optional): modbus unit ID. Defaults to 1.
+                window (int, optional): max number of in flight requests. Defaults to 16.
+                defaultTO (int, optional): default time out if modbus server doesn't 
+                    response a request. Defaults to 30 sec.
+        """
+        self.tgtIp = tgtIp
+        self.tgtPort = tgtPort
+        self.unitId = unitId
+        self.window = max(1, int(window))
+        self.defaultTO = defaultTO
+        self._reader = None
+        self._writer = None
+        self._recvTask = None
+        self._windowSem = None
+        self._tid = 0
+        self._pendingDict = {}  # transaction ID -> response future.
+
+    #-----------------------------------------------------------------------------
+    async def connect(self):
+        """ Connect to the PLC, return True if connected."""
+        if self.checkConn(): return True
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.tgtIp, self.tgtPort), self.defaultTO)
+        except (OSError, asyncio.TimeoutError) as err:
+            print('Fail connect to the target PLC: %s, error: %s' % (str((self.tgtIp, self.tgtPort)), str(err)))
+            return False
+        self._windowSem = asyncio.Semaphore(self.window)
+        self._recvTask = asyncio.create_task(self._recvLoop())
+        return True
+
+    def checkConn(self):
+        """ return the connection state."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        if self._recvTask:
+            self._recvTask.cancel()
+            try:
+                await self._recvTask
+            except asyncio.CancelledError:
+                pass
+        self._writer = self._recvTask = None
+        self._failPending()
+
+    #-----------------------------------------------------------------------------
+    def _failPending(self):
+        """ Set all the in flight requests' result to None."""
+        for future in self._pendingDict.values():
+            if not future.done(): future.set_result(None)
+        self._pendingDict = {}
+
+    async def _recvLoop(self):
+        """ Read the responses and pass each response PDU to the request's future."""
+        try:
+            while True:
+                header = await self._reader.readexactly(7)
+                tid, _, length, _ = struct.unpack('>HHHB', header)
+                # MBAP length field = unit id + PDU (max 253 bytes).
+                if not 1 <= length <= 254:
+                    print("Error: asyncModbusTcpClient: invalid MBAP length %d, close connection." % length)
+                    break
+                pdu = await self._reader.readexactly(length - 1)
+                future = self._pendingDict.pop(tid, None)
+                if future and not future.done(): future.set_result(pdu)
+        except (asyncio.IncompleteReadError, OSError, ValueError):
+            pass
+        finally:
+            if self._writer: self._writer.close()
+            self._failPending()
+
+    async def sendRawPdu(self, pdu):
+        """ Send one request PDU and return the response PDU (can be a exception response)
+            or None if connection error or time out.
+        """
+        if not self.checkConn(): return None
+        async with self._windowSem:
+            self._tid = (self._tid + 1) & 0xFFFF
+            tid = self._tid
+            future = asyncio.get_running_loop().create_future()
+            self._pendingDict[tid] = future
+            self._writer.write(struct.pack('>HHHB', tid, 0, len(pdu) + 1, self.unitId) + pdu)
+            try:
+                return await asyncio.wait_for(future, self.defaultTO)
+            except asyncio.TimeoutError:
+                self._pendingDict.pop(tid, None)
+                print("asyncModbusTcpClient: request %d time out." % tid)
+                return None
+
+    async def _request(self, pdu, byteCount=None):
+        """ Send one request PDU and return the response PDU or None if error.
+            Args:
+                pdu (bytes): request PDU.
+                byteCount (int, optional): expected data byte count of the read response,
+                    the short or truncated response is treated as error. Defaults to None.
+        """
+        respPdu = await self.sendRawPdu(pdu)
+        # exception response: function code + 0x80
+        if respPdu is None or len(respPdu) < 2 or respPdu[0] != pdu[0]: return None
+        if byteCount is not None and (respPdu[1] != byteCount or len(respPdu) < 2 + byteCount):
+            print("Error: asyncModbusTcpClient: invalid response byte count of FC%d." % pdu[0])
+            return None
+        return respPdu
+
+    def _packBits(self, bitList):
+        """ Pack the bool list to the modbus coils bytes (LSB first)."""
+        data = bytearray((len(bitList) + 7) // 8)
+        for i, val in enumerate(bitList):
+            if val: data[i // 8] |= 1 << (i % 8)
+        return bytes(data)
+
+#-----------------------------------------------------------------------------
+# Define all the get() functions here, return value is same as modbusTcpClient.
+
+    async def getCoilsBits(self, addressIdx, offset):
+        """ Get the coils bit list [addressIdx: addressIdx + offset] of the PLC (FC1)."""
+        respPdu = await self._request(struct.pack('>BHH', 0x01, addressIdx, offset),
+                                      byteCount=(offset + 7) // 8)
+        if respPdu is None: return None
+        return [bool((respPdu[2 + i // 8] >> (i % 8)) & 1) for i in range(offset)]
+
+    async def getHoldingRegs(self, addressIdx, offset):
+        """ Get the holding register list [addressIdx: addressIdx + offset] of the PLC (FC3)."""
+        respPdu = await self._request(struct.pack('>BHH', 0x03, addressIdx, offset), byteCount=offset * 2)
+        if respPdu is None: return None
+        return list(struct.unpack('>%dH' % offset, respPdu[2:2 + offset * 2]))
+
+#-----------------------------------------------------------------------------
+# Define all the set() functions here, return True if success, None if error.
+
+    async def setCoilsBit(self, addressIdx, bitVal):
+        """ Set one coil (FC5)."""
+        respPdu = await self._request(struct.pack('>BHH', 0x05, addressIdx, 0xFF00 if bitVal else 0))
+        return None if respPdu is None else True
+
+    async def setHoldingRegs(self, addressIdx, bitVal):
+        """ Set one holding register (FC6)."""
+        respPdu = await self._request(struct.pack('>BHH', 0x06, addressIdx, int(bitVal)))
+        return None if respPdu is None else True
+
+    async def setMultiCoilsBits(self, addressIdx, bitList):
+        """ Set the coils [addressIdx: addressIdx + len(bitList)] (FC15)."""
+        data = self._packBits(bitList)
+        respPdu = await self._request(struct.pack('>BHHB', 0x0F, addressIdx, len(bitList), len(data)) + data)
+        return None if respPdu is None else True
+
+    async def setMultiHoldingRegs(self, addressIdx, valList):
+        """ Set the holding registers [addressIdx: addressIdx + len(valList)] (FC16)."""
+        num = len(valList)
+        respPdu = await self._request(struct.pack('>BHHB%dH' % num, 0x10, addressIdx, num, num * 2,
+                                                  *[int(val) for val in valList]))
+        return None if respPdu is None else True
+
+    async def setGetHoldingRegs(self, addressIdx, valList, readAddressIdx, offset):
+        """ Set the holding registers then read back [readAddressIdx: readAddressIdx + offset]
+            in one request (FC23).
+        """
+        num = len(valList)
+        respPdu = await self._request(struct.pack('>BHHHHB%dH' % num, 0x17, readAddressIdx, offset,
+                                                  addressIdx, num, num * 2, *[int(val) for val in valList]),
+                                      byteCount=offset * 2)
+        if respPdu is None: return None
+        return list(struct.unpack('>%dH' % offset, respPdu[2:2 + offset * 2]))
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class asyncioModbusServer(ModbusServer):
+    """ pyModbusTCP ModbusServer which serves all the clients' sockets from one 
+        asyncio event loop instead of creating one thread per client. The modbus 
+        request decoding and the data handler callbacks (read_coils(), write_h_regs()
+        ...) are the same as the parent ModbusServer, so a <plcDataHandler> can be 
+        used by both engines without any change.
+    """
+    def __init__(self, host='localhost', port=502, data_bank=None, data_hdl=None, backlog=1024):
+        """ Init example: server = asyncioModbusServer(host='0.0.0.0', port=502, data_hdl=dataMgr)
+            Args:
+                host (str, optional): server host ip. Defaults to 'localhost'.
+                port (int, optional): modbus port. Defaults to 502.
+                data_bank (<pyModbusTcp.DataBank>, optional): Defaults to None.
+                data_hdl (<plcDataHandler>, optional): Defaults to None.
+                backlog (int, optional): listen socket backlog. Defaults to 1024.
+        """
+        super().__init__(host=host, port=port, data_bank=data_bank, data_hdl=data_hdl)
+        self.backlog = backlog
+        self._loop = None
+        self._stopEvt = None
+        self._clientWriters = set()
+
+    #-----------------------------------------------------------------------------
+    async def _handleClient(self, reader, writer):
+        """ Handle all the modbus requests of one client connection."""
+        self._clientWriters.add(writer)
+        sessionData = ModbusServer.SessionData()
+        peerName = writer.get_extra_info('peername')
+        (sessionData.client.address, sessionData.client.port) = peerName[0], peerName[1]
+        try:
+            while True:
+                sessionData.new_request()
+                sessionData.request.mbap.raw = await reader.readexactly(7)
+                sessionData.request.pdu.raw = await reader.readexactly(sessionData.request.mbap.length - 1)
+                sessionData.set_response_mbap()
+                self._engine(sessionData)
+                writer.write(sessionData.response.raw)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ModbusServer.Error, OSError):
+            pass # client closed the connection, sent an invalid frame or server stopped.
+        finally:
+            self._clientWriters.discard(writer)
+            writer.close()
+
+    async def _asyncServe(self):
+        """ Start the event loop socket server and serve until stop() is called."""
+        self._loop = asyncio.get_running_loop()
+        self._stopEvt = asyncio.Event()
+        service = await asyncio.start_server(self._handleClient, host=self.host,
+                                             port=self.port, backlog=self.backlog,
+                                             reuse_address=True)
+        self._evt_running.set()
+        try:
+            async with service:
+                await self._stopEvt.wait()
+                for writer in list(self._clientWriters): writer.close()
+        finally:
+            self._evt_running.clear()
+
+    #-----------------------------------------------------------------------------
+    def start(self):
+        """ Start the server, this function will block until stop() is called."""
+        if self.is_run: return
+        try:
+            asyncio.run(self._asyncServe())
+        except OSError as err:
+            raise ModbusServer.NetworkError(err)
+
+    def stop(self):
+        """ Stop the server, can be called from any thread."""
+        if self.is_run and self._loop:
+            self._loop.call_soon_threadsafe(self._stopEvt.set)
+
+    def processRequest(self, pdu, clientIp='127.0.0.1', clientPort=0, unitId=1):
+        """ Process one request PDU with the data handler without network connection (such 
+            as calculate the reference result of a replayed request), return the response PDU.
+        """
+        sessionData = ModbusServer.SessionData()
+        (sessionData.client.address, sessionData.client.port) = clientIp, clientPort
+        sessionData.request.mbap.raw = struct.pack('>HHHB', 0, 0, len(pdu) + 1, unitId)
+        sessionData.request.pdu.raw = pdu
+        sessionData.set_response_mbap()
+        self._engine(sessionData)
+        return bytes(sessionData.response.pdu.raw)
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class modbusTcpServer(object):
     """ Modbus-TCP server, used by PLC module to handle the modbus data read/set 
         request.
     """
-    def __init__(self, hostIp='0.0.0.0', hostPort=502, dataHandler=None) -> None:
+    def __init__(self, hostIp='0.0.0.0', hostPort=502, dataHandler=None, serverEngine=ENGINE_THREAD) -> None:
         """Init example:
             dataMgr = modbusTcpCom.plcDataHandler(allowRipList=ALLOW_R_L, allowWipList=ALLOW_W_L)
             server = modbusTcpCom.modbusTcpServer(hostIp=hostIp, hostPort=hostPort, dataHandler=dataMgr)
@@ -414,15 +977,22 @@ class modbusTcpServer(object):
             hostPort (int, optional): modbus port. Defaults to 502.
             dataHandler (<plcDataHandler>, optional): The handler object to auto process 
                 register and coils change. Defaults to None.
+            serverEngine (str, optional): ENGINE_THREAD or ENGINE_ASYNCIO. Defaults to 
+                ENGINE_THREAD.
         """
         self.hostIp = hostIp
         self.hostPort = hostPort
         self.server = None
+        if serverEngine not in (ENGINE_THREAD, ENGINE_ASYNCIO):
+            print("Server engine %s is not supported, use the %s engine." %(str(serverEngine), ENGINE_THREAD))
+            serverEngine = ENGINE_THREAD
+        self.serverEngine = serverEngine
+        serverClass = asyncioModbusServer if serverEngine == ENGINE_ASYNCIO else ModbusServer
         if dataHandler is None:
             print("PLC logic data handler is not define, use a empty data bank")
-            self.server = ModbusServer(host=hostIp, port=hostPort, data_bank=DataBank())
+            self.server = serverClass(host=hostIp, port=hostPort, data_bank=DataBank())
         else:
-            self.server = ModbusServer(host=hostIp, port=hostPort, data_hdl=dataHandler)
+            self.server = serverClass(host=hostIp, port=hostPort, data_hdl=dataHandler)
 
 #-----------------------------------------------------------------------------
     def isRunning(self):
@@ -433,10 +1003,13 @@ class modbusTcpServer(object):
     def getServerInfo(self):
         return self.server.ServerInfo
 
+    def getServerEngine(self):
+        return self.serverEngine
+
 #-----------------------------------------------------------------------------
     def startServer(self):
         """ Run the server start loop."""
-        print("Start to run the Modbus TCP server: (%s, %s)" %(self.hostIp, str(self.hostPort)))
+        print("Start to run the Modbus TCP server: (%s, %s), engine: %s" %(self.hostIp, str(self.hostPort), self.serverEngine))
         self.server.start()
 
     def stopServer(self):
@@ -38,6 +38,13 @@ provide the s7comm communication function to read/write the data from/to the PLC
 5.ftpComm.py:
 provide the ftp communication function to synchronize the log file from every components
 not to the archive server.
+
+6.ladderRungs.py:
+provide the declarative PLC ladder rungs description and the rungs compiler used by
+the modbusTcpCom and snap7Comm ladder logic.
+
+7.modbusCapture.py:
+provide the Modbus request capture ring buffer and the binary session log writer/reader.
 """
 from src/honeypotMonitor/monitorApp.py
 from src.lib import ConfigLoader
@@ -0,0 +1,155 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        ladderRungs.py
+#
+# Purpose:     This module will provide a declarative PLC ladder rung description
+#              and a compiler to convert the rungs to integer bitwise operations,
+#              so a whole ladder can be compiled once and evaluated without running
+#              the hand written python boolean code.
+#              The module is used by the <modbusTcpCom.ladderLogic> and the
+#              <snap7Comm.rtuLadderLogic>.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2024/12/12
+# Version:     v_0.1.3
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Program Design:
+
+    A rung is described as a tuple (outputIdx, logicExpr), the logicExpr is a int
+    input index or a nested tuple with the gate type as the first element:
+        - int idx: the input state (register/coil/memory value) at the index.
+        - (RUNG_NOT, expr): not gate.
+        - (RUNG_AND, expr1, expr2, ...): and gate.
+        - (RUNG_OR, expr1, expr2, ...): or gate.
+    For example below ladder logic:
+        --|reg-00|--|reg-07|------------------------------------(coil-00)---
+        --|/reg-01|---------------------------------------------(coil-01)---
+    will be described as:
+        rungList = [(0, (RUNG_AND, 0, 7)), (1, (RUNG_NOT, 1))]
+
+    The rungCompiler generates the python expressions which calculate all the output
+    states with integer and/or/xor operations in two forms:
+        - lane form: each input state is one 0/1 byte of a bytes object, so packing
+          the inputs (bytes(map(bool, inputList))) and unpacking the outputs are
+          done in C. This is the form used by evaluate().
+        - packed form: all the input states are packed into one int (bit i = input i)
+          and all the output states are returned in one int, used by evaluateBits().
+    If the number of inputs is small, the compiler will precompute the truth table
+    of the whole ladder so evaluate the ladder with 0/1 (bool) input states only need
+    one dict lookup.
+"""
+
+import itertools
+
+RUNG_AND = 'AND'
+RUNG_OR = 'OR'
+RUNG_NOT = 'NOT'
+
+TRUTH_TABLE_MAX_IN = 10 # Max inputs number to build the truth table (2^10 entries)
+
+#-----------------------------------------------------------------------------
+def packBits(valList):
+    """ Pack a list of input states into one int, bit i = bool(valList[i])."""
+    bits = 0
+    for i, val in enumerate(valList):
+        if val: bits |= 1 << i
+    return bits
+
+def unpackBits(bits, bitNum):
+    """ Unpack the int to a list of bitNum bool values."""
+    return [(bits >> i) & 1 == 1 for i in range(bitNum)]
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class rungCompiler(object):
+    """ Compile the declarative rungs list to a bitwise ladder evaluator."""
+
+    def __init__(self, rungList, inputNum=None, outputNum=None):
+        """ Init example: ladder = rungCompiler([(0, ('AND', 0, 7)), (1, ('NOT', 1))])
+            Args:
+                rungList (list(tuple)): list of (outputIdx, logicExpr) rung tuples.
+                inputNum (int, optional): number of inputs. Defaults to None (max input
+                    index used in the rungs + 1).
+                outputNum (int, optional): number of outputs. Defaults to None (max output
+                    index + 1).
+        """
+        self.rungList = list(rungList)
+        usedInputs = set()
+        laneCodes, packedCodes = {}, []
+        for outputIdx, logicExpr in self.rungList:
+            if not isinstance(outputIdx, int) or outputIdx < 0:
+                raise ValueError("rungCompiler: invalid rung output index: %s" % str(outputIdx))
+            laneCodes[outputIdx] = self._compileExpr(logicExpr, usedInputs, packed=False)
+            packedCodes.append("((%s & 1) << %d)" % (self._compileExpr(logicExpr, usedInputs, packed=True),
+                                                     outputIdx))
+        self.inputNum = inputNum if inputNum is not None else (max(usedInputs) + 1 if usedInputs else 0)
+        self.outputNum = outputNum if outputNum is not None else (max(laneCodes) + 1 if laneCodes else 0)
+        if usedInputs and max(usedInputs) >= self.inputNum:
+            raise ValueError("rungCompiler: input index out of inputNum range: %d" % max(usedInputs))
+        # output without rung is always False (same as the unset coil/memory bit).
+        self.code = "lambda v: bytes((%s,))" % ", ".join(
+            laneCodes.get(idx, '0') for idx in range(self.outputNum)) if self.outputNum else "lambda v: b''"
+        self.packedCode = "lambda x: " + (" | ".join(packedCodes) if packedCodes else "0")
+        self._evalFun = eval(compile(self.code, '<ladderRungs>', 'eval'))
+        self._evalBitsFun = eval(compile(self.packedCode, '<ladderRungs>', 'eval'))
+        # Precompute the output states of every input combination.
+        self._truthTable = None
+        if self.inputNum <= TRUTH_TABLE_MAX_IN:
+            self._truthTable = {}
+            # key is the 0/1 states tuple, the bool states tuple has the same hash/eq.
+            for states in itertools.product((0, 1), repeat=self.inputNum):
+                self._truthTable[states] = tuple(map(bool, self._evalFun(bytes(states))))
+
+    #-----------------------------------------------------------------------------
+    def _compileExpr(self, logicExpr, usedInputs, packed=False):
+        """ Convert the logic expression to the python expression string, lane form
+            works on 0/1 values of bytes v, packed form works on the bits of int x.
+        """
+        if isinstance(logicExpr, bool):
+            raise ValueError("rungCompiler: bool is not a valid input index")
+        if isinstance(logicExpr, int):
+            if logicExpr < 0: raise ValueError("rungCompiler: invalid input index: %d" % logicExpr)
+            usedInputs.add(logicExpr)
+            return "(x >> %d)" % logicExpr if packed else "v[%d]" % logicExpr
+        if isinstance(logicExpr, (tuple, list)) and len(logicExpr) >= 2:
+            gate, args = str(logicExpr[0]).upper(), logicExpr[1:]
+            subExprs = [self._compileExpr(arg, usedInputs, packed=packed) for arg in args]
+            if gate == RUNG_NOT and len(subExprs) == 1:
+                return "(~%s)" % subExprs[0] if packed else "(1 ^ %s)" % subExprs[0]
+            if gate == RUNG_AND:
+                return "(%s)" % " & ".join(subExprs)
+            if gate == RUNG_OR:
+                return "(%s)" % " | ".join(subExprs)
+        raise ValueError("rungCompiler: invalid rung logic expression: %s" % str(logicExpr))
+
+    #-----------------------------------------------------------------------------
+    def getInputNum(self):
+        return self.inputNum
+
+    def getOutputNum(self):
+        return self.outputNum
+
+    def hasTruthTable(self):
+        return self._truthTable is not None
+
+    #-----------------------------------------------------------------------------
+    def evaluateBits(self, inputBits):
+        """ Evaluate the ladder with packed input bits, return the packed output bits."""
+        return self._evalBitsFun(inputBits) & ((1 << self.outputNum) - 1)
+
+    def evaluate(self, inputList):
+        """ Evaluate the ladder with the input state list.
+            Args:
+                inputList (list): input states, need at least getInputNum() items.
+            Returns:
+                list(bool): output states list or None if the input list is too short.
+        """
+        if inputList is None or len(inputList) < self.inputNum: return None
+        if len(inputList) > self.inputNum: inputList = inputList[:self.inputNum]
+        if self._truthTable is not None:
+            outputs = self._truthTable.get(tuple(inputList))
+            if outputs is not None: return list(outputs)
+        return list(map(bool, self._evalFun(bytes(map(bool, inputList)))))
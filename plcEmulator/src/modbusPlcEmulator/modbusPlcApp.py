@@ -53,7 +53,12 @@ gv.iPlcDataMgr.start()
 
 # Init the monitor client thread.
 gv.iMonitorClient = monitorClient.monitorClient( gv.gMonHubIp, gv.gMonHubPort, 
-                                                reportInterval=gv.gReportInv)
+                                                reportInterval=gv.gReportInv,
+                                                spillDir=gv.gSpillDir,
+                                                spillSize=gv.gSpillSize,
+                                                replayRate=gv.gReplayRate,
+                                                aggWindow=gv.gAggWindow,
+                                                alertThrottle=gv.gAlertThrottle)
 
 gv.iMonitorClient.setParentInfo(gv.gOwnID, gv.gOwnIP, PLC_TYPE, gv.gProType, 
                                 ladderID=gv.gLadderID)
@@ -126,7 +131,7 @@ def addAllowReadIp():
         ipstr = str(request.form['newIp'])
         rst = gv.iPlcDataMgr.addAllowReadIp(ipstr)
         if gv.iMonitorClient: 
-            gv.iMonitorClient.addReportDict(RPT_ALERT, "User try to add IP %s in the allow read IP list." %ipstr)
+            gv.iMonitorClient.addReportDict(RPT_ALERT, "User try to add IP %s in the allow read IP list.", ipstr)
         if rst:
             flash("New ip %s is added in the all read ip address list" %str(ipstr))
         else: 
@@ -156,7 +161,7 @@ def addAllowWriteIp():
         ipstr = str(request.form['newIp'])
         rst = gv.iPlcDataMgr.addAllowWriteIp(ipstr)
         if gv.iMonitorClient: 
-            gv.iMonitorClient.addReportDict(RPT_ALERT, "User try to add IP %s in the allow write IP list." %ipstr)
+            gv.iMonitorClient.addReportDict(RPT_ALERT, "User try to add IP %s in the allow write IP list.", ipstr)
         if rst:
             flash("New ip %s is added in the all write ip address list" %str(ipstr))
         else: 
@@ -86,7 +86,13 @@ ALLOW_W_L = json.loads(CONFIG_DICT['ALLOW_W_L'])
 # Modbus server config 
 gPlcHostIp = '0.0.0.0'
 gHostPort = 502
+# Modbus server engine: 'thread' (one thread per client) or 'asyncio' (one event loop)
+gServerEngine = CONFIG_DICT['SERVER_ENGINE'] if 'SERVER_ENGINE' in CONFIG_DICT.keys() else 'thread'
 gLadderID = CONFIG_DICT['LADDER_ID']
+# Modbus request capture (binary session file) config
+gCaptureFlg = CONFIG_DICT['CAPTURE_FLG'] if 'CAPTURE_FLG' in CONFIG_DICT.keys() else False
+gCaptureFile = os.path.join(dirpath, CONFIG_DICT['CAPTURE_FILE']) if 'CAPTURE_FILE' in CONFIG_DICT.keys() \
+    else os.path.join(dirpath, 'Captures', 'modbusSession.cap')
 
 # Own Information
 gOwnID = CONFIG_DICT['Own_ID']
@@ -97,6 +103,11 @@ gProType = CONFIG_DICT['PRO_TYPE']
 gMonHubIp = CONFIG_DICT['MON_IP']
 gMonHubPort = int(CONFIG_DICT['MON_PORT'])
 gReportInv = int(CONFIG_DICT['RPT_INTERVAL'])
+gSpillDir = os.path.join(dirpath, CONFIG_DICT['RPT_SPILL_DIR']) if 'RPT_SPILL_DIR' in CONFIG_DICT.keys() else None
+gSpillSize = int(CONFIG_DICT['RPT_SPILL_SIZE']) if 'RPT_SPILL_SIZE' in CONFIG_DICT.keys() else 16777216
+gReplayRate = int(CONFIG_DICT['RPT_REPLAY_RATE']) if 'RPT_REPLAY_RATE' in CONFIG_DICT.keys() else 200
+gAggWindow = float(CONFIG_DICT['RPT_AGG_WINDOW']) if 'RPT_AGG_WINDOW' in CONFIG_DICT.keys() else 10
+gAlertThrottle = float(CONFIG_DICT['RPT_ALERT_THROTTLE']) if 'RPT_ALERT_THROTTLE' in CONFIG_DICT.keys() else 1
 
 # PLC user credential:
 gUsersRcd = os.path.join(dirpath, CONFIG_DICT['USERS_RCD'])
@@ -14,6 +14,8 @@
 # License:     MIT License
 #-----------------------------------------------------------------------------
 
+import os
+
 import modbusPlcGlobal as gv
 import monitorClient
 from monitorClient import RPT_ALERT, PLC_TYPE
@@ -31,7 +33,12 @@ scan_tracker = defaultdict(list)
 alert_tracker = {}
 
 gv.iMonitorClient = monitorClient.monitorClient( gv.gMonHubIp, gv.gMonHubPort, 
-                                                reportInterval=gv.gReportInv)
+                                                reportInterval=gv.gReportInv,
+                                                spillDir=os.path.join(gv.gSpillDir, 'scan') if gv.gSpillDir else None,
+                                                spillSize=gv.gSpillSize,
+                                                replayRate=gv.gReplayRate,
+                                                aggWindow=gv.gAggWindow,
+                                                alertThrottle=gv.gAlertThrottle)
 
 gv.iMonitorClient.setParentInfo(gv.gOwnID, gv.gOwnIP, PLC_TYPE, gv.gProType, 
                                 ladderID=gv.gLadderID)
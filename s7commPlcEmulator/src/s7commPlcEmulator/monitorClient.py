@@ -3,7 +3,10 @@
 # Name:        monitorClient.py
 #
 # Purpose:     The client module used to report honeypot PLC emulator and controller
-#              state to the monitor hub. 
+#              state to the monitor hub. When the monitor hub is not reachable, the 
+#              reports can be spilled to the disk segment files and replayed after 
+#              the client reconnected. The repeated reports are aggregated by the 
+#              (type, message template) before sending.
 #  
 # Author:      Yuancheng Liu
 #
@@ -13,14 +16,31 @@
 # License:     MIT License
 #-----------------------------------------------------------------------------
 
+import os
+import re
 import time
 import copy
+import json
 import requests
 import threading
 from datetime import datetime
-from queue import Queue
+from collections import deque
 
-MAX_RTP_NUM = 10    # Max number of report can be stored in the queue.
+MAX_RTP_NUM = 1000  # Max number of report can be stored in the queue.
+BATCH_SIZE = 100    # Flush the queue when the number of queued reports reaches this size.
+MAX_BATCH_NUM = 500 # Max number of reports sent in one batch POST.
+POST_TIMEOUT = 5    # HTTP POST timeout in seconds.
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+SPILL_SEG_SIZE = 1 << 20    # Max bytes of one spill segment file.
+SPILL_MAX_SIZE = 16 << 20   # Max total bytes of the spill segment files.
+SPILL_REPLAY_RATE = 200     # Max number of spilled reports replayed per second.
+
+AGG_WINDOW = 10         # Window in seconds to aggregate the same normal/warning reports.
+ALERT_THROTTLE = 1      # Min interval in seconds to forward the same alert report.
+AGG_SAMPLE_NUM = 3      # Number of the parameters samples kept in one aggregated report.
+# The IP addresses and numbers in the message are treated as the template parameters.
+PARAM_PATTERN = re.compile(r'\d+(?:\.\d+){3}|\d+')
 
 # report type constants
 RPT_NORMAL = 'normal'
@@ -31,42 +51,369 @@ RPT_LOGIN = 'login'
 PLC_TYPE='plc'
 CTRL_TYPE='controller'
 
+#-----------------------------------------------------------------------------
+def formatMsg(reportMsg, args):
+    """ Format the report message template with the args in the sender thread, a 
+        template not matching its args falls back to the template + args string so 
+        the sender thread never stops.
+    """
+    if not args: return str(reportMsg)
+    try:
+        return reportMsg % args
+    except (TypeError, ValueError, KeyError):
+        return str(reportMsg) + ' ' + repr(args)
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class reportSpillQueue(object):
+    """ Disk backed FIFO queue to keep the reports when the monitor hub is not reachable.
+        The reports are appended as json lines to the segment files <spillDir>/seg_<idx>.log,
+        the replay read position is saved in <spillDir>/cursor, when the total size is over
+        the limit the oldest segment will be deleted.
+    """
+    def __init__(self, spillDir, maxSize=SPILL_MAX_SIZE, segSize=SPILL_SEG_SIZE):
+        """ Init example: spill = reportSpillQueue('Spill', maxSize=16777216)
+            Args:
+                spillDir (str): folder to save the segment files.
+                maxSize (int, optional): max total bytes of the segment files. Defaults 
+                    to SPILL_MAX_SIZE.
+                segSize (int, optional): max bytes of one segment file. Defaults to 
+                    SPILL_SEG_SIZE.
+        """
+        self.spillDir = spillDir
+        self.maxSize = maxSize
+        self.segSize = max(1024, min(segSize, maxSize//2))
+        self.dropCount = 0
+        self._lock = threading.Lock()
+        self.totalSize = 0
+        if not os.path.exists(spillDir): os.makedirs(spillDir)
+        self._cursorPath = os.path.join(spillDir, 'cursor')
+        self._readSeg, self._readPos = self._loadCursor()
+        self.segList = sorted(int(fileName[4:-4]) for fileName in os.listdir(spillDir)
+                              if fileName.startswith('seg_') and fileName.endswith('.log'))
+        # remove the segments already replayed before the last shut down.
+        for segIdx in [idx for idx in self.segList if idx < self._readSeg]: self._removeSeg(segIdx)
+        if self.segList and self.segList[0] > self._readSeg:
+            self._readSeg, self._readPos = self.segList[0], 0
+        self._nextSeg = self.segList[-1] + 1 if self.segList else self._readSeg
+        if not self.segList: self._readSeg, self._readPos = self._nextSeg, 0
+        self.totalSize = sum(os.path.getsize(self._segPath(idx)) for idx in self.segList)
+        self.pendingNum = sum(self._countLines(idx, self._readPos if idx == self._readSeg else 0)
+                              for idx in self.segList)
+        self._writeFh = None # always write to a new segment after restart.
+
+    #-----------------------------------------------------------------------------
+    def _segPath(self, segIdx):
+        return os.path.join(self.spillDir, 'seg_%010d.log' % segIdx)
+
+    def _countLines(self, segIdx, pos):
+        with open(self._segPath(segIdx), 'rb') as fh:
+            fh.seek(pos)
+            return fh.read().count(b'\n')
+
+    def _loadCursor(self):
+        try:
+            with open(self._cursorPath, 'r') as fh:
+                segIdx, pos = fh.read().split()
+            return int(segIdx), int(pos)
+        except (OSError, ValueError):
+            return 0, 0
+
+    def _saveCursor(self):
+        tmpPath = self._cursorPath + '.tmp'
+        with open(tmpPath, 'w') as fh:
+            fh.write('%d %d' % (self._readSeg, self._readPos))
+        os.replace(tmpPath, self._cursorPath)
+
+    def _syncWriter(self):
+        if self._writeFh:
+            self._writeFh.flush()
+            os.fsync(self._writeFh.fileno())
+
+    def _openSeg(self):
+        if self._writeFh:
+            self._syncWriter()
+            self._writeFh.close()
+        self._writeFh = open(self._segPath(self._nextSeg), 'ab')
+        self.segList.append(self._nextSeg)
+        self._nextSeg += 1
+
+    def _removeSeg(self, segIdx):
+        segPath = self._segPath(segIdx)
+        self.totalSize -= os.path.getsize(segPath)
+        os.remove(segPath)
+        self.segList.remove(segIdx)
+
+    def _dropOldest(self):
+        """ Delete the oldest segment file, return the number of not replayed reports in it."""
+        segIdx = self.segList[0]
+        dropNum = self._countLines(segIdx, self._readPos if segIdx == self._readSeg else 0) \
+            if segIdx >= self._readSeg else 0
+        self._removeSeg(segIdx)
+        if segIdx >= self._readSeg: self._readSeg, self._readPos = self.segList[0], 0
+        self.pendingNum -= dropNum
+        return dropNum
+
+    #-----------------------------------------------------------------------------
+    def put(self, reportList):
+        """ Append the (action, data) reports to the segment files, fsync once for the 
+            whole list.
+            Returns:
+                int: number of the oldest reports dropped as the spill size is over limit.
+        """
+        if not reportList: return 0
+        dropNum = 0
+        with self._lock:
+            for report in reportList:
+                line = (json.dumps(report) + '\n').encode('utf-8')
+                if self._writeFh is None or self._writeFh.tell() + len(line) > self.segSize:
+                    self._openSeg()
+                self._writeFh.write(line)
+                self.totalSize += len(line)
+                self.pendingNum += 1
+            self._syncWriter()
+            while self.totalSize > self.maxSize and len(self.segList) > 1:
+                dropNum += self._dropOldest()
+            if dropNum:
+                self._saveCursor()
+                self.dropCount += dropNum
+        return dropNum
+
+    def peek(self, maxNum):
+        """ Read up to maxNum reports from the read position without removing them.
+            Returns:
+                (list, tuple): the (action, data) reports list and the cursor, pass the 
+                    cursor to commit() after the reports are accepted by the hub.
+        """
+        reportList, lineNum = [], 0
+        with self._lock:
+            if self._writeFh: self._writeFh.flush()
+            segIdx, pos = self._readSeg, self._readPos
+            for idx in self.segList:
+                if idx < segIdx: continue
+                if idx > segIdx: segIdx, pos = idx, 0
+                with open(self._segPath(idx), 'rb') as fh:
+                    fh.seek(pos)
+                    for line in fh:
+                        if not line.endswith(b'\n'): break # partial line of a crashed write.
+                        pos += len(line)
+                        lineNum += 1
+                        try:
+                            reportList.append(tuple(json.loads(line)))
+                        except ValueError:
+                            continue
+                        if lineNum >= maxNum: return reportList, (segIdx, pos, lineNum)
+        return reportList, (segIdx, pos, lineNum)
+
+    def commit(self, cursor):
+        """ Move the read position to the cursor returned by peek() and delete the 
+            segment files which are fully replayed.
+        """
+        segIdx, pos, lineNum = cursor
+        with self._lock:
+            if (segIdx, pos) <= (self._readSeg, self._readPos): return # segment dropped.
+            for idx in [idx for idx in self.segList if idx < segIdx]: self._removeSeg(idx)
+            self._readSeg, self._readPos = segIdx, pos
+            self.pendingNum = max(0, self.pendingNum - lineNum)
+            if self.pendingNum == 0:
+                # all replayed, clean up the segment files.
+                if self._writeFh: self._writeFh.close()
+                self._writeFh = None
+                for idx in list(self.segList): self._removeSeg(idx)
+                self._readSeg, self._readPos = self._nextSeg, 0
+            self._saveCursor()
+
+    def close(self):
+        with self._lock:
+            self._syncWriter()
+            if self._writeFh: self._writeFh.close()
+            self._writeFh = None
+            self._saveCursor()
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class reportAggregator(object):
+    """ Aggregate the reports with the same (type, message template) into one report 
+        with the count, first/last time and the parameters samples. The normal and warning
+        reports are aggregated in a window, the first alert is forwarded immediately and 
+        the same alerts after it are aggregated until the throttle interval passed.
+        Aggregated report data example:
+            {'type': 'alert', 'time': <last time>, 'message': <last message>, 'count': 25, 
+             'firstTime': <str>, 'lastTime': <str>, 'template': 'Scan from <*>', 
+             'samples': [['10.0.0.5'], ...]}
+    """
+    def __init__(self, window=AGG_WINDOW, alertThrottle=ALERT_THROTTLE, sampleNum=AGG_SAMPLE_NUM):
+        """ Init example: aggregator = reportAggregator(window=10, alertThrottle=1)
+            Args:
+                window (int, optional): normal/warning report aggregation window in seconds.
+                    Defaults to AGG_WINDOW.
+                alertThrottle (int, optional): min interval to forward the same alert in 
+                    seconds. Defaults to ALERT_THROTTLE.
+                sampleNum (int, optional): number of parameters samples kept. Defaults to 
+                    AGG_SAMPLE_NUM.
+        """
+        self.window = window
+        self.alertThrottle = alertThrottle
+        self.sampleNum = sampleNum
+        self.inCount = 0
+        self.outCount = 0
+        self._aggDict = {}      # (type, template) -> aggregation record.
+        self._alertDict = {}    # (type, template) -> alert throttle record.
+
+    #-----------------------------------------------------------------------------
+    def _parseMsg(self, reportMsg, args):
+        """ Return the (template, parameters, message) of the report message."""
+        if args: return str(reportMsg), [str(arg) for arg in args], formatMsg(reportMsg, args)
+        reportMsg = str(reportMsg)
+        return PARAM_PATTERN.sub('<*>', reportMsg), PARAM_PATTERN.findall(reportMsg), reportMsg
+
+    def _newRecord(self, timestamp):
+        return {'count': 0, 'first': timestamp, 'last': timestamp, 'samples': [], 'message': ''}
+
+    def _addToRecord(self, record, timestamp, params, message):
+        record['count'] += 1
+        record['last'] = timestamp
+        record['message'] = message
+        if params and len(record['samples']) < self.sampleNum: record['samples'].append(params)
+
+    def _buildReport(self, key, record):
+        actionType, template = key
+        self.outCount += 1
+        data = {
+            'type': actionType,
+            'time': datetime.fromtimestamp(record['last']).strftime(TIME_FMT),
+            'message': actionType+' : '+record['message']
+        }
+        if record['count'] > 1:
+            data['message'] += ' (repeated %d times)' % record['count']
+            data.update({'count': record['count'],
+                         'firstTime': datetime.fromtimestamp(record['first']).strftime(TIME_FMT),
+                         'lastTime': data['time'],
+                         'template': template,
+                         'samples': record['samples']})
+        return (actionType, data)
+
+    #-----------------------------------------------------------------------------
+    def add(self, actionType, reportMsg, timestamp, args=None):
+        """ Add one raw report, return the list of (action, data) reports need to be sent 
+            immediately (the first alert in the throttle interval).
+        """
+        self.inCount += 1
+        template, params, message = self._parseMsg(reportMsg, args)
+        key = (actionType, template)
+        if actionType == RPT_ALERT:
+            record = self._alertDict.get(key)
+            if record is None or (record['count'] == 0 and timestamp - record['sent'] >= self.alertThrottle):
+                record = self._newRecord(timestamp)
+                self._addToRecord(record, timestamp, params, message)
+                self._alertDict[key] = {'count': 0, 'sent': timestamp}
+                return [self._buildReport(key, record)]
+            if record['count'] == 0: record.update(self._newRecord(timestamp))
+            self._addToRecord(record, timestamp, params, message)
+            return []
+        record = self._aggDict.get(key)
+        if record is None: record = self._aggDict[key] = self._newRecord(timestamp)
+        self._addToRecord(record, timestamp, params, message)
+        return []
+
+    def flush(self, now=None, force=False):
+        """ Return the list of the aggregated (action, data) reports whose window or 
+            throttle interval passed (or all of them if force is True).
+        """
+        now = time.time() if now is None else now
+        reportList = []
+        for key, record in list(self._aggDict.items()):
+            if force or now - record['first'] >= self.window:
+                reportList.append(self._buildReport(key, record))
+                del self._aggDict[key]
+        for key, record in list(self._alertDict.items()):
+            if not (force or now - record['sent'] >= self.alertThrottle): continue
+            if record['count']:
+                reportList.append(self._buildReport(key, record))
+                self._alertDict[key] = {'count': 0, 'sent': now}
+            else:
+                del self._alertDict[key]
+        reportList.sort(key=lambda report: report[1]['time'])
+        return reportList
+
+    def getStats(self):
+        return {'in': self.inCount, 'out': self.outCount}
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class monitorClient(threading.Thread):
 
-    def __init__(self, monIP, monPort, reportInterval=5):
+    def __init__(self, monIP, monPort, reportInterval=5, batchSize=BATCH_SIZE, 
+                 spillDir=None, spillSize=SPILL_MAX_SIZE, replayRate=SPILL_REPLAY_RATE,
+                 aggWindow=AGG_WINDOW, alertThrottle=ALERT_THROTTLE):
         """ Init the monitor client.
             Args:
                 monIP (str): monitor hub IP address.
                 monPort (int): monitor hub port.
-                reportInterval (int, optional): report interval in seconds. Defaults to 5 sec.
+                reportInterval (int, optional): report interval in seconds, all the queued 
+                    reports are sent as one batch every interval. Defaults to 5 sec.
+                batchSize (int, optional): send the batch before the interval if the 
+                    queued reports reaches this number. Defaults to BATCH_SIZE.
+                spillDir (str, optional): folder to spill the reports when the hub is not 
+                    reachable, None: not spill the reports. Defaults to None.
+                spillSize (int, optional): max bytes of the spill files. Defaults to SPILL_MAX_SIZE.
+                replayRate (int, optional): max number of the spilled reports replayed per
+                    second after reconnected. Defaults to SPILL_REPLAY_RATE.
+                aggWindow (int, optional): window in seconds to aggregate the repeated 
+                    reports, 0: not aggregate. Defaults to AGG_WINDOW.
+                alertThrottle (int, optional): min interval in seconds to forward the same 
+                    alert. Defaults to ALERT_THROTTLE.
         """
         threading.Thread.__init__(self)
         self.monIP = monIP
         self.monPort = monPort
         self.reportInterval = reportInterval
-        self.reportLock = threading.Lock()
         self._postUrl = "http://%s:%s/dataPost" % (self.monIP, str(self.monPort))
+        self._batchUrl = "http://%s:%s/dataPostBatch" % (self.monIP, str(self.monPort))
+        self.batchSize = batchSize
+        self._flushEvt = threading.Event()
+        self.dropCount = 0  # reports dropped as the spill is full or the batch POST failed.
+        self.overflowCount = 0  # reports dropped as the queue is full (updated by the reporters).
+        self.sentCount = 0
+        self._retryT = 0        # the hub asked to retry after this time (HTTP 429).
+        self._retryList = []    # the batch rejected by the busy hub, resend it first.
         self.parentInfoDict = None
         self.monConnected = False
         self.terminate = False 
-        self.reportQueue = Queue(maxsize=MAX_RTP_NUM)
+        # deque.append()/popleft() are atomic, the reporter threads never wait for the 
+        # sender thread, the oldest report is dropped by the deque when it is full.
+        self.reportQueue = deque(maxlen=MAX_RTP_NUM)
+        self.spillQueue = reportSpillQueue(spillDir, maxSize=spillSize) if spillDir else None
+        self.replayRate = max(1, replayRate)
+        self.aggregator = reportAggregator(window=aggWindow, alertThrottle=alertThrottle) if aggWindow else None
         
     #-----------------------------------------------------------------------------
-    def addReportDict(self, actionType, reportMsg):
-        """ Add the report message to the queue.
+    def addReportDict(self, actionType, reportMsg, *args):
+        """ Add the report message to the queue, this function is called in the PLC 
+            request handler / callback threads so it takes no lock on the hot path except
+            the flush event and only keeps the raw time stamp, the report dict is built 
+            by the sender thread. The full check and the append are not atomic, so the 
+            overflowCount (reports dropped by the full queue) is approximate.
+            Example: addReportDict(RPT_ALERT, "Scan detected from %s", srcIP)
             Args:
                 actionType(str): one of the report type constants
-                msgDict (dict): report message dict.
+                reportMsg (str): report message or the message template if args is given.
+                args: the message template parameters (formatted by the sender thread).
         """
-        if self.reportQueue.full(): self.reportQueue.get()
-        data = {
+        queue = self.reportQueue
+        if len(queue) == MAX_RTP_NUM: self.overflowCount += 1
+        queue.append((actionType, reportMsg, time.time(), args))
+        if (actionType == RPT_ALERT or len(queue) >= self.batchSize) and not self._flushEvt.is_set():
+            self._flushEvt.set()
+
+    def _buildReport(self, rawReport):
+        """ Convert the raw (actionType, reportMsg, timestamp, args) to the (action, data) report."""
+        actionType, reportMsg, timestamp, args = rawReport
+        return (actionType, {
             'type': actionType,
-            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'message': actionType+' : '+reportMsg
-        }
-        self.reportQueue.put((actionType, data))
+            'time': datetime.fromtimestamp(timestamp).strftime(TIME_FMT),
+            'message': actionType+' : '+formatMsg(reportMsg, args)
+        })
 
     #-----------------------------------------------------------------------------
     def setParentInfo(self, parID, parIP, parType, parPro, tgtID=None, tgtIP=None, ladderID=None):
@@ -105,14 +452,104 @@ class monitorClient(threading.Thread):
         dataDict = {
             'ID': self.parentInfoDict['ID'],
             'Action': action,
-            'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'Timestamp': datetime.now().strftime(TIME_FMT),
             'Data': data
         }
         self._postData(self._postUrl, dataDict)
 
+    #-----------------------------------------------------------------------------
+    def reportBatch2Monitor(self, reportList):
+        """ Report a list of (action, data) reports to the monitor hub with one POST.
+            Returns:
+                bool: True if the hub accepted the batch.
+        """
+        dataDict = {
+            'ID': self.parentInfoDict['ID'],
+            'Action': 'batch',
+            'Timestamp': datetime.now().strftime(TIME_FMT),
+            'Dropped': self.dropCount + self.overflowCount,
+            'Data': [{'Action': action, 'Data': data} for action, data in reportList]
+        }
+        return self._postData(self._batchUrl, dataDict) is not None
+
+    def _popReports(self, maxNum):
+        """ Pop up to maxNum raw reports from the queue, return the reports need to be 
+            sent now (after aggregation if the aggregator is enabled).
+        """
+        rawList = []
+        try:
+            while len(rawList) < maxNum:
+                rawList.append(self.reportQueue.popleft())
+        except IndexError:
+            pass
+        if self.aggregator is None: return [self._buildReport(raw) for raw in rawList]
+        reportList = []
+        for raw in rawList:
+            reportList.extend(self.aggregator.add(*raw))
+        if len(rawList) < maxNum: reportList.extend(self.aggregator.flush())
+        return reportList
+
+    def _spillReports(self, reportList):
+        if self.spillQueue:
+            self.dropCount += self.spillQueue.put(reportList)
+        else:
+            self.dropCount += len(reportList)
+
+    def flushReports(self):
+        """ Drain the report queue and send all the reports in batches, return the 
+            number of reports sent. If the spill queue is enabled, the reports are spilled
+            to disk when the hub is not reachable or there are spilled reports not replayed
+            (to keep the reports order).
+        """
+        sentNum = 0
+        while not self.terminate and time.time() >= self._retryT:
+            reportList, self._retryList = self._retryList or self._popReports(MAX_BATCH_NUM), []
+            if not reportList:
+                if self.reportQueue: continue   # all aggregated, pop the next reports.
+                break
+            if self.spillQueue and (self.spillQueue.pendingNum or not self.monConnected):
+                self._spillReports(reportList)
+                continue
+            if not self.reportBatch2Monitor(reportList):
+                if time.time() < self._retryT:
+                    self._retryList = reportList  # hub busy, resend after the retry time.
+                else:
+                    self._spillReports(reportList)
+                break
+            sentNum += len(reportList)
+        self.sentCount += sentNum
+        return sentNum
+
+    def replaySpill(self):
+        """ Replay the spilled reports to the hub in the original order under the replay 
+            rate. Stop and keep the rest reports on disk when the hub does not accept a batch,
+            the slow hub reply also slows down the replay. Return the number of reports replayed.
+        """
+        replayNum = 0
+        batchNum = min(MAX_BATCH_NUM, self.replayRate)
+        while not self.terminate and self.spillQueue.pendingNum and time.time() >= self._retryT:
+            self.flushReports() # move the new reports behind the spilled reports.
+            reportList, cursor = self.spillQueue.peek(batchNum)
+            if not reportList and not cursor[2]: break
+            startT = time.time()
+            if reportList and not self.reportBatch2Monitor(reportList): break
+            self.spillQueue.commit(cursor)
+            replayNum += len(reportList)
+            time.sleep(max(0, len(reportList)/self.replayRate - (time.time() - startT)))
+        self.sentCount += replayNum
+        return replayNum
+
+    def getReportStats(self):
+        statsDict = {'queued': len(self.reportQueue), 'sent': self.sentCount, 
+                     'dropped': self.dropCount + self.overflowCount,
+                     'spilled': self.spillQueue.pendingNum if self.spillQueue else 0}
+        if self.aggregator: statsDict['aggregated'] = self.aggregator.getStats()
+        return statsDict
+
     #-----------------------------------------------------------------------------
     def _postData(self, postUrl, jsonDict, postfile=False):
-        """ Send HTTP POST request to send data.
+        """ Send HTTP POST request to send data, only called by the sender thread so no 
+            lock is held during the HTTP request.
             Args:
                 postUrl (str): url string.
                 jsonDict (dict): json data send via POST.
@@ -121,18 +558,25 @@ class monitorClient(threading.Thread):
             Returns:
                 _type_: Server repsonse or None if post failed / lose connection.
         """
-        self.reportLock.acquire()
         try:
-            res = requests.post(postUrl, files=jsonDict, verify=False) if postfile else requests.post(postUrl, json=jsonDict, verify=False)
+            res = requests.post(postUrl, files=jsonDict, verify=False, timeout=POST_TIMEOUT) if postfile \
+                else requests.post(postUrl, json=jsonDict, verify=False, timeout=POST_TIMEOUT)
             if res.ok:
                 print("http server reply: %s" % str(res.json()))
-                self.reportLock.release()
                 self.monConnected = True
                 return res.json()
+            if res.status_code == 429:
+                # back pressure from the hub ingestion queue.
+                try:
+                    retryAfter = float(res.headers.get('Retry-After', self.reportInterval))
+                except ValueError:
+                    # the Retry-After can also be a HTTP-date, use the report interval.
+                    retryAfter = self.reportInterval
+                self._retryT = time.time() + retryAfter
+                print("Warning: _postData() > hub busy, retry after %s sec" % str(retryAfter))
         except Exception as err:
             print("Error: _postData() > http server not reachable or POST error: %s" % str(err))
             self.monConnected = False
-        if self.reportLock.locked(): self.reportLock.release()
         return None
 
     #-----------------------------------------------------------------------------
@@ -140,11 +584,19 @@ class monitorClient(threading.Thread):
         """ Main state report and task fetch loop called by start(). """
         print("Start the monitor report client main loop.")
         while not self.terminate:
+            if not self.monConnected: self.logintoMonitor()
             if self.monConnected:
-                if not self.reportQueue.empty():
-                    actionType, data = self.reportQueue.get()
-                    self.report2Monitor(actionType, data)
-            else:
-                self.logintoMonitor()
-            time.sleep(self.reportInterval)
+                if self.spillQueue and self.spillQueue.pendingNum: self.replaySpill()
+                self.flushReports()
+            elif self.spillQueue:
+                self.flushReports() # spill the reports to disk while the hub is down.
+            # wake up when the interval passed or the queued reports reach the batch size.
+            self._flushEvt.wait(self.reportInterval)
+            self._flushEvt.clear()
+        # send or spill the reports still in the queue and aggregation window before exit.
+        reportList = self._popReports(MAX_RTP_NUM)
+        if self.aggregator: reportList += self.aggregator.flush(force=True)
+        if reportList and not (self.monConnected and self.reportBatch2Monitor(reportList)):
+            self._spillReports(reportList)
+        if self.spillQueue: self.spillQueue.close()
         print("Monitor report client main loop end.")
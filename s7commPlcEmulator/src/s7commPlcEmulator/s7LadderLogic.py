@@ -19,6 +19,7 @@
 # Change below line to use the controller's global if you copy in the controller side
 import s7commPlcGlobal as gv 
 import snap7Comm
+from ladderRungs import RUNG_AND, RUNG_OR, RUNG_NOT
 
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
@@ -38,88 +39,52 @@ class ladderLogic(snap7Comm.rtuLadderLogic):
         self.srcAddrValInfo = {'addressIdx': (1, 2), 'dataIdx': (0, 2, 4, 6)}
         # init the output data saving memory address and data index
         self.destAddrValInfo = {'addressIdx': (3, 4), 'dataIdx': (0, 2, 4, 6)}
+        # Init the ladder rungs, the input index ms0~ms7 is the source memory value 
+        # index (address 1 data 0,2,4,6 then address 2 data 0,2,4,6) and the output 
+        # index is the destination memory value index ds0~ds7.
+        self.rungList = [
+            (0, (RUNG_AND, 0, 7)),              # rung 0: ms0 and ms7 -> ds0
+            (1, (RUNG_NOT, 1)),                 # rung 1: not ms1 -> ds1
+            (2, (RUNG_AND, 2, 3, 4)),           # rung 2: ms2 and ms3 and ms4 -> ds2
+            (3, (RUNG_OR, (RUNG_NOT, 0), 6)),   # rung 3: not ms0 or ms6 -> ds3
+            (4, (RUNG_NOT, (RUNG_OR, 4, 5))),   # rung 4: not(ms4 or ms5) -> ds4
+            (5, (RUNG_AND, (RUNG_NOT, 0), 6)),  # rung 5: not ms0 and ms6 -> ds5
+            (6, (RUNG_OR, 3, (RUNG_NOT, 7))),   # rung 6: ms3 or not ms7 -> ds6
+            (7, 5),                             # rung 7: ms5 -> ds7
+        ]
 
     #-----------------------------------------------------------------------------
     def runLadderLogic(self, inputData=None):
         """ Execute the ladder logic with the input memory address data list and set 
             the output address data list. In this example, there will be 8 rungs to 
             be executed.
+            Args:
+                inputData (tuple/list): one write request (address, dataIdx, datalen) or
+                    the list of write requests merged in one burst, the ladder runs once
+                    if any of the requests changed the source memory.
         """
-        print(" - runLadderLogic")
-        addr, dataIdx, datalen = inputData
-        print("Received data write request: ")
-        print("Address: %s " %str(addr))
-        print("dataIdx: %s " %str(dataIdx))
-        print("datalen: %s" %str(datalen))
+        writeList = inputData if isinstance(inputData, list) else [inputData]
+        print(" - runLadderLogic, received data write request [(address, dataIdx, datalen)]: %s" %str(writeList))
         srcMIdx = self.srcAddrValInfo['addressIdx'] # source memory index
         srcDIdx = self.srcAddrValInfo['dataIdx'] # source data index
-
-        if addr in srcMIdx and dataIdx in srcDIdx:
-            # Get all current memory source value 
-            ms0 = self.parent.getMemoryVal(srcMIdx[0], srcDIdx[0])
-            ms1 = self.parent.getMemoryVal(srcMIdx[0], srcDIdx[1])
-            ms2 = self.parent.getMemoryVal(srcMIdx[0], srcDIdx[2])
-            ms3 = self.parent.getMemoryVal(srcMIdx[0], srcDIdx[3])
-            ms4 = self.parent.getMemoryVal(srcMIdx[1], srcDIdx[0])
-            ms5 = self.parent.getMemoryVal(srcMIdx[1], srcDIdx[1])
-            ms6 = self.parent.getMemoryVal(srcMIdx[1], srcDIdx[2])
-            ms7 = self.parent.getMemoryVal(srcMIdx[1], srcDIdx[3])
-            
-            # Run the rung and set all the memory destination value
-            # rung 0: ms0 and ms1 -> ds0
-            c0 = ms0 and ms7
-            self.parent.setMemoryVal(self.destAddrValInfo['addressIdx'][0], 
-                                    self.destAddrValInfo['dataIdx'][0], c0)
-            # rung 1: not ms1 -> ds1
-            c1 = not ms1
-            self.parent.setMemoryVal(self.destAddrValInfo['addressIdx'][0],
-                                    self.destAddrValInfo['dataIdx'][1], c1)
-            # rung 2: ms2 and ms3 and ms4 -> ds2
-            c2 = ms2 and ms3 and ms4
-            self.parent.setMemoryVal(self.destAddrValInfo['addressIdx'][0],
-                                    self.destAddrValInfo['dataIdx'][2], c2)
-            # rung 3: ms0 or ms6-> ds3
-            c3 = (not ms0) or ms6
-            self.parent.setMemoryVal(self.destAddrValInfo['addressIdx'][0],
-                                    self.destAddrValInfo['dataIdx'][3], c3)
-            # rung 4: not(ms4 or ms5) -> ds4
-            c4 = not(ms4 or ms5)
-            self.parent.setMemoryVal(self.destAddrValInfo['addressIdx'][1],
-                                    self.destAddrValInfo['dataIdx'][0], c4)
-            # rung 5: not ms0 and ms6 -> ds5
-            c5 = (not ms0) and ms6
-            self.parent.setMemoryVal(self.destAddrValInfo['addressIdx'][1],
-                                     self.destAddrValInfo['dataIdx'][1], c5)
-            # rung 6: ms3 or not ms7 -> ds6
-            c6 = ms3 or not ms7
-            self.parent.setMemoryVal(self.destAddrValInfo['addressIdx'][1],
-                                     self.destAddrValInfo['dataIdx'][2], c6)
-            # rung 7: ms5 -> ds7
-            c7 =  ms5
-            self.parent.setMemoryVal(self.destAddrValInfo['addressIdx'][1],
-                                     self.destAddrValInfo['dataIdx'][3], c7)
+        if any(addr in srcMIdx and dataIdx in srcDIdx for addr, dataIdx, _ in writeList):
+            # Get all current memory source value with one bulk read per memory
+            srcValList = []
+            for mIdx in srcMIdx:
+                memValDict = self.parent.getAll(mIdx)
+                srcValList.extend(memValDict[dIdx] for dIdx in srcDIdx)
+            # Run all the compiled rungs and set all the memory destination value
+            destValList = self.runRungs(srcValList)
+            if destValList is None: return
+            destDIdx = self.destAddrValInfo['dataIdx']
+            for i, mIdx in enumerate(self.destAddrValInfo['addressIdx']):
+                memVals = destValList[i*len(destDIdx):(i+1)*len(destDIdx)]
+                self.parent.setMany(mIdx, dict(zip(destDIdx, memVals)))
 
     #-----------------------------------------------------------------------------
     def runVerifyLadderLogic(self, regsList):
         """ Execute the ladder logic with the input holding register list and set 
             the output coils. In this example, there will be 8 rungs to be executed.
         """
-        # coils will be set ast the reverse state of the input registers' state. 
         if len(regsList) != 8: return None
-        # rung 0: HR0 and HR7 -> Q0
-        c0 = regsList[0] and regsList[7]
-        # rung 1: not HR1 -> Q1
-        c1 = not regsList[1]
-        # rung 2: HR2 and HR3 and HR4 -> Q2
-        c2 = regsList[2] and regsList[3] and regsList[4]
-        # rung 3: not HR0 or HR6 -> Q3
-        c3 = (not regsList[0]) or regsList[6]
-        # rung 4: not (HR4 or HR5) -> Q4
-        c4 = not (regsList[4] or regsList[5])
-        # rung 5: (not HR0) and HR6 -> Q5
-        c5 = (not regsList[0]) and regsList[6]
-        # rung 6: HR3 or (not HR7) -> Q6
-        c6 = regsList[3] or (not regsList[7])
-        # rung 7: HR5 -> Q7
-        c7 = regsList[5]
-        return [c0, c1, c2, c3, c4, c5, c6, c7]
+        return self.runRungs(regsList)
@@ -52,7 +52,12 @@ gv.iPlcDataMgr = s7commPlcDataMgr.DataManager(None)
 gv.iPlcDataMgr.start()
 
 gv.iMonitorClient = monitorClient.monitorClient( gv.gMonHubIp, gv.gMonHubPort, 
-                                                reportInterval=gv.gReportInv)
+                                                reportInterval=gv.gReportInv,
+                                                spillDir=gv.gSpillDir,
+                                                spillSize=gv.gSpillSize,
+                                                replayRate=gv.gReplayRate,
+                                                aggWindow=gv.gAggWindow,
+                                                alertThrottle=gv.gAlertThrottle)
 
 gv.iMonitorClient.setParentInfo(gv.gOwnID, gv.gOwnIP, PLC_TYPE, gv.gProType, 
                                 ladderID=gv.gLadderID)
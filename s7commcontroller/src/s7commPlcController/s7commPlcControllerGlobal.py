@@ -89,12 +89,19 @@ gLadderID = CONFIG_DICT['LADDER_ID']
 gMonHubIp = CONFIG_DICT['MON_IP']
 gMonHubPort = int(CONFIG_DICT['MON_PORT'])
 gReportInv = int(CONFIG_DICT['RPT_INTERVAL'])
+gSpillDir = os.path.join(dirpath, CONFIG_DICT['RPT_SPILL_DIR']) if 'RPT_SPILL_DIR' in CONFIG_DICT.keys() else None
+gSpillSize = int(CONFIG_DICT['RPT_SPILL_SIZE']) if 'RPT_SPILL_SIZE' in CONFIG_DICT.keys() else 16777216
+gReplayRate = int(CONFIG_DICT['RPT_REPLAY_RATE']) if 'RPT_REPLAY_RATE' in CONFIG_DICT.keys() else 200
+gAggWindow = float(CONFIG_DICT['RPT_AGG_WINDOW']) if 'RPT_AGG_WINDOW' in CONFIG_DICT.keys() else 10
+gAlertThrottle = float(CONFIG_DICT['RPT_ALERT_THROTTLE']) if 'RPT_ALERT_THROTTLE' in CONFIG_DICT.keys() else 1
 
 # plc connection
 gPlcID = CONFIG_DICT['PLC_ID']
 gPlcIP = CONFIG_DICT['PLC_IP']
 gPlcPort = int(CONFIG_DICT['PLC_PORT'])
 gPlcConnInt = int(CONFIG_DICT['PLC_CINT'])
+# Time to wait the PLC ladder logic execution after setting the inputs (sec).
+gPlcSettleInt = float(CONFIG_DICT['PLC_SETTLE_INT']) if 'PLC_SETTLE_INT' in CONFIG_DICT.keys() else 0.05
 
 #-----------------------------------------------------------------------------
 # Init the global instances
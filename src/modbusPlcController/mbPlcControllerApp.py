@@ -42,7 +42,12 @@ class plcControllerApp(object):
     def __init__(self) -> None:
         # init the monitor reporter thread
         gv.iMonitorClient = monitorClient.monitorClient(gv.gMonHubIp, gv.gMonHubPort,
-                                                        reportInterval=gv.gReportInv)
+                                                        reportInterval=gv.gReportInv,
+                                                        spillDir=gv.gSpillDir,
+                                                        spillSize=gv.gSpillSize,
+                                                        replayRate=gv.gReplayRate,
+                                                        aggWindow=gv.gAggWindow,
+                                                        alertThrottle=gv.gAlertThrottle)
         gv.iMonitorClient.setParentInfo(gv.gOwnID, gv.gOwnIP, monitorClient.CTRL_TYPE, gv.gProType,
                                         tgtID=gv.gPlcID, tgtIP=gv.gPlcIP, ladderID=gv.gLadderID)
         # Init the PLC Modbus-TCP client
@@ -79,10 +84,9 @@ class plcControllerApp(object):
             result = self.ladderLogic.runLadderLogic(regVals)
             resultExp = [i == 1 for i in result]
             gv.gDebugPrint("Expected output: %s" %str(resultExp), logType=gv.LOG_INFO)
-            for i in range(8):
-                self.modbusClient.setHoldingRegs(i, regVals[i])
-                time.sleep(0.1)
-            time.sleep(1)
+            # set all the holding registers in one request (the PLC runs the ladder logic 
+            # before response), then read back the coils.
+            self.modbusClient.setMultiHoldingRegs(0, regVals)
             resultGet = self.modbusClient.getCoilsBits(0, 8)
             gv.gDebugPrint("Get PLC result: %s" %str(resultGet), logType=gv.LOG_INFO)
             # set connection state
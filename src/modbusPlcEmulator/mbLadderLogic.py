@@ -19,6 +19,7 @@
 # Change below line to use the controller's global if you copy in the controller side
 import modbusPlcGlobal as gv 
 import modbusTcpCom
+from ladderRungs import RUNG_AND, RUNG_OR, RUNG_NOT
 
 #-----------------------------------------------------------------------------
 class ladderLogic(modbusTcpCom.ladderLogic):
@@ -44,28 +45,16 @@ class ladderLogic(modbusTcpCom.ladderLogic):
         self.destCoilsInfo['address'] = 0
         # Init the number of output coils used.
         self.destCoilsInfo['offset'] = 8
-    
-    #-----------------------------------------------------------------------------
-    def runLadderLogic(self, regsList, coilList=None):
-        """ Execute the ladder logic with the input holding register list and set 
-            the output coils. In this example, there will be 8 rungs to be executed.
-        """
-        # coils will be set ast the reverse state of the input registers' state. 
-        if len(regsList) != 8: return None
-        # rung 0: HR0 and HR2 -> Q0
-        c0 = regsList[0] and regsList[7]
-        # rung 1: not HR1 -> Q1
-        c1 = not regsList[1]
-        # rung 2: HR2 and HR3 and HR4 -> Q2
-        c2 = regsList[2] and regsList[3] and regsList[4]
-        # rung 3: not HR0 or HR6 -> Q3
-        c3 = (not regsList[0]) or regsList[6]
-        # rung 4: not (HR4 or HR5) -> Q4
-        c4 = not (regsList[4] or regsList[5])
-        # rung 5: (not HR0) and HR6 -> Q5
-        c5 = (not regsList[0]) and regsList[6]
-        # rung 6: HR3 or (not HR7) -> Q6
-        c6 = regsList[3] or (not regsList[7])
-        # rung 7: HR5 -> Q7
-        c7 = regsList[5]
-        return [c0, c1, c2, c3, c4, c5, c6, c7]
\ No newline at end of file
+        # Init the ladder rungs, the input index is the holding register index. In 
+        # this example, there will be 8 rungs to be executed, the rungs will be compiled 
+        # to the bitwise evaluator used by the parent runLadderLogic().
+        self.rungList = [
+            (0, (RUNG_AND, 0, 7)),              # rung 0: HR0 and HR7 -> Q0
+            (1, (RUNG_NOT, 1)),                 # rung 1: not HR1 -> Q1
+            (2, (RUNG_AND, 2, 3, 4)),           # rung 2: HR2 and HR3 and HR4 -> Q2
+            (3, (RUNG_OR, (RUNG_NOT, 0), 6)),   # rung 3: not HR0 or HR6 -> Q3
+            (4, (RUNG_NOT, (RUNG_OR, 4, 5))),   # rung 4: not (HR4 or HR5) -> Q4
+            (5, (RUNG_AND, (RUNG_NOT, 0), 6)),  # rung 5: (not HR0) and HR6 -> Q5
+            (6, (RUNG_OR, 3, (RUNG_NOT, 7))),   # rung 6: HR3 or (not HR7) -> Q6
+            (7, 5),                             # rung 7: HR5 -> Q7
+        ]
@@ -0,0 +1,379 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        modbusPlcBenchmark.py
+#
+# Purpose:     This module is a load testing and benchmark tool for the Modbus-TCP
+#              PLC emulator. It starts the emulator's modbusTcpServer + plcDataHandler
+#              (same setup as the modbusPlcDataMgr.DataManager) on loopback in a sub
+#              process, then simulates a mass scanner connection sweep and many
+#              concurrent clients sending mixed read/write requests to measure the
+#              connections/sec, req/sec, request latency (p50/p95/p99), the server CPU
+#              time per request and the server time of each request handling phase:
+#              - access: allow read/write IP list check.
+#              - dataBank: DataBank read/write of the client request.
+#              - ladder: ladder logic auto update (without the coils write).
+#              - coilWrite: ladder result output coils write.
+#              The result can be saved as json file to track the regression between
+#              releases.
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2024/12/10
+# version:     v0.1.3
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Usage example:
+    python modbusPlcBenchmark.py --engine all --conns 1000 --clients 100 --requests 20
+    python modbusPlcBenchmark.py --engine asyncio --write-ratio 0.2 --json result.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import struct
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import multiprocessing
+
+import modbusPlcGlobal as gv
+import modbusTcpCom
+import modbusCapture
+from pyModbusTCP.server import DataBank
+from mbLadderLogic import ladderLogic
+
+BENCH_HOST = '127.0.0.1'
+BENCH_PORT = 5020
+REQ_TIMEOUT = 5     # request time out in seconds, timeout request counted as failed.
+PHASES = ('access', 'dataBank', 'ladder', 'coilWrite')
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+class phaseProfiler(object):
+    """ Accumulate the server time of each request handling phase and the process CPU
+        time (running in the server sub process).
+    """
+    def __init__(self):
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.phaseDict = dict.fromkeys(PHASES, 0.0)
+        self.cpuStart = time.process_time()
+
+    def add(self, phase, timeSec):
+        self.phaseDict[phase] += timeSec
+
+    def inLadder(self):
+        return getattr(self.local, 'inLadder', False)
+
+    def getStats(self):
+        return {'cpuSec': time.process_time() - self.cpuStart,
+                'phaseSec': dict(self.phaseDict)}
+
+#-----------------------------------------------------------------------------
+class profiledDataBank(DataBank):
+    """ DataBank which counts the time of the client request read/write (the access
+        during the ladder update is counted in the ladder/coilWrite phase).
+    """
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+
+    def _timed(self, fun, args, kwargs):
+        if self.profiler.inLadder(): return fun(*args, **kwargs)
+        startT = time.perf_counter()
+        result = fun(*args, **kwargs)
+        self.profiler.add('dataBank', time.perf_counter() - startT)
+        return result
+
+    def get_coils(self, *args, **kwargs):
+        return self._timed(super().get_coils, args, kwargs)
+
+    def set_coils(self, *args, **kwargs):
+        return self._timed(super().set_coils, args, kwargs)
+
+    def get_holding_registers(self, *args, **kwargs):
+        return self._timed(super().get_holding_registers, args, kwargs)
+
+    def set_holding_registers(self, *args, **kwargs):
+        return self._timed(super().set_holding_registers, args, kwargs)
+
+class profiledDataHandler(modbusTcpCom.plcDataHandler):
+    """ plcDataHandler with the phase timing hooks."""
+    def __init__(self, profiler, allowRipList=None, allowWipList=None):
+        self.profiler = profiler
+        super().__init__(data_bank=profiledDataBank(profiler), allowRipList=allowRipList,
+                         allowWipList=allowWipList)
+
+    def _timedCheck(self, checkFun, ipaddress):
+        startT = time.perf_counter()
+        result = checkFun(ipaddress)
+        self.profiler.add('access', time.perf_counter() - startT)
+        return result
+
+    def _checkAllowRead(self, ipaddress):
+        return self._timedCheck(super()._checkAllowRead, ipaddress)
+
+    def _checkAllowWrite(self, ipaddress):
+        return self._timedCheck(super()._checkAllowWrite, ipaddress)
+
+    def updateState(self, regRange=None, coilRange=None):
+        local = self.profiler.local
+        local.inLadder, local.coilSec = True, 0.0
+        startT = time.perf_counter()
+        try:
+            super().updateState(regRange=regRange, coilRange=coilRange)
+        finally:
+            local.inLadder = False
+        self.profiler.add('ladder', time.perf_counter() - startT - local.coilSec)
+
+    def updateOutPutCoils(self, address, bitList):
+        startT = time.perf_counter()
+        result = super().updateOutPutCoils(address, bitList)
+        useTime = time.perf_counter() - startT
+        self.profiler.add('coilWrite', useTime)
+        self.profiler.local.coilSec = getattr(self.profiler.local, 'coilSec', 0.0) + useTime
+        return result
+
+#-----------------------------------------------------------------------------
+def serveProfiler(conn, profiler):
+    """ Handle the benchmark main process profiler command: 'reset' or 'stats'."""
+    try:
+        while True:
+            cmd = conn.recv()
+            if cmd == 'reset':
+                profiler.reset()
+                conn.send(True)
+            elif cmd == 'stats':
+                conn.send(profiler.getStats())
+    except (EOFError, OSError):
+        pass
+
+def runPlcServer(engine, port, conn=None, profile=True, capture=False):
+    """ Start the PLC emulator modbus server (sub process target function).
+        Args:
+            engine (str): modbusTcpCom.ENGINE_THREAD or ENGINE_ASYNCIO.
+            port (int): server port.
+            conn (multiprocessing.Connection, optional): pipe to receive the profiler
+                command. Defaults to None.
+            profile (bool, optional): add the phase timing hooks. Defaults to True.
+            capture (bool, optional): enable the request capture. Defaults to False.
+    """
+    sys.stdout = open(os.devnull, 'w') # the server print() is not part of the result.
+    profiler = phaseProfiler()
+    if profile:
+        plcDataMgr = profiledDataHandler(profiler, allowRipList=[BENCH_HOST], allowWipList=[BENCH_HOST])
+    else:
+        plcDataMgr = modbusTcpCom.plcDataHandler(allowRipList=[BENCH_HOST], allowWipList=[BENCH_HOST])
+    server = modbusTcpCom.modbusTcpServer(hostIp=BENCH_HOST, hostPort=port,
+                                          dataHandler=plcDataMgr, serverEngine=engine)
+    plcDataMgr.initServerInfo(server.getServerInfo())
+    plcDataMgr.addLadderLogic(gv.gLadderID, ladderLogic(None, id=gv.gLadderID))
+    plcDataMgr.setAutoUpdate(True)
+    if capture:
+        captureObj = modbusCapture.modbusCapture(os.path.join(tempfile.mkdtemp(), 'benchSession.cap'))
+        plcDataMgr.setCapture(captureObj)
+        captureObj.start()
+    if conn: threading.Thread(target=serveProfiler, args=(conn, profiler), daemon=True).start()
+    server.startServer()
+
+def waitServerReady(port, timeout=10):
+    """ Wait until the server port is accepting connections."""
+    endT = time.time() + timeout
+    while time.time() < endT:
+        try:
+            with socket.create_connection((BENCH_HOST, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def percentile(sortedList, pct):
+    if not sortedList: return 0.0
+    idx = min(len(sortedList) - 1, int(round(pct / 100.0 * (len(sortedList) - 1))))
+    return sortedList[idx]
+
+#-----------------------------------------------------------------------------
+# Raw Modbus-TCP frames, the benchmark client doesn't use pyModbusTCP client to
+# avoid one thread per connection in the measuring side.
+def buildReadCoilsReq(tid, address=0, count=8):
+    return struct.pack('>HHHBBHH', tid & 0xFFFF, 0, 6, 1, 1, address, count)
+
+def buildReadRegsReq(tid, address=0, count=8):
+    return struct.pack('>HHHBBHH', tid & 0xFFFF, 0, 6, 1, 3, address, count)
+
+def buildWriteRegReq(tid, address, value):
+    return struct.pack('>HHHBBHH', tid & 0xFFFF, 0, 6, 1, 6, address, value)
+
+def buildWriteRegsReq(tid, address, valList):
+    num = len(valList)
+    return struct.pack('>HHHBBHHB%dH' % num, tid & 0xFFFF, 0, 7 + num * 2, 1, 16, address,
+                       num, num * 2, *valList)
+
+def buildMixedReq(tid, rand, writeRatio):
+    """ Build one request of the mixed workload: read coils / read holding registers,
+        write single register / write 8 registers.
+    """
+    if rand.random() < writeRatio:
+        if tid % 2: return buildWriteRegReq(tid, rand.randrange(8), rand.randint(0, 1))
+        return buildWriteRegsReq(tid, 0, [rand.randint(0, 1) for _ in range(8)])
+    return buildReadCoilsReq(tid) if tid % 2 else buildReadRegsReq(tid)
+
+async def _sendRequest(reader, writer, frame):
+    writer.write(frame)
+    header = await reader.readexactly(7)
+    length = struct.unpack('>H', header[4:6])[0]
+    return await reader.readexactly(length - 1)
+
+async def sendRequest(reader, writer, frame):
+    """ Send one request frame and return the response PDU."""
+    return await asyncio.wait_for(_sendRequest(reader, writer, frame), REQ_TIMEOUT)
+
+#-----------------------------------------------------------------------------
+async def connSweep(port, connNum, concurrency):
+    """ Simulate a scanner sweep: open a connection, send one read request, close.
+        Returns: (connections per second, failed connection count)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    failCount = 0
+    async def oneConn(idx):
+        nonlocal failCount
+        async with semaphore:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(BENCH_HOST, port), REQ_TIMEOUT)
+                await sendRequest(reader, writer, buildReadCoilsReq(idx))
+                writer.close()
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                failCount += 1
+    startT = time.perf_counter()
+    await asyncio.gather(*[oneConn(i) for i in range(connNum)])
+    return connNum / (time.perf_counter() - startT), failCount
+
+async def clientsLoad(port, clientNum, reqNum, writeRatio):
+    """ Open clientNum concurrent connections, then each client sends reqNum mixed
+        read/write requests in sequence.
+        Returns: (request latency list in sec, req/sec, failed request count)
+    """
+    latencyList = []
+    failCount = 0
+    async def openConn():
+        try:
+            return await asyncio.wait_for(asyncio.open_connection(BENCH_HOST, port), REQ_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            return None
+    async def oneClient(cid, conn):
+        nonlocal failCount
+        reader, writer = conn
+        rand = random.Random(cid)
+        for i in range(reqNum):
+            frame = buildMixedReq(i, rand, writeRatio)
+            t0 = time.perf_counter()
+            try:
+                await sendRequest(reader, writer, frame)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                failCount += reqNum - i
+                break
+            latencyList.append(time.perf_counter() - t0)
+        writer.close()
+    connList = [conn for conn in await asyncio.gather(*[openConn() for _ in range(clientNum)]) if conn]
+    failCount += (clientNum - len(connList)) * reqNum
+    startT = time.perf_counter()
+    await asyncio.gather(*[oneClient(cid, conn) for cid, conn in enumerate(connList)])
+    return latencyList, len(latencyList) / (time.perf_counter() - startT), failCount
+
+#-----------------------------------------------------------------------------
+def benchEngine(engine, port, args):
+    """ Run the sweep and load test against one server engine."""
+    parentConn, childConn = multiprocessing.Pipe()
+    serverProc = multiprocessing.Process(target=runPlcServer, daemon=True,
+                                         args=(engine, port, childConn, not args.no_profile, args.capture))
+    serverProc.start()
+    result = {'engine': engine}
+    try:
+        if not waitServerReady(port):
+            print("Error: benchEngine() server engine %s not started." % engine)
+            return None
+        connRate, connFail = asyncio.run(connSweep(port, args.conns, args.clients))
+        parentConn.send('reset')
+        parentConn.recv()
+        latencyList, reqRate, reqFail = asyncio.run(clientsLoad(port, args.clients, args.requests,
+                                                                args.write_ratio))
+        parentConn.send('stats')
+        serverStats = parentConn.recv()
+        latencyList.sort()
+        reqCount = max(1, len(latencyList))
+        result.update({
+            'connPerSec': round(connRate, 1),
+            'connFailed': connFail,
+            'reqPerSec': round(reqRate, 1),
+            'reqFailed': reqFail,
+            'p50Ms': round(percentile(latencyList, 50) * 1000, 3),
+            'p95Ms': round(percentile(latencyList, 95) * 1000, 3),
+            'p99Ms': round(percentile(latencyList, 99) * 1000, 3),
+            'maxMs': round(latencyList[-1] * 1000, 3) if latencyList else 0.0,
+            'cpuUsPerReq': round(serverStats['cpuSec'] / reqCount * 1e6, 2),
+            'phaseUsPerReq': None if args.no_profile else {
+                phase: round(useTime / reqCount * 1e6, 2) for phase, useTime in serverStats['phaseSec'].items()},
+        })
+    finally:
+        serverProc.terminate()
+        serverProc.join()
+    return result
+
+def showResult(resultList):
+    print("\n%-8s %10s %9s %10s %8s %9s %9s %9s %10s %9s" %('engine', 'conn/s', 'connFail', 'req/s', 'reqFail',
+                                                          'p50(ms)', 'p95(ms)', 'p99(ms)', 'max(ms)', 'cpu(us)'))
+    for rst in resultList:
+        print("%-8s %10s %9s %10s %8s %9s %9s %9s %10s %9s" %(rst['engine'], rst['connPerSec'], rst['connFailed'],
+                                                             rst['reqPerSec'], rst['reqFailed'], rst['p50Ms'],
+                                                             rst['p95Ms'], rst['p99Ms'], rst['maxMs'],
+                                                             rst['cpuUsPerReq']))
+    if any(rst['phaseUsPerReq'] for rst in resultList):
+        print("\nServer time per request by phase (us):")
+        print("%-8s " %'engine' + " ".join("%10s" % phase for phase in PHASES))
+        for rst in resultList:
+            if rst['phaseUsPerReq']:
+                print("%-8s " %rst['engine'] + " ".join("%10s" % rst['phaseUsPerReq'][phase] for phase in PHASES))
+
+#-----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Modbus-TCP PLC emulator benchmark.')
+    parser.add_argument('--engine', default='all', choices=('all', modbusTcpCom.ENGINE_THREAD,
+                                                            modbusTcpCom.ENGINE_ASYNCIO))
+    parser.add_argument('--port', type=int, default=BENCH_PORT)
+    parser.add_argument('--conns', type=int, default=1000, help='connections in the scanner sweep.')
+    parser.add_argument('--clients', type=int, default=100, help='concurrent clients.')
+    parser.add_argument('--requests', type=int, default=20, help='requests sent by each client.')
+    parser.add_argument('--write-ratio', type=float, default=0.5, help='write requests ratio (0-1).')
+    parser.add_argument('--capture', action='store_true', help='enable the server request capture.')
+    parser.add_argument('--no-profile', action='store_true', help='disable the phase timing hooks.')
+    parser.add_argument('--json', default=None, help='save the result to the json file.')
+    args = parser.parse_args()
+    engines = (modbusTcpCom.ENGINE_THREAD, modbusTcpCom.ENGINE_ASYNCIO) if args.engine == 'all' else (args.engine,)
+    resultList = []
+    for idx, engine in enumerate(engines):
+        rst = benchEngine(engine, args.port + idx, args)
+        if rst: resultList.append(rst)
+    showResult(resultList)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({'meta': getMetaInfo(args), 'results': resultList}, fh, indent=4)
+        print("\nResult saved to %s" % args.json)
+
+def getMetaInfo(args):
+    """ Return the benchmark environment and parameters info."""
+    return {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpuCount': os.cpu_count(),
+            'args': vars(args)}
+
+if __name__ == '__main__':
+    main()
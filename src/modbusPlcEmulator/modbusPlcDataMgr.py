@@ -21,6 +21,7 @@ import threading
 
 import modbusPlcGlobal as gv
 import modbusTcpCom
+import modbusCapture
 from mbLadderLogic import ladderLogic
 
 #-----------------------------------------------------------------------------
@@ -39,11 +40,19 @@ class DataManager(threading.Thread):
         # Init the modbus server
         self.server = modbusTcpCom.modbusTcpServer(hostIp=gv.gPlcHostIp, 
                                                  hostPort=gv.gHostPort, 
-                                                 dataHandler=self.plcDataMgr)
+                                                 dataHandler=self.plcDataMgr,
+                                                 serverEngine=gv.gServerEngine)
         serverInfo = self.server.getServerInfo()
         self.plcDataMgr.initServerInfo(serverInfo)
         self.plcDataMgr.addLadderLogic(gv.gLadderID, self.ladder)
         self.plcDataMgr.setAutoUpdate(True)
+        # Init the Modbus request capture
+        self.capture = None
+        if gv.gCaptureFlg:
+            self.capture = modbusCapture.modbusCapture(gv.gCaptureFile)
+            self.plcDataMgr.setCapture(self.capture)
+            self.capture.start()
+            gv.gDebugPrint("Modbus request capture started: %s" %str(gv.gCaptureFile), logType=gv.LOG_INFO)
         self.terminate = False
         gv.gDebugPrint("PLC data manager init finished.", logType=gv.LOG_INFO)
 
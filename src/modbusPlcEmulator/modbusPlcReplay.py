@@ -0,0 +1,188 @@
+#!/usr/bin/python
+#-----------------------------------------------------------------------------
+# Name:        modbusPlcReplay.py
+#
+# Purpose:     This module is a replay tool to replay the Modbus sessions recorded
+#              by the PLC emulator's request capture (<lib/modbusCapture.py>) against
+#              a modbusTcpServer + plcDataHandler. Each recorded client connection is
+#              replayed on its own connection in parallel at the original timing, N
+#              times speed or as fast as possible, then the tool reports the throughput,
+#              the latency histogram and the coils state divergence compared with the
+#              reference result (the same requests processed by a local emulator data
+#              handler in the original time order).
+#
+# Author:      Yuancheng Liu
+#
+# Created:     2024/12/17
+# version:     v0.1.3
+# Copyright:   Copyright (c) 2024 LiuYuancheng
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Usage example:
+    1. Replay all the allowed requests at the original timing against a local emulator:
+        python modbusPlcReplay.py --file Captures/modbusSession.cap
+    2. Replay one attacker's sessions 10 times parallel as fast as possible against a PLC:
+        python modbusPlcReplay.py --file Captures/modbusSession.cap --client 10.0.0.5 \
+            --speed 0 --repeat 10 --host 172.23.155.209 --port 502
+"""
+
+import time
+import asyncio
+import argparse
+import multiprocessing
+from collections import OrderedDict
+
+import modbusPlcGlobal as gv
+import modbusTcpCom
+import modbusCapture
+from mbLadderLogic import ladderLogic
+from modbusPlcBenchmark import BENCH_HOST, BENCH_PORT, REQ_TIMEOUT, runPlcServer, waitServerReady, percentile
+
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 10, 50, 100) # latency histogram bucket upper bound in ms.
+COIL_READ_FC = (1, 2)   # function codes whose response shows the coils/inputs state.
+FC_IDX, PDU_IDX = 3, 7  # function code and pdu index in the capture record tuple.
+
+#-----------------------------------------------------------------------------
+def loadSessions(filePath, clientIp=None, includeDenied=False):
+    """ Load the recorded requests and group them by the client connection.
+        Returns: OrderedDict {(clientIp, clientPort): [record, ...]}
+    """
+    reader = modbusCapture.sessionLogReader(filePath)
+    sessionDict = OrderedDict()
+    for record in reader.getRecords(clientIp=clientIp):
+        # the denied requests didn't change the PLC state in the original session.
+        if not (record[4] or includeDenied): continue
+        sessionDict.setdefault((record[1], record[2]), []).append(record)
+    return sessionDict
+
+def buildReference(sessionDict):
+    """ Process all the requests in the original time order with a local emulator data
+        handler (not network), return the expected response pdu lists and the handler.
+    """
+    plcDataMgr = modbusTcpCom.plcDataHandler()
+    refServer = modbusTcpCom.asyncioModbusServer(host=BENCH_HOST, port=0, data_hdl=plcDataMgr)
+    plcDataMgr.initServerInfo(refServer.ServerInfo)
+    plcDataMgr.addLadderLogic(gv.gLadderID, ladderLogic(None, id=gv.gLadderID))
+    plcDataMgr.setAutoUpdate(True)
+    expectDict = {key: [None]*len(records) for key, records in sessionDict.items()}
+    allRecords = sorted((record[0], key, idx) for key, records in sessionDict.items()
+                        for idx, record in enumerate(records))
+    for _, key, idx in allRecords:
+        expectDict[key][idx] = refServer.processRequest(sessionDict[key][idx][PDU_IDX])
+    return expectDict, plcDataMgr
+
+#-----------------------------------------------------------------------------
+async def replaySession(records, expectList, host, port, speed, baseTs, startT, stats):
+    """ Replay one recorded client connection and update the stats dict."""
+    client = modbusTcpCom.asyncModbusTcpClient(host, tgtPort=port, window=1, defaultTO=REQ_TIMEOUT)
+    if not await client.connect():
+        stats['failed'] += len(records)
+        return
+    for idx, record in enumerate(records):
+        if speed > 0:
+            delay = startT + (record[0] - baseTs) / speed - time.perf_counter()
+            if delay > 0: await asyncio.sleep(delay)
+        t0 = time.perf_counter()
+        respPdu = await client.sendRawPdu(record[PDU_IDX])
+        if respPdu is None:
+            stats['failed'] += 1
+            continue
+        stats['latency'].append(time.perf_counter() - t0)
+        if expectList and record[FC_IDX] in COIL_READ_FC and respPdu != expectList[idx]:
+            stats['divergence'].append((record[1], record[0], record[FC_IDX], record[5], record[6]))
+    await client.close()
+
+async def replayAll(sessionDict, expectDict, host, port, speed, repeat):
+    """ Replay all the sessions (repeat times) in parallel."""
+    stats = {'latency': [], 'failed': 0, 'divergence': []}
+    baseTs = min(records[0][0] for records in sessionDict.values())
+    startT = time.perf_counter()
+    taskList = []
+    for _ in range(repeat):
+        for key, records in sessionDict.items():
+            expectList = expectDict[key] if expectDict else None
+            taskList.append(replaySession(records, expectList, host, port, speed, baseTs, startT, stats))
+    await asyncio.gather(*taskList)
+    stats['elapsed'] = time.perf_counter() - startT
+    return stats
+
+async def readCoils(host, port, coilNum):
+    client = modbusTcpCom.asyncModbusTcpClient(host, tgtPort=port, defaultTO=REQ_TIMEOUT)
+    if not await client.connect(): return None
+    result = await client.getCoilsBits(0, coilNum)
+    await client.close()
+    return result
+
+#-----------------------------------------------------------------------------
+def showReport(stats, reqNum, sessionNum, coilMatch):
+    latencyList = sorted(stats['latency'])
+    print("\nReplayed sessions: %d, requests: %d, failed: %d, time: %.3f sec"
+          %(sessionNum, reqNum, stats['failed'], stats['elapsed']))
+    print("Throughput: %.1f req/s" %(len(latencyList) / stats['elapsed'] if stats['elapsed'] else 0))
+    if latencyList:
+        print("Latency(ms) p50: %.3f, p99: %.3f, max: %.3f" %(percentile(latencyList, 50) * 1000,
+              percentile(latencyList, 99) * 1000, latencyList[-1] * 1000))
+        print("Latency histogram:")
+        lowBound, pos = 0, 0
+        for upBound in LATENCY_BUCKETS + (None,):
+            count = 0
+            while pos < len(latencyList) and (upBound is None or latencyList[pos] * 1000 < upBound):
+                count += 1
+                pos += 1
+            label = "%s-%s ms" %(lowBound, upBound) if upBound else ">=%s ms" %lowBound
+            print("  %-12s %8d %s" %(label, count, '#' * int(50 * count / len(latencyList))))
+            lowBound = upBound
+    if coilMatch is None:
+        print("Coils divergence: not checked (need --repeat 1)")
+        return
+    print("Coils read divergence: %d" %len(stats['divergence']))
+    for clientIp, ts, funcCode, address, count in stats['divergence'][:10]:
+        print("  - client %s at %s: fc=%d address=%d count=%d" %(clientIp,
+              time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)), funcCode, address, count))
+    print("Final coils state match: %s" %str(coilMatch))
+
+#-----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Modbus session replay tool.')
+    parser.add_argument('--file', default=gv.gCaptureFile, help='capture session file.')
+    parser.add_argument('--client', default=None, help='only replay the sessions of this client ip.')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='1: original timing, N: N times speed, 0: as fast as possible.')
+    parser.add_argument('--repeat', type=int, default=1, help='parallel copies of every session.')
+    parser.add_argument('--include-denied', action='store_true', help='also replay the denied requests.')
+    parser.add_argument('--host', default=None, help='target PLC ip, start a local emulator if not set.')
+    parser.add_argument('--port', type=int, default=BENCH_PORT)
+    parser.add_argument('--engine', default=modbusTcpCom.ENGINE_ASYNCIO,
+                        choices=(modbusTcpCom.ENGINE_THREAD, modbusTcpCom.ENGINE_ASYNCIO),
+                        help='server engine of the local emulator.')
+    parser.add_argument('--coils', type=int, default=8, help='number of coils to compare at the end.')
+    args = parser.parse_args()
+
+    sessionDict = loadSessions(args.file, clientIp=args.client, includeDenied=args.include_denied)
+    if not sessionDict:
+        print("Error: no request found in the session file %s." %str(args.file))
+        return
+    reqNum = sum(len(records) for records in sessionDict.values()) * args.repeat
+    # parallel copies change the same PLC state, the divergence is only checked for 1 copy.
+    expectDict, refDataMgr = buildReference(sessionDict) if args.repeat == 1 else (None, None)
+    serverProc, host = None, args.host
+    if host is None:
+        host = BENCH_HOST
+        serverProc = multiprocessing.Process(target=runPlcServer, args=(args.engine, args.port), daemon=True)
+        serverProc.start()
+    try:
+        if serverProc and not waitServerReady(args.port):
+            print("Error: local emulator server not started.")
+            return
+        stats = asyncio.run(replayAll(sessionDict, expectDict, host, args.port, args.speed, args.repeat))
+        coilMatch = None
+        if refDataMgr:
+            coilMatch = asyncio.run(readCoils(host, args.port, args.coils)) == refDataMgr.getCoilState(0, args.coils)
+        showReport(stats, reqNum, len(sessionDict) * args.repeat, coilMatch)
+    finally:
+        if serverProc:
+            serverProc.terminate()
+            serverProc.join()
+
+if __name__ == '__main__':
+    main()
@@ -33,6 +33,10 @@ from snap7Comm import BOOL_TYPE
 import monitorClient
 from s7LadderLogic import ladderLogic
 
+# PLC input and output (memory address index, data index) list.
+INPUT_ADDR_LIST = [(addressIdx, dataIdx) for addressIdx in (1, 2) for dataIdx in (0, 2, 4, 6)]
+OUTPUT_ADDR_LIST = [(addressIdx, dataIdx) for addressIdx in (3, 4) for dataIdx in (0, 2, 4, 6)]
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
 class plcControllerApp(object):
@@ -42,7 +46,12 @@ class plcControllerApp(object):
     def __init__(self) -> None:
         # init the monitor reporter thread
         gv.iMonitorClient = monitorClient.monitorClient(gv.gMonHubIp, gv.gMonHubPort, 
-                                                reportInterval=gv.gReportInv)
+                                                reportInterval=gv.gReportInv,
+                                                spillDir=gv.gSpillDir,
+                                                spillSize=gv.gSpillSize,
+                                                replayRate=gv.gReplayRate,
+                                                aggWindow=gv.gAggWindow,
+                                                alertThrottle=gv.gAlertThrottle)
         gv.iMonitorClient.setParentInfo(gv.gOwnID, gv.gOwnIP, monitorClient.CTRL_TYPE, gv.gProType, 
                                         tgtID=gv.gPlcID, tgtIP=gv.gPlcIP, ladderID=gv.gLadderID)
 
@@ -73,36 +82,27 @@ class plcControllerApp(object):
             gv.gDebugPrint("Random generate input: %s" %str(regVals), logType=gv.LOG_INFO)
             resultExp = self.ladderLogic.runVerifyLadderLogic(regVals)
             gv.gDebugPrint("Expected output: %s" %str(resultExp), logType=gv.LOG_INFO)
-            self.s7commClient.setAddressVal(1, 0, regVals[0], dataType=snap7Comm.BOOL_TYPE)
-            time.sleep(0.1)
-            self.s7commClient.setAddressVal(1, 2, regVals[1], dataType=snap7Comm.BOOL_TYPE)
-            time.sleep(0.1)
-            self.s7commClient.setAddressVal(1, 4, regVals[2], dataType=snap7Comm.BOOL_TYPE)
-            time.sleep(0.1)
-            self.s7commClient.setAddressVal(1, 6, regVals[3], dataType=snap7Comm.BOOL_TYPE)
-            time.sleep(0.1)
-            self.s7commClient.setAddressVal(2, 0, regVals[4], dataType=snap7Comm.BOOL_TYPE)
-            time.sleep(0.1)
-            self.s7commClient.setAddressVal(2, 2, regVals[5], dataType=snap7Comm.BOOL_TYPE)
-            time.sleep(0.1)
-            self.s7commClient.setAddressVal(2, 4, regVals[6], dataType=snap7Comm.BOOL_TYPE)
-            time.sleep(0.1)
-            self.s7commClient.setAddressVal(2, 6, regVals[7], dataType=snap7Comm.BOOL_TYPE)
-            time.sleep(0.1)
-            time.sleep(1)
-            # get PLC result
-            val1 = self.s7commClient.readAddressVal(3, dataIdxList=(0, 2, 4, 6),
-                                                    dataTypeList=(BOOL_TYPE, BOOL_TYPE, BOOL_TYPE, BOOL_TYPE))
-            val2 = self.s7commClient.readAddressVal(4, dataIdxList=(0, 2, 4, 6),
-                                                    dataTypeList=(BOOL_TYPE, BOOL_TYPE, BOOL_TYPE, BOOL_TYPE))
+            # set all the inputs with one multi variables write request.
+            self.s7commClient.setMultiVals([(addressIdx, dataIdx, regVals[i], BOOL_TYPE) 
+                                            for i, (addressIdx, dataIdx) in enumerate(INPUT_ADDR_LIST)])
+            # wait the PLC ladder logic to handle the writes burst.
+            time.sleep(gv.gPlcSettleInt)
+            # get PLC result with one multi variables read request.
+            resultGet = self.s7commClient.readMultiVals([(addressIdx, dataIdx, BOOL_TYPE) 
+                                                         for addressIdx, dataIdx in OUTPUT_ADDR_LIST])
             # set connection state
-            connectionRst = False if val1 is None or val2 is None else True
+            connectionRst = self.s7commClient.checkConn()
             if not connectionRst:
                 gv.iMonitorClient.addReportDict(monitorClient.RPT_ALERT, 
                                                 "alert:Lost connection to target PLC:%s" % gv.gPlcID)
                 gv.gDebugPrint("Lost connection to target PLC:%s" % gv.gPlcID, logType=gv.LOG_INFO)
                 continue
-            resultGet = val1 + val2
+            if resultGet is None:
+                # the PLC rejected the request items (such as the DB not exist).
+                gv.iMonitorClient.addReportDict(monitorClient.RPT_ALERT, 
+                                                "alert:Read PLC output error from target PLC:%s" % gv.gPlcID)
+                gv.gDebugPrint("Read PLC output error from target PLC:%s" % gv.gPlcID, logType=gv.LOG_INFO)
+                continue
             gv.gDebugPrint("Get PLC result: %s" %str(resultGet), logType=gv.LOG_INFO)
             matchRst = resultGet == resultExp
             if not matchRst:
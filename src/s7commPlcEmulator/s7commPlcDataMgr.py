@@ -38,13 +38,18 @@ class DataManager(threading.Thread):
         # Init the plc data handler and permission config
 
         # Init the s7comm server
-        self.server = snap7Comm.s7commServer(snapLibPath=gv.gS7snapDllPath)
+        if gv.gServerEngine == snap7Comm.ENGINE_ASYNCIO:
+            self.server = snap7Comm.asyncioS7commServer(memPoolSize=gv.gMemPoolSize, memFile=gv.gMemFile)
+        else:
+            self.server = snap7Comm.s7commServer(snapLibPath=gv.gS7snapDllPath, 
+                                                 memPoolSize=gv.gMemPoolSize, memFile=gv.gMemFile)
         # Init the data reading memory addresses
         self.server.initNewMemoryAddr(1, [0, 2, 4, 6], [BOOL_TYPE, BOOL_TYPE, BOOL_TYPE, BOOL_TYPE])
         self.server.initNewMemoryAddr(2, [0, 2, 4, 6], [BOOL_TYPE, BOOL_TYPE, BOOL_TYPE, BOOL_TYPE])
         # Init the data output memory addresses
         self.server.initNewMemoryAddr(3, [0, 2, 4, 6], [BOOL_TYPE, BOOL_TYPE, BOOL_TYPE, BOOL_TYPE])
         self.server.initNewMemoryAddr(4, [0, 2, 4, 6], [BOOL_TYPE, BOOL_TYPE, BOOL_TYPE, BOOL_TYPE])
+        self.server.setBurstWindow(gv.gBurstWindow)
         # Init the ladder logic 
         gv.iPlcLadderLogic = ladderLogic(self.server, gv.gLadderID)
 
@@ -61,9 +66,14 @@ class DataManager(threading.Thread):
             """
             gv.iPlcLadderLogic.runLadderLogic(inputData=parmList)
         gv.gDebugPrint('PLC S7Comm server started.', logType=gv.LOG_INFO)
-        self.server.startService(eventHandlerFun=handlerS7request)
+        self.server.startService(eventHandlerFun=handlerS7request, eventMode=gv.gEventMode)
         gv.gDebugPrint('PLC S7Comm server terminated.', logType=gv.LOG_INFO)
 
+    #-----------------------------------------------------------------------------
+    def getBurstStats(self):
+        """ Return the S7Comm DB write burst coalescing statistics dict."""
+        return self.server.getBurstStats()
+
     #-----------------------------------------------------------------------------
     def getPlcStateDict(self):
         """ Return the PLC current input voltage, register value, coil value and 
@@ -77,18 +87,16 @@ class DataManager(threading.Thread):
         }
         dataIdxList = (0, 2, 4, 6)
         # added the input value and voltage
-        for idx in dataIdxList:
-            stateDict['registerVal'].append(self.server.getMemoryVal(1, idx))
-        for idx in dataIdxList:
-            stateDict['registerVal'].append(self.server.getMemoryVal(2, idx))
+        for memoryIdx in (1, 2):
+            memValDict = self.server.getAll(memoryIdx)
+            stateDict['registerVal'].extend(memValDict[idx] for idx in dataIdxList)
         for val in stateDict['registerVal']:
             voltage = round(5 + random.uniform(-0.05, 0.05),2) if val else 0 
             stateDict['inputVol'].append(voltage)
         # added the output value and voltage
-        for idx in dataIdxList:
-            stateDict['coilVal'].append(self.server.getMemoryVal(3, idx))
-        for idx in dataIdxList:
-            stateDict['coilVal'].append(self.server.getMemoryVal(4, idx))
+        for memoryIdx in (3, 4):
+            memValDict = self.server.getAll(memoryIdx)
+            stateDict['coilVal'].extend(memValDict[idx] for idx in dataIdxList)
         for val in stateDict['coilVal']:
             voltage = round(5 + random.uniform(-0.05, 0.05),2) if val else 0 
             stateDict['outputVol'].append(voltage)
@@ -88,6 +88,15 @@ COOKIE_TIME = 30
 gPlcHostIp = '0.0.0.0'
 gHostPort = 502
 gLadderID = CONFIG_DICT['LADDER_ID']
+# S7Comm server engine 'snap7' (native snap7 lib) or 'asyncio' (pure python).
+gServerEngine = CONFIG_DICT['SERVER_ENGINE'] if 'SERVER_ENGINE' in CONFIG_DICT.keys() else 'snap7'
+# S7Comm server event handling mode 'callback' or 'poll'.
+gEventMode = CONFIG_DICT['EVENT_MODE'] if 'EVENT_MODE' in CONFIG_DICT.keys() else 'callback'
+# S7Comm DB write burst window in seconds, the writes in one window run the ladder once.
+gBurstWindow = float(CONFIG_DICT['BURST_WINDOW']) if 'BURST_WINDOW' in CONFIG_DICT.keys() else 0.01
+# S7Comm server memory pool size in bytes and the optional mmap file to keep the memory.
+gMemPoolSize = int(CONFIG_DICT['MEM_POOL_SIZE']) if 'MEM_POOL_SIZE' in CONFIG_DICT.keys() else 65536
+gMemFile = os.path.join(dirpath, CONFIG_DICT['MEM_FILE']) if 'MEM_FILE' in CONFIG_DICT.keys() else None
 
 # Own Information
 gOwnID = CONFIG_DICT['Own_ID']
@@ -98,6 +107,11 @@ gProType = CONFIG_DICT['PRO_TYPE']
 gMonHubIp = CONFIG_DICT['MON_IP']
 gMonHubPort = int(CONFIG_DICT['MON_PORT'])
 gReportInv = int(CONFIG_DICT['RPT_INTERVAL'])
+gSpillDir = os.path.join(dirpath, CONFIG_DICT['RPT_SPILL_DIR']) if 'RPT_SPILL_DIR' in CONFIG_DICT.keys() else None
+gSpillSize = int(CONFIG_DICT['RPT_SPILL_SIZE']) if 'RPT_SPILL_SIZE' in CONFIG_DICT.keys() else 16777216
+gReplayRate = int(CONFIG_DICT['RPT_REPLAY_RATE']) if 'RPT_REPLAY_RATE' in CONFIG_DICT.keys() else 200
+gAggWindow = float(CONFIG_DICT['RPT_AGG_WINDOW']) if 'RPT_AGG_WINDOW' in CONFIG_DICT.keys() else 10
+gAlertThrottle = float(CONFIG_DICT['RPT_ALERT_THROTTLE']) if 'RPT_ALERT_THROTTLE' in CONFIG_DICT.keys() else 1
 
 # PLC user credential:
 gUsersRcd = os.path.join(dirpath, CONFIG_DICT['USERS_RCD'])